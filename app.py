@@ -1,39 +1,57 @@
 from flask import (
     Flask,
+    Response,
     flash,
+    g,
     redirect,
     render_template,
     request,
-    send_file,
     session,
+    stream_with_context,
     url_for,
 )
 from flask_session import Session
 from flask_talisman import Talisman
+import csv
 import io
-import pandas as pd
+import json
+import math
+import os
+import threading
+import timeit
+import zlib
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from eir import (
     comparision,
     complex_eir_calculation,    
-    generate_cf_dates,
+    configure_result_cache,
+    ledger_eir_calculation,
+    rate_sensitivity,
     simple_eir_calculation,   
 )
+from deal_state import DealStateStore
+from jobs import JobQueue
+import metrics
 from get_data import (
-    get_currency,
     get_date,
-    get_daycount,
-    get_discount,
-    get_exchange_rate,
-    get_interest_freq,
+    get_deal,
+    get_interest_dict,
     get_interest_rate,
-    get_interest_type,
-    get_premium,
-    get_principal,
-    get_setup_costs,
-    get_structure,
-    update_deal_data,
+    get_json_deal,
+    get_payment_date,
 )
+from portfolio import ENGINES as PORTFOLIO_ENGINES, SUMMARY_FIELDS
+from reporting import balance_rows, balances_at, deal_index
+from result_cache import ResultCache
+from result_store import ResultStore
+from schedule import Schedule
 
 from flask_talisman import Talisman
 
@@ -55,7 +73,7 @@ csp = {
 
 # Configure application
 app = Flask(__name__)
-Talisman(app, content_security_policy=csp)
+talisman = Talisman(app, content_security_policy=csp)
 
 
 # Configure session to use filesystem (instead of signed cookies)
@@ -64,108 +82,130 @@ app.config["SESSION_TYPE"] = "filesystem"
 Session(app)
 
 
+"""
+The calculation results are kept in the result store and the session only holds the id of the latest result.
+Results expire after an hour and the store is limited to 256 MB, the sweeper thread removes anything over these.
+Identical deals submitted again, in any worker, are taken from the shared result cache instead of being recalculated.
+The schedules of the floating deals started on the reset API are kept in the deal state store, updated in place as new rates are fixed.
+Portfolios and long calculations run as background jobs, queued in a SQLite database shared by the workers of the host.
+At most JOB_CONCURRENCY jobs run at the same time on the host, in threads of the app processes.
+
+Importing the app only reads these settings. The stores are opened and the threads started by init_app in each worker process,
+after gunicorn has forked it (see post_fork in gunicorn.conf.py), as threads started before the fork would not run in the workers.
+"""
+app.config.update(
+    RESULT_STORE_DIR=os.environ.get("RESULT_STORE_DIR", "result_store"),
+    RESULT_CACHE_PATH=os.environ.get("RESULT_CACHE_PATH", "result_cache/results.sqlite3"),
+    DEAL_STATE_PATH=os.environ.get("DEAL_STATE_PATH", "deal_state/deals.sqlite3"),
+    JOB_QUEUE_PATH=os.environ.get("JOB_QUEUE_PATH", "jobs/jobs.sqlite3"),
+    JOB_CONCURRENCY=int(os.environ.get("JOB_CONCURRENCY", 2)),
+)
+RESULTS = None
+RESULT_CACHE = None
+DEAL_STATES = None
+JOBS = None
+_init_lock = threading.RLock()
+
+
+def init_app(workers: bool = True) -> None:
+    """
+    Opens the stores from the settings of the app, switches the result cache on and starts the sweeper and the job workers.
+    Without workers the queued jobs are only run by calling JOBS.run_next, eg. in the tests.
+    """
+    global RESULTS, RESULT_CACHE, DEAL_STATES, JOBS
+    with _init_lock:
+        RESULTS = ResultStore(app.config["RESULT_STORE_DIR"])
+        RESULTS.start_sweeper()
+        RESULT_CACHE = ResultCache(app.config["RESULT_CACHE_PATH"])
+        configure_result_cache(RESULT_CACHE)
+        DEAL_STATES = DealStateStore(app.config["DEAL_STATE_PATH"])
+        JOBS = JobQueue(app.config["JOB_QUEUE_PATH"], concurrency=app.config["JOB_CONCURRENCY"])
+        if workers:
+            JOBS.start_workers()
+
+
+def shutdown_app() -> None:
+    """Stops the threads started by init_app and switches the result cache off, eg. at the end of a test."""
+    with _init_lock:
+        if RESULTS is not None:
+            RESULTS.stop_sweeper()
+        if JOBS is not None:
+            JOBS.stop_workers()
+        configure_result_cache(None)
+
+
+@app.before_request
+def before_request():
+    """When the app is served without gunicorn, eg. by flask run, it is initialized on the first request instead."""
+    if RESULTS is None:
+        with _init_lock:
+            if RESULTS is None:
+                init_app()
+    g.request_start = timeit.default_timer()
+
+
 @app.after_request
 def after_request(response):
-    """Ensure responses are not cashed"""
+    """Ensure responses are not cashed, and record the latency of the request for its route"""
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response.headers["Expires"] = 0
     response.headers["Pragma"] = "no-cache"
+    if "request_start" in g:
+        metrics.observe_request(
+            request.url_rule.rule if request.url_rule else "unmatched",
+            request.method,
+            response.status_code,
+            timeit.default_timer() - g.request_start,
+        )
     return response
 
 
-DEAL = {}
-
-
 @app.route("/calculation", methods=["GET", "POST"])
 def calculation():
     if request.method == "GET":
         return render_template("calculation.html")
     elif request.method == "POST":
         try:
-            """User input"""  
-            DEAL["functional_ccy"] = get_currency(request.form.get("functional_ccy"))
-            DEAL["deal_id"] = request.form.get("deal_id")
-            DEAL["principal_amount"] = get_principal(
-                request.form.get("principal_amount")
-            )
-            DEAL["deal_ccy"] = get_currency(request.form.get("deal_ccy"))
-            DEAL["deal_fx_rate"] = get_exchange_rate(request.form.get("deal_fx_rate"))
-            DEAL["discount"] = get_discount(request.form.get("discount"))
-            DEAL["premium"] = get_premium(request.form.get("premium"))
-            DEAL["setup_costs"] = get_setup_costs(request.form.get("setup_costs_total"))
-            DEAL["start_date"] = get_date(request.form.get("start_date"))
-            DEAL["end_date"] = get_date(request.form.get("end_date"))
-            DEAL["first_interest_date"] = get_date(
-                request.form.get("first_interest_date")
-            )
-            DEAL["interest_rate"] = get_interest_rate(request.form.get("interest_rate"))
-            DEAL["structure"] = get_structure(request.form.get("structure"))
-            DEAL["interest_freq"] = get_interest_freq(request.form.get("interest_freq"))
-            DEAL["daycount"] = get_daycount(request.form.get("daycount"))
-            DEAL["interest_type"] = get_interest_type(request.form.get("interest_type"))
-            update_deal_data(DEAL)
-
             """
-            These lines are to compile the floating rate inputs into a dictionary adding the first interest as the 0th element, 
-            so that the dictionary exists for fixed rate instruments as well in the complex calculation.
+            User input, the deal is built for this request only and cannot be changed afterwards,
+            so concurrent requests in the threads of a worker never share or modify each others deals.
             """
-            interest_dates = [
-                get_date(date)
-                for date in request.form.getlist("interest_date[]")
-                if date.strip() != ""
-            ]
-            floating_interest_rates = [
-                get_interest_rate(rate)
-                for rate in request.form.getlist("interest_rate[]")
-                if rate.strip() != ""
-            ]
-            interest_dict = [
-                {
-                    "date": DEAL["first_interest_date"],
-                    "rate": DEAL["interest_rate"],
-                }
-            ] + [
-                {
-                    "date": date,
-                    "rate": rate,
-                }
-                for date, rate in zip(interest_dates, floating_interest_rates)
-            ]
-            """These lines are for error checking"""
-            dates, _ = generate_cf_dates(
-                DEAL["start_date"],
-                DEAL["end_date"],
-                DEAL["first_interest_date"],
-                DEAL["interest_freq"],
+            deal = get_deal(
+                dict(
+                    request.form.to_dict(),
+                    setup_costs=request.form.get("setup_costs_total"),
+                )
+            )
+            interest_dict = get_interest_dict(
+                deal,
+                request.form.getlist("interest_date[]"),
+                request.form.getlist("interest_rate[]"),
             )
-            for line in interest_dict:
-                if line["date"] not in dates:
-                    raise ValueError(f"Date is not valid: {line['date']}")
-
 
             """These conditions operate the buttons"""
             action = request.form["action"]
 
             if action == "comparision":
                 schedule, summary, complex_time, simple_time, efficiency = comparision(
-                    DEAL, interest_dict
+                    deal, interest_dict
+                )
+                session["result_id"] = RESULTS.put(
+                    {"schedule": schedule, "summary": summary}
                 )
-                session["schedule"] = schedule
-                session["summary"] = summary
                 return render_template(
                     "comparision.html",
-                    schedule=schedule,
-                    summary=summary,
+                    schedule=schedule_page(schedule, 1),
+                    summary=schedule_page(summary, 1),
                     complex_time=complex_time,
                     simple_time=simple_time,
                     efficiency=efficiency,
                 )
             elif action == "simple_eir_calculation":
-                schedule, _, _ = simple_eir_calculation(DEAL, interest_dict)
+                schedule, _, _ = simple_eir_calculation(deal, interest_dict)
             elif action == "complex_eir_calculation":
-                schedule = complex_eir_calculation(DEAL, interest_dict)
-            session["schedule"] = schedule
-            return render_template("report.html", schedule=schedule)
+                schedule = complex_eir_calculation(deal, interest_dict)
+            session["result_id"] = RESULTS.put({"schedule": schedule})
+            return render_template("report.html", schedule=schedule_page(schedule, 1))
 
         except ValueError as e:
             flash(str(e))
@@ -173,38 +213,419 @@ def calculation():
     return render_template("calculation.html")
 
 
+"""The reports of the latest result, mapped to their key in the stored result and their default filename."""
+REPORTS = {
+    "report": ("schedule", "amortization_schedule"),
+    "comparision": ("schedule", "comparision_schedule"),
+    "summary": ("summary", "summary_schedule"),
+}
+
+
+@app.route("/report/<report_type>/page/<int:page>")
+def report_page(report_type, page):
+    """
+    One page of a report of the latest result as JSON, for the pages after the first one that is rendered with the report.
+    The rows are read from the stored result and formatted here, so the browser only has to put them into the table.
+    """
+    if report_type not in REPORTS:
+        return json_response({"error": "Invalid report type"}, 404)
+    result = RESULTS.get(session.get("result_id")) or {}
+    data = result.get(REPORTS[report_type][0])
+    if not data:
+        return json_response({"error": "No report available"}, 404)
+    try:
+        return json_response(schedule_page(data, page))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 404)
+
+
 @app.route("/download/<report_type>")
 def download_report(report_type):
     """Download any report (schedule, comparision, summary) as CSV."""
-    # Map report_type to session key and default filename
-    report_map = {
-        "report": ("schedule", "amortization_schedule"),
-        "comparision": ("schedule", "comparision_schedule"),
-        "summary": ("summary", "summary_schedule"),
-    }
-    if report_type not in report_map:
+    if report_type not in REPORTS:
         flash("Invalid report type.")
         return redirect(url_for("index"))
     
-    session_key, default_filename = report_map[report_type]
-    data = session.get(session_key)
+    session_key, default_filename = REPORTS[report_type]
+    result = RESULTS.get(session.get("result_id")) or {}
+    data = result.get(session_key)
     if not data:
         flash("No report available to download.")
         return redirect(url_for("index"))
 
-    deal_id = None
-    if len(data) > 0 and "Deal id" in data[0]:
-        deal_id = data[0]["Deal id"]
-    else:
-        deal_id = default_filename
+    deal_id = data.metadata.get("Deal id", default_filename)
 
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    df.to_csv(output, index=False)
-    output.seek(0)
+    """
+    The rows are streamed to the client as they are written, so nothing but the current chunk is held in memory.
+    With ?gzip=1 the file is compressed on the fly and downloaded as .csv.gz.
+    """
     filename = f"{deal_id}_{default_filename}.csv"
-    return send_file(
-        output, mimetype="text/csv", as_attachment=True, download_name=filename
+    chunks = csv_chunks(data)
+    mimetype = "text/csv"
+    if request.args.get("gzip") == "1":
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def csv_chunks(schedule: Schedule, chunk_size: int = 64 * 1024):
+    """
+    Writes the rows of the schedule with the csv module and yields the text in chunks of about chunk_size characters.
+    The NaN items of the periodic columns are written as empty cells.
+    """
+    return csv_row_chunks(schedule.fields, schedule.values(""), chunk_size)
+
+
+def csv_row_chunks(fields, rows, chunk_size: int = 64 * 1024):
+    """Writes the header and the rows with the csv module and yields the text in chunks of about chunk_size characters."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Compresses the text chunks into a gzip stream."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+"""
+The JSON API runs the calculations for one or many deals without rendering templates or touching the session.
+The request is either one deal or {"engine": ..., "deals": [...]}, where each deal has the same fields as the input form
+and an optional "fixings" list of {"date": ..., "rate": ...} items, with the rates in % as on the input form.
+Each schedule is returned as columns, one array per column of the report with null in place of NaN, which is much smaller than a list of rows.
+"""
+API_ENGINES = {
+    "simple": lambda d, interest_dict: {
+        "schedule": simple_eir_calculation(d, interest_dict)[0]
+    },
+    "complex": lambda d, interest_dict: {
+        "schedule": complex_eir_calculation(d, interest_dict)
+    },
+    "ledger": lambda d, interest_dict: {
+        "schedule": ledger_eir_calculation(d, interest_dict)
+    },
+    "comparision": lambda d, interest_dict: dict(
+        zip(
+            ("schedule", "summary", "complex_time", "simple_time", "efficiency"),
+            comparision(d, interest_dict),
+        )
+    ),
+}
+
+
+@app.route("/api/v1/eir", methods=["POST"])
+def api_eir():
+    body = request.get_json(silent=True)
+    if isinstance(body, dict) and "deals" not in body:
+        body = {"deals": [body], "engine": body.get("engine")}
+    if not isinstance(body, dict) or not isinstance(body.get("deals"), list):
+        return json_response({"error": "Invalid request"}, 400)
+    engine = body.get("engine") or "complex"
+    if engine not in API_ENGINES:
+        return json_response({"error": f"Invalid engine: {engine}"}, 400)
+
+    results = list()
+    for row in body["deals"]:
+        if not isinstance(row, dict):
+            results.append({"deal_id": None, "error": "Invalid deal"})
+            continue
+        try:
+            fields, fixing_dates, fixing_rates = get_json_deal(
+                {key: value for key, value in row.items() if key != "engine"}
+            )
+            deal = get_deal(fields)
+            interest_dict = get_interest_dict(deal, fixing_dates, fixing_rates)
+            result = API_ENGINES[engine](deal, interest_dict)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            results.append({"deal_id": row.get("deal_id"), "error": str(e)})
+            continue
+        for report in ("schedule", "summary"):
+            if report in result:
+                result[report] = result[report].to_columns(None)
+        results.append({"deal_id": deal["deal_id"], **result})
+    return json_response({"engine": engine, "results": results})
+
+
+"""
+The sensitivity API takes one deal as above, with the rate shocks in basis points, eg. {..., "shocks": [-100, 0, 100]}.
+Without shocks the deal is shocked from -300bp to +300bp in steps of 25bp. The cube columns are returned as one list per scenario.
+"""
+DEFAULT_SHOCKS = list(range(-300, 301, 25))
+MAX_SHOCKS = 1000
+
+
+@app.route("/api/v1/sensitivity", methods=["POST"])
+def api_sensitivity():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return json_response({"error": "Invalid request"}, 400)
+    shocks = body.get("shocks", DEFAULT_SHOCKS)
+    if (
+        not isinstance(shocks, list)
+        or not 0 < len(shocks) <= MAX_SHOCKS
+        or not all(isinstance(shock, (int, float)) and not isinstance(shock, bool) for shock in shocks)
+    ):
+        return json_response({"error": "Invalid shocks"}, 400)
+
+    try:
+        fields, fixing_dates, fixing_rates = get_json_deal(
+            {key: value for key, value in body.items() if key != "shocks"}
+        )
+        deal = get_deal(fields)
+        interest_dict = get_interest_dict(deal, fixing_dates, fixing_rates)
+        sensitivity = rate_sensitivity(deal, interest_dict, shocks)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return json_response({"deal_id": body.get("deal_id"), "error": str(e)}, 400)
+
+    return json_response(
+        {
+            "deal_id": deal["deal_id"],
+            "shocks": sensitivity.shocks.tolist(),
+            "dates": [str(date) for date in sensitivity.dates],
+            "effective_interest_rate": sensitivity.effective_interest_rate.tolist(),
+            "cube": {
+                "Nominal interest": sensitivity.nominal_interest.tolist(),
+                "Total cash flow": sensitivity.total_cash_flow.tolist(),
+                "Effective interest": sensitivity.effective_interest.tolist(),
+                "Amortized cost": sensitivity.amortized_cost.tolist(),
+            },
+            "yearly": {
+                "Years": sensitivity.years.tolist(),
+                "Effective interest": sensitivity.yearly_effective_interest.tolist(),
+                "Amortized cost": sensitivity.yearly_amortized_cost.tolist(),
+            },
+        }
+    )
+
+
+"""
+The reset API keeps the schedule of a floating deal between requests. The deal is started once with the fixings so far,
+the same way as on the eir API, then each new fixing is posted on its own, eg. {"date": "2022-10-07", "rate": "5.92"},
+and only the periods from the reset date are recalculated.
+"""
+
+
+@app.route("/api/v1/deals", methods=["POST"])
+def api_start_deal():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return json_response({"error": "Invalid request"}, 400)
+    try:
+        fields, fixing_dates, fixing_rates = get_json_deal(body)
+        deal = get_deal(fields)
+        interest_dict = get_interest_dict(deal, fixing_dates, fixing_rates)
+        schedule = DEAL_STATES.start(deal, interest_dict)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return json_response({"deal_id": body.get("deal_id"), "error": str(e)}, 400)
+    return json_response({"deal_id": deal["deal_id"], "schedule": schedule.to_columns(None)}, 201)
+
+
+@app.route("/api/v1/deals/<deal_id>", methods=["GET"])
+def api_deal(deal_id):
+    try:
+        state = DEAL_STATES.get(deal_id)
+    except KeyError:
+        return json_response({"deal_id": deal_id, "error": f"Deal is not found: {deal_id}"}, 404)
+    return json_response(
+        {
+            "deal_id": deal_id,
+            "fixings": [
+                {"date": str(line["date"]), "rate": round(line["rate"] * 100, 6)}
+                for line in state.interest_dict
+            ],
+            "schedule": state.schedule.to_columns(None),
+        }
+    )
+
+
+@app.route("/api/v1/deals/<deal_id>/balances", methods=["GET"])
+def api_deal_balances(deal_id):
+    """The balances of the deal at one or more reporting dates, eg. ?date=2023-01-31&date=2023-02-28."""
+    try:
+        state = DEAL_STATES.get(deal_id)
+    except KeyError:
+        return json_response({"deal_id": deal_id, "error": f"Deal is not found: {deal_id}"}, 404)
+    try:
+        reporting_dates = [get_date(value) for value in request.args.getlist("date")]
+    except ValueError as e:
+        return json_response({"deal_id": deal_id, "error": str(e)}, 400)
+    if not reporting_dates:
+        return json_response({"deal_id": deal_id, "error": "No reporting date"}, 400)
+    index = deal_index(state.deal, state.schedule)
+    return json_response(
+        {"deal_id": deal_id, "balances": balance_rows(index, balances_at(index, reporting_dates, 0), None)}
+    )
+
+
+@app.route("/api/v1/deals/<deal_id>/resets", methods=["POST"])
+def api_reset(deal_id):
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return json_response({"error": "Invalid request"}, 400)
+    try:
+        reset_date = get_date(str(body.get("date")))
+        rate = get_interest_rate(str(body.get("rate")))
+        reset_date = get_payment_date(DEAL_STATES.get(deal_id).deal, reset_date)
+        schedule = DEAL_STATES.apply_reset(deal_id, reset_date, rate)
+    except KeyError:
+        return json_response({"deal_id": deal_id, "error": f"Deal is not found: {deal_id}"}, 404)
+    except (AttributeError, TypeError, ValueError) as e:
+        return json_response({"deal_id": deal_id, "error": str(e)}, 400)
+    return json_response({"deal_id": deal_id, "schedule": schedule.to_columns(None)})
+
+
+"""
+The job API queues a portfolio in the same format as the eir API, {"engine": ..., "deals": [...]}, and returns the job id at once.
+The status of the job, with its progress in %, is polled on the job url, and once it has finished the results are returned
+as on the eir API, or downloaded as the schedules and summary CSV files of the portfolio runner.
+"""
+
+
+@app.route("/api/v1/jobs", methods=["POST"])
+def api_submit_job():
+    body = request.get_json(silent=True)
+    if isinstance(body, dict) and "deals" not in body:
+        body = {"deals": [body], "engine": body.get("engine")}
+    if not isinstance(body, dict) or not isinstance(body.get("deals"), list) or not body["deals"]:
+        return json_response({"error": "Invalid request"}, 400)
+    engine = body.get("engine") or "complex"
+    if engine not in PORTFOLIO_ENGINES:
+        return json_response({"error": f"Invalid engine: {engine}"}, 400)
+    try:
+        deals = [
+            get_json_deal({key: value for key, value in row.items() if key != "engine"})
+            for row in body["deals"]
+        ]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return json_response({"error": "Invalid deal"}, 400)
+
+    job_id = JOBS.submit("portfolio", {"engine": engine, "deals": deals}, len(deals))
+    return json_response(
+        {"job_id": job_id, "status": "queued", "url": url_for("api_job", job_id=job_id)}, 202
+    )
+
+
+@app.route("/api/v1/jobs/<job_id>", methods=["GET"])
+def api_job(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return json_response({"job_id": job_id, "error": "Job is not found"}, 404)
+    job["job_id"] = job.pop("id")
+    if job["status"] == "finished":
+        job["result_url"] = url_for("api_job_result", job_id=job_id)
+    return json_response(job)
+
+
+@app.route("/api/v1/jobs/<job_id>/result", methods=["GET"])
+def api_job_result(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return json_response({"job_id": job_id, "error": "Job is not found"}, 404)
+    result = JOBS.result(job_id)
+    if result is None:
+        return json_response({"job_id": job_id, "status": job["status"], "error": "Job has not finished"}, 409)
+    return json_response(
+        {
+            "job_id": job_id,
+            "engine": result["engine"],
+            "results": [
+                {
+                    "deal_id": summary["Deal id"],
+                    "summary": summary,
+                    **({"error": summary["Error"]} if summary["Error"] else {"schedule": schedule.to_columns(None)}),
+                }
+                for schedule, summary in zip(result["schedules"], result["summaries"])
+            ],
+        }
+    )
+
+
+@app.route("/api/v1/jobs/<job_id>/balances", methods=["GET"])
+def api_job_balances(job_id):
+    """The balances of every deal of a finished portfolio at the reporting date, eg. ?date=2023-01-31, from the stored schedules."""
+    result = JOBS.result(job_id)
+    if result is None:
+        return json_response({"job_id": job_id, "error": "Job has not finished or is not found"}, 404)
+    try:
+        reporting_date = get_date(request.args.get("date", ""))
+    except ValueError as e:
+        return json_response({"job_id": job_id, "error": str(e)}, 400)
+    index = result.get("index")
+    return json_response(
+        {
+            "job_id": job_id,
+            "reporting_date": reporting_date,
+            "balances": [] if index is None else balance_rows(index, balances_at(index, reporting_date), None),
+        }
+    )
+
+
+@app.route("/api/v1/jobs/<job_id>/download/<report_type>", methods=["GET"])
+def api_job_download(job_id, report_type):
+    """Downloads the schedules of all the deals or the summary line of each deal as CSV, with ?gzip=1 as .csv.gz."""
+    if report_type not in ("schedules", "summary"):
+        return json_response({"error": f"Invalid report type: {report_type}"}, 404)
+    result = JOBS.result(job_id)
+    if result is None:
+        return json_response({"job_id": job_id, "error": "Job has not finished or is not found"}, 404)
+
+    if report_type == "summary":
+        chunks = csv_row_chunks(
+            SUMMARY_FIELDS,
+            ([summary[field] for field in SUMMARY_FIELDS] for summary in result["summaries"]),
+        )
+    else:
+        schedules = [schedule for schedule in result["schedules"] if schedule]
+        chunks = csv_row_chunks(
+            schedules[0].fields if schedules else (),
+            (row for schedule in schedules for row in schedule.values("")),
+        )
+    filename = f"{job_id}_{report_type}.csv"
+    mimetype = "text/csv"
+    if request.args.get("gzip") == "1":
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def json_response(data: dict, status: int = 200) -> Response:
+    """Serializes with orjson when it is installed, which is several times faster than the json module for large reports."""
+    if orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data, default=str, separators=(",", ":"))
+    return Response(body, status=status, mimetype="application/json")
+
+
+@app.route("/metrics")
+@talisman(force_https=False)
+def metrics_endpoint():
+    """Metrics of this worker in the Prometheus text format, it is served over plain http as well for the scraper."""
+    return Response(
+        metrics.prometheus_text() + metrics.result_cache_text(RESULT_CACHE.info()),
+        mimetype="text/plain; version=0.0.4",
     )
 
 
@@ -214,10 +635,88 @@ def index():
     return render_template("index.html")
 
 
-@app.template_filter("thousands")
-def thousands(value):
-    """ Format values with thousand separator """
-    try:
-        return "{:,.2f}".format(value)
-    except (ValueError, TypeError):
-        return value
+"""
+The reports are shown in pages of PAGE_SIZE rows, so the size of a page and the time to render it do not depend on the tenor of the deal.
+The rates are shown in % with the decimals below, every other float column is an amount shown with thousand separators.
+"""
+PAGE_SIZE = 50
+PERCENT_COLUMNS = {
+    "Nominal interest rate": 2,
+    "Effective interest rate": 2,
+    "Complex EIR": 2,
+    "Simple EIR": 2,
+    "Relative int. diff": 3,
+    "EIR difference": 3,
+}
+
+
+def schedule_page(schedule: Schedule, page: int, page_size: int = None) -> dict:
+    """
+    The rows of a page of the schedule (counted from 1) as lists of text, in the order of the columns of the schedule.
+    The amounts of the page are formatted together as one block, and the rates as one block per number of decimals,
+    instead of cell by cell. The page size is PAGE_SIZE by default.
+    """
+    page_size = page_size or PAGE_SIZE
+    pages = max(1, math.ceil(len(schedule) / page_size))
+    if not 1 <= page <= pages:
+        raise ValueError(f"Page is not found: {page}")
+    rows = slice((page - 1) * page_size, min(page * page_size, len(schedule)))
+    length = rows.stop - rows.start
+
+    cells = dict()
+    blocks = dict()
+    for name in schedule.fields:
+        if name in schedule.metadata:
+            cells[name] = np.full(length, str(schedule.metadata[name]))
+            continue
+        column = schedule.column(name)[rows]
+        if column.dtype.kind == "M":
+            cells[name] = np.datetime_as_string(column)
+        elif column.dtype.kind != "f":
+            cells[name] = column.astype(str)
+        else:
+            blocks.setdefault(PERCENT_COLUMNS.get(name), list()).append(name)
+
+    for decimals, names in blocks.items():
+        block = np.column_stack([schedule.column(name)[rows] for name in names])
+        text = format_amounts(block) if decimals is None else format_percents(block, decimals)
+        cells.update(zip(names, text.T))
+
+    return {
+        "page": page,
+        "pages": pages,
+        "rows": np.column_stack([cells[name] for name in schedule.fields]).tolist() if length else [],
+    }
+
+
+def format_amounts(values: np.ndarray) -> np.ndarray:
+    """
+    Formats the amounts of a whole array at once with two decimals and thousand separators, NaN (no value in the period) is left empty.
+    The numbers are formatted with two decimals first, then the whole part is split into groups of three digits with integer arithmetic and joined from the highest group down.
+    """
+    missing = np.isnan(values)
+    text = np.char.mod("%.2f", np.abs(np.where(missing, 0.0, values)))
+    whole, _, fraction = np.char.partition(text, ".").transpose(-1, *range(text.ndim))
+    units = whole.astype(np.int64)
+    groups = [units % 1000]
+    while (units >= 1000).any():
+        units = units // 1000
+        groups.append(units % 1000)
+
+    grouped = np.char.mod("%d", groups[-1])
+    started = groups[-1] > 0
+    for group in reversed(groups[:-1]):
+        grouped = np.where(
+            started,
+            np.char.add(np.char.add(grouped, ","), np.char.mod("%03d", group)),
+            np.char.mod("%d", group),
+        )
+        started |= group > 0
+
+    formatted = np.char.add(np.char.add(np.where(np.signbit(values), "-", ""), grouped), np.char.add(".", fraction))
+    return np.where(missing, "", formatted)
+
+
+def format_percents(values: np.ndarray, decimals: int = 2) -> np.ndarray:
+    """Formats the rates of a whole array at once in % with the given decimals, NaN (no value in the period) is left empty."""
+    return np.where(np.isnan(values), "", np.char.mod(f"%.{decimals}f%%", values))
@@ -0,0 +1,357 @@
+"""
+Benchmark suite of the calculation engines on synthetic deals, so that the performance can be measured reproducibly and compared over time.
+
+    python benchmark.py --output benchmark.json
+    python benchmark.py --quick --output after.json --compare before.json
+
+The synthetic deals cover both structures, every registered day count, monthly to annual interest frequencies,
+tenors up to 50 years and 0 to all periods with a rate reset. For each deal the date generation, the interest cash flows,
+the effective interest calculation and the complex, simple and comparision engines are timed separately.
+Each function is run a number of warmup times first, which are not recorded, then timed a number of repeats.
+The cached payment schedules are cleared before every timed run, so the engines are measured from a cold cache.
+
+The results are saved as JSON with the environment they were run in, and can be compared to an earlier run with --compare,
+which prints the ratio of the median times of each function.
+
+With --startup the import time of the app and the library entry points is measured instead, each in a fresh interpreter
+with python -X importtime, which is what a gunicorn worker pays when it boots. The total and the modules that take
+the longest to import themselves are reported for each entry point.
+
+    python benchmark.py --startup --output startup.json
+"""
+
+import argparse
+from datetime import date, datetime, timezone
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+
+from eir import (
+    DAYCOUNTS,
+    calculate_effective_interest,
+    clear_schedule_cache,
+    comparision,
+    complex_eir_calculation,
+    generate_cf_dates,
+    generate_principal_balances,
+    generate_total_cf,
+    interest_cf,
+    simple_eir_calculation,
+)
+
+STRUCTURES = ("bullet", "amortizing")
+FREQUENCIES = (1, 3, 6, 12)
+TENORS = (1, 5, 10, 30, 50)
+"""The number of rate resets is given as a share of the payments, so it scales with the tenor and the frequency."""
+RESETS = (0.0, 0.5, 1.0)
+
+ENTRY_POINTS = ("app", "eir", "get_data", "portfolio")
+
+QUICK_GRID = {
+    "structures": STRUCTURES,
+    "daycounts": ("actual_actual", "thirty_360"),
+    "frequencies": (1, 12),
+    "tenors": (1, 30),
+    "resets": (0.0, 1.0),
+}
+
+
+def synthetic_deal(
+    structure: str,
+    daycount: str,
+    frequency: int,
+    tenor: int,
+    resets: float,
+    seed: int = 0,
+) -> tuple[dict, list]:
+    """
+    Builds a deal in the same form as get_deal does, starting on 2021-04-07 with a short first period of two months,
+    and its interest dictionary. A deal without resets is a fixed rate deal, otherwise the first payments of the deal
+    get a new floating rate each, with rates drawn from a seeded random generator around 5%.
+    """
+    start_date = date(2021, 4, 7)
+    first_interest_date = date(2021, 6, 7)
+    end_date = date(2021 + tenor, 4, 7)
+    dates, number_of_payments = generate_cf_dates(
+        start_date, end_date, first_interest_date, frequency
+    )
+    rate = 0.05
+    d = {
+        "functional_ccy": "USD",
+        "deal_id": f"{structure}_{daycount}_{frequency}m_{tenor}y_{resets:g}",
+        "principal_amount": 100_000_000.0,
+        "deal_ccy": "USD",
+        "deal_fx_rate": "",
+        "discount": "",
+        "premium": "",
+        "setup_costs": 1_000_000.0,
+        "start_date": start_date,
+        "end_date": end_date,
+        "first_interest_date": first_interest_date,
+        "interest_rate": rate,
+        "structure": structure,
+        "interest_freq": frequency,
+        "daycount": daycount,
+        "interest_type": "floating" if resets else "fixed",
+        "capitalized_finance_costs": 1_000_000.0,
+    }
+
+    generator = random.Random(seed)
+    number_of_resets = round(resets * (number_of_payments - 1))
+    interest_dict = [{"date": dates[1], "rate": rate}] + [
+        {"date": dates[i], "rate": round(rate + generator.uniform(-0.01, 0.01), 5)}
+        for i in range(2, number_of_resets + 2)
+    ]
+    return d, interest_dict
+
+
+def benchmark_functions(d: dict, interest_dict: list) -> dict:
+    """
+    The functions timed for a deal, each without arguments. The inputs of the lower level functions are calculated
+    here once, so only the function itself is timed.
+    """
+    dates, number_of_payments = generate_cf_dates(
+        d["start_date"], d["end_date"], d["first_interest_date"], d["interest_freq"]
+    )
+    principal_balance = generate_principal_balances(
+        d["structure"], d["principal_amount"], number_of_payments
+    )
+    rates = [d["interest_rate"]] * number_of_payments
+    nominal_interest = interest_cf(
+        dates, rates, d["daycount"], d["interest_freq"], principal_balance, number_of_payments
+    )
+    total_cash_flow = generate_total_cf(
+        d["principal_amount"],
+        d["capitalized_finance_costs"],
+        d["structure"],
+        nominal_interest,
+        number_of_payments,
+    )
+    return {
+        "generate_cf_dates": lambda: generate_cf_dates(
+            d["start_date"], d["end_date"], d["first_interest_date"], d["interest_freq"]
+        ),
+        "interest_cf": lambda: interest_cf(
+            dates, rates, d["daycount"], d["interest_freq"], principal_balance, number_of_payments
+        ),
+        "calculate_effective_interest": lambda: calculate_effective_interest(
+            d["interest_rate"],
+            dates,
+            total_cash_flow,
+            nominal_interest,
+            d["capitalized_finance_costs"],
+            number_of_payments,
+        ),
+        "complex_eir_calculation": lambda: complex_eir_calculation(d, interest_dict),
+        "simple_eir_calculation": lambda: simple_eir_calculation(d, interest_dict),
+        "comparision": lambda: comparision(d, interest_dict),
+    }
+
+
+def time_function(function, warmup: int = 1, repeats: int = 5) -> list:
+    """Runs the function warmup times, then returns the seconds of each of the repeats, each from a cold schedule cache."""
+    for _ in range(warmup):
+        clear_schedule_cache()
+        function()
+    times = list()
+    for _ in range(repeats):
+        clear_schedule_cache()
+        start = timeit.default_timer()
+        function()
+        times.append(timeit.default_timer() - start)
+    return times
+
+
+def run_benchmark(
+    structures: tuple = STRUCTURES,
+    daycounts: tuple = None,
+    frequencies: tuple = FREQUENCIES,
+    tenors: tuple = TENORS,
+    resets: tuple = RESETS,
+    functions: tuple = None,
+    warmup: int = 1,
+    repeats: int = 5,
+) -> dict:
+    """
+    Times the functions on every combination of the deal parameters, by default on every registered day count and every function.
+    Returns the environment of the run and one result per deal and function with the median, minimum, mean and all times in seconds.
+    """
+    daycounts = daycounts or tuple(sorted(DAYCOUNTS))
+    results = list()
+    for structure, daycount, frequency, tenor, share in itertools.product(
+        structures, daycounts, frequencies, tenors, resets
+    ):
+        d, interest_dict = synthetic_deal(structure, daycount, frequency, tenor, share)
+        case = {
+            "structure": structure,
+            "daycount": daycount,
+            "frequency": frequency,
+            "tenor": tenor,
+            "resets": len(interest_dict) - 1,
+        }
+        for name, function in benchmark_functions(d, interest_dict).items():
+            if functions and name not in functions:
+                continue
+            times = time_function(function, warmup, repeats)
+            results.append(
+                {
+                    "function": name,
+                    **case,
+                    "median": statistics.median(times),
+                    "min": min(times),
+                    "mean": statistics.fmean(times),
+                    "times": times,
+                }
+            )
+    return {
+        "environment": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "warmup": warmup,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def result_key(result: dict) -> tuple:
+    return tuple(
+        result[key] for key in ("function", "structure", "daycount", "frequency", "tenor", "resets")
+    )
+
+
+def compare(baseline: dict, current: dict) -> dict:
+    """
+    Compares two runs on the deals and functions present in both.
+    Returns the geometric mean of the ratios of the median times per function, where below 1 means the current run is faster.
+    """
+    baseline_medians = {result_key(result): result["median"] for result in baseline["results"]}
+    ratios = dict()
+    for result in current["results"]:
+        key = result_key(result)
+        if key in baseline_medians and baseline_medians[key] > 0:
+            ratios.setdefault(result["function"], list()).append(
+                result["median"] / baseline_medians[key]
+            )
+    return {
+        function: statistics.geometric_mean(values) for function, values in ratios.items()
+    }
+
+
+def import_times(module: str) -> dict:
+    """
+    Imports the module in a fresh interpreter with -X importtime and returns the self and cumulative microseconds of each imported module.
+    The interpreter runs in a temporary directory, so the app writes its session and result files there.
+    """
+    path = [os.path.dirname(os.path.abspath(__file__))] + os.environ.get("PYTHONPATH", "").split(os.pathsep)
+    with tempfile.TemporaryDirectory() as directory:
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=directory,
+            env=dict(
+                os.environ,
+                PYTHONPATH=os.pathsep.join(filter(None, path)),
+                RESULT_STORE_DIR=os.path.join(directory, "result_store"),
+            ),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    times = dict()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def startup_benchmark(modules: tuple = ENTRY_POINTS, repeats: int = 5, top: int = 10) -> dict:
+    """
+    Measures the import time of each entry point repeats times. Returns the median total in seconds
+    and the modules with the largest median self time, which are the candidates for importing lazily.
+    """
+    results = list()
+    for module in modules:
+        runs = [import_times(module) for _ in range(repeats)]
+        totals = [run[module][1] / 1e6 for run in runs]
+        self_times = {
+            name: statistics.median(run.get(name, (0, 0))[0] for run in runs) / 1e6
+            for name in runs[0]
+        }
+        results.append(
+            {
+                "module": module,
+                "median": statistics.median(totals),
+                "min": min(totals),
+                "times": totals,
+                "slowest_modules": dict(
+                    sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:top]
+                ),
+            }
+        )
+    return {
+        "environment": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": repeats,
+        },
+        "startup": results,
+    }
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the effective interest engines on synthetic deals.")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file of the results")
+    parser.add_argument("--compare", default=None, help="JSON file of an earlier run to compare with")
+    parser.add_argument("--quick", action="store_true", help="run a small grid of deals only")
+    parser.add_argument("--functions", nargs="*", default=None, help="time these functions only")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--startup", action="store_true", help="measure the import time of the entry points instead")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        run = startup_benchmark(repeats=args.repeats)
+        with open(args.output, "w") as file:
+            json.dump(run, file, indent=2)
+        for result in run["startup"]:
+            slowest = ", ".join(list(result["slowest_modules"])[:3])
+            print(f"import {result['module']:<24} {result['median']:>10.4f} s (slowest: {slowest})")
+        return
+
+    grid = QUICK_GRID if args.quick else {}
+    run = run_benchmark(
+        **grid, functions=args.functions, warmup=args.warmup, repeats=args.repeats
+    )
+    with open(args.output, "w") as file:
+        json.dump(run, file, indent=2, default=str)
+
+    totals = dict()
+    for result in run["results"]:
+        totals[result["function"]] = totals.get(result["function"], 0.0) + result["median"]
+    for function, total in totals.items():
+        print(f"{function:<30} {total:>10.4f} s (sum of medians)")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        for function, ratio in compare(baseline, run).items():
+            print(f"{function:<30} {ratio:>10.3f} x baseline")
+
+
+if __name__ == "__main__":
+    main()
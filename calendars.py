@@ -0,0 +1,156 @@
+"""
+Business day calendars for adjusting the payment dates of the deals to the days when the cash flows are actually paid.
+
+A calendar is loaded from a local holiday file, with one holiday per line in YYYY-MM-DD format. Empty lines and anything after #
+are ignored, and an optional "weekend" line sets the weekend days (Saturday and Sunday by default), eg. "weekend Fri Sat".
+The files are looked up by the name of the calendar in the calendars directory next to this module, or in CALENDAR_DIR.
+Calendars can also be built in code and added with register_calendar.
+
+When a calendar is loaded it is compiled into one business day flag per day over the years it covers, and two arrays
+with the index of the following and the preceding business day of each day. Adjusting a whole schedule is then a lookup
+into these arrays for all the dates at once, instead of checking the calendar date by date.
+"""
+
+import os
+import re
+import threading
+
+import numpy as np
+
+CALENDAR_DIR = os.environ.get(
+    "CALENDAR_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "calendars")
+)
+
+CONVENTIONS = ("unadjusted", "following", "modified_following", "preceding")
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+"""The calendars cover at least these years, more if the holidays go beyond them."""
+FIRST_YEAR = 1970
+LAST_YEAR = 2100
+
+
+class BusinessCalendar:
+    __slots__ = ("name", "holidays", "weekend", "origin", "business_days", "following", "preceding")
+
+    def __init__(self, name: str, holidays=(), weekend: tuple = (5, 6)):
+        """
+        The holidays are dates or YYYY-MM-DD strings and the weekend days are numbered from Monday as 0.
+        The days are indexed from the 1st of January of the first year covered, which is the origin.
+        A month is added on both ends, so every covered day has a following and a preceding business day.
+        """
+        self.name = name
+        self.holidays = np.unique(np.array(list(holidays), dtype="datetime64[D]"))
+        self.weekend = tuple(sorted(set(weekend)))
+        years = self.holidays.astype("datetime64[Y]").astype(np.int64) + 1970
+        first_year = min(FIRST_YEAR, int(years.min())) if len(years) else FIRST_YEAR
+        last_year = max(LAST_YEAR, int(years.max())) if len(years) else LAST_YEAR
+        self.origin = np.datetime64(f"{first_year}-01-01", "D") - 31
+        days = np.arange(self.origin, np.datetime64(f"{last_year + 1}-01-01", "D") + 31)
+
+        """The 1st of January 1970 is a Thursday, so the weekday of a day is its number of days from it plus 3, modulo 7."""
+        weekday = (days.astype(np.int64) + 3) % 7
+        self.business_days = ~np.isin(weekday, self.weekend)
+        self.business_days[(self.holidays - self.origin).astype(np.int64)] = False
+
+        index = np.arange(len(days), dtype=np.int32)
+        self.preceding = np.maximum.accumulate(np.where(self.business_days, index, -1))
+        self.following = np.minimum.accumulate(
+            np.where(self.business_days, index, len(days))[::-1]
+        )[::-1]
+        for array in (self.holidays, self.business_days, self.preceding, self.following):
+            array.flags.writeable = False
+
+    def __repr__(self) -> str:
+        return f"BusinessCalendar({self.name!r}, {len(self.holidays)} holidays)"
+
+    def _index(self, dates) -> np.ndarray:
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        index = (dates - self.origin).astype(np.int64)
+        if ((index < 31) | (index >= len(self.business_days) - 31)).any():
+            raise ValueError(f"Date is outside of the {self.name} calendar")
+        return index
+
+    def is_business_day(self, dates) -> np.ndarray:
+        return self.business_days[self._index(dates)]
+
+    def adjust(self, dates, convention: str) -> np.ndarray:
+        """
+        Moves the dates that are not business days to a business day, as a datetime64[D] array:
+        following moves them to the next business day, preceding to the previous one, and modified following
+        to the next one unless that is in the next month, in which case to the previous one.
+        """
+        if convention == "unadjusted":
+            return np.asarray(dates, dtype="datetime64[D]")
+        if convention not in CONVENTIONS:
+            raise ValueError("Invalid business day convention")
+        index = self._index(dates)
+        if convention == "preceding":
+            return self.origin + self.preceding[index]
+        adjusted = self.origin + self.following[index]
+        if convention == "modified_following":
+            next_month = adjusted.astype("datetime64[M]") != (self.origin + index).astype("datetime64[M]")
+            adjusted[next_month] = self.origin + self.preceding[index[next_month]]
+        return adjusted
+
+
+_calendars = dict()
+_calendars_lock = threading.Lock()
+
+
+def register_calendar(calendar: BusinessCalendar) -> BusinessCalendar:
+    """Adds the calendar under its name, replacing a calendar loaded from a file with the same name."""
+    with _calendars_lock:
+        _calendars[calendar.name] = calendar
+    return calendar
+
+
+def load_calendar(path: str, name: str = None) -> BusinessCalendar:
+    """Reads and compiles a holiday file, the name is the file name without the extension by default."""
+    holidays = list()
+    weekend = (5, 6)
+    with open(path) as file:
+        for line in file:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.lower().startswith("weekend"):
+                weekend = tuple(WEEKDAYS.index(day[:3].lower()) for day in line.split()[1:])
+            else:
+                holidays.append(line)
+    try:
+        return BusinessCalendar(
+            name or os.path.splitext(os.path.basename(path))[0], holidays, weekend
+        )
+    except ValueError:
+        raise ValueError(f"Invalid holiday file: {path}")
+
+
+def get_calendar(name: str) -> BusinessCalendar:
+    """The calendar with the name, loaded from its holiday file and compiled on first use."""
+    with _calendars_lock:
+        calendar = _calendars.get(name)
+    if calendar is not None:
+        return calendar
+    if not isinstance(name, str) or not re.fullmatch(r"[A-Za-z0-9_-]+", name):
+        raise ValueError("Invalid calendar")
+    path = os.path.join(CALENDAR_DIR, f"{name}.txt")
+    if not os.path.exists(path):
+        raise ValueError(f"Calendar is not found: {name}")
+    calendar = load_calendar(path, name)
+    with _calendars_lock:
+        return _calendars.setdefault(name, calendar)
+
+
+def available_calendars() -> list:
+    """The names of the registered calendars and of the holiday files in the calendars directory."""
+    names = set(_calendars)
+    if os.path.isdir(CALENDAR_DIR):
+        names.update(
+            os.path.splitext(file)[0] for file in os.listdir(CALENDAR_DIR) if file.endswith(".txt")
+        )
+    return sorted(names)
+
+
+"""Weekends only, for deals paid on weekdays without any holidays."""
+register_calendar(BusinessCalendar("weekends"))
@@ -0,0 +1,9 @@
+import pytest
+
+import eir
+
+
+@pytest.fixture(autouse=True)
+def no_result_cache(monkeypatch):
+    """The calculations are not memoized in the tests, unless a test configures a result cache of its own."""
+    monkeypatch.setattr(eir, "_result_cache", None)
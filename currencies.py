@@ -0,0 +1,41 @@
+"""
+ISO 4217 currency codes for validating the currencies of the deals, and the minor units of the currencies,
+shipped with the package so that validation does not need a currency library or network access.
+
+The active codes are those of the ISO 4217 list of current currencies and funds, without the precious metals and the testing codes.
+Codes withdrawn in recent years are still accepted, as deals starting before the withdrawal can be in those currencies.
+"""
+
+ACTIVE = frozenset(
+    """
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB BOV BRL BSD BTN BWP BYN BZD
+    CAD CDF CHE CHF CHW CLF CLP CNY COP COU CRC CUP CVE CZK DJF DKK DOP DZD EGP ERN ETB EUR FJD FKP
+    GBP GEL GHS GIP GMD GNF GTQ GYD HKD HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY
+    KES KGS KHR KMF KPW KRW KWD KYD KZT LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK
+    MXN MXV MYR MZN NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF
+    SAR SBD SCR SDG SEK SGD SHP SLE SOS SRD SSP STN SVC SYP SZL THB TJS TMT TND TOP TRY TTD TWD TZS
+    UAH UGX USD USN UYI UYU UYW UZS VED VES VND VUV WST XAF XCD XDR XOF XPF YER ZAR ZMW ZWG
+    """.split()
+)
+
+WITHDRAWN = frozenset(
+    """
+    BYR CUC EEK HRK LTL LVL MRO SLL STD VEF ZMK ZWL
+    """.split()
+)
+
+CURRENCIES = ACTIVE | WITHDRAWN
+
+"""
+The number of decimals of the minor unit (eg. 2 for cents) of the currencies where it is not 2, from the ISO 4217 list.
+The amounts of the ledger calculation are held as whole minor units of the currency.
+"""
+MINOR_UNIT_EXPONENTS = {
+    "BHD": 3, "BIF": 0, "BYR": 0, "CLF": 4, "CLP": 0, "DJF": 0, "GNF": 0, "IQD": 3, "ISK": 0,
+    "JOD": 3, "JPY": 0, "KMF": 0, "KRW": 0, "KWD": 3, "LYD": 3, "OMR": 3, "PYG": 0, "RWF": 0,
+    "TND": 3, "UGX": 0, "UYI": 0, "UYW": 4, "VND": 0, "VUV": 0, "XAF": 0, "XOF": 0, "XPF": 0,
+}
+
+
+def minor_unit_exponent(code: str) -> int:
+    return MINOR_UNIT_EXPONENTS.get(code, 2)
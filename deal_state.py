@@ -0,0 +1,105 @@
+"""
+Persisted schedule state of floating rate deals, so a new rate fixing does not need the whole deal and rate history again.
+
+A deal is started once with its fixings so far, which runs the complex calculation and stores the deal, the fixings and the schedule.
+Each new fixing is then applied with apply_reset: the periods before the reset date are locked as they are in the stored schedule,
+the principal balance and capitalized finance costs at the reset date are carried forward, and only the remaining periods are recalculated,
+with the effective interest rate solved from the last one. The cost of a reset depends on the remaining periods, not the number of earlier resets.
+
+The states are kept in a local SQLite database like the result cache, so every worker process of the app sees the same deals.
+A reset reads and writes the state in one transaction, so two resets of the same deal at the same time are applied one after the other.
+"""
+
+from datetime import date
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+import zlib
+
+from eir import apply_rate_reset, complex_eir_calculation
+from schedule import Schedule
+
+
+class DealState(NamedTuple):
+    deal: dict
+    interest_dict: list
+    schedule: Schedule
+
+
+class DealStateStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """The connection of the current thread, opened again in a forked worker process."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS deals (deal_id TEXT PRIMARY KEY, state BLOB, updated REAL)"
+        )
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, connection: sqlite3.Connection, state: DealState) -> None:
+        value = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        connection.execute(
+            "INSERT OR REPLACE INTO deals VALUES (?, ?, ?)",
+            (state.deal["deal_id"], value, time.time()),
+        )
+
+    def _read(self, connection: sqlite3.Connection, deal_id: str) -> DealState:
+        row = connection.execute("SELECT state FROM deals WHERE deal_id = ?", (deal_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Deal is not found: {deal_id}")
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def start(self, d: dict, interest_dict: list) -> Schedule:
+        """
+        Calculates the deal with the complex calculation and stores its state, replacing any earlier state of the same deal id.
+        Only floating rate deals can be reset. The deal id is the key of the state, so it has to be given,
+        and cannot contain "/" as it is looked up by its URL on the API.
+        """
+        deal_id = d.get("deal_id")
+        if not isinstance(deal_id, str) or not deal_id.strip() or "/" in deal_id:
+            raise ValueError("Invalid deal id, the deal id is required to store the deal")
+        if d["interest_type"] != "floating":
+            raise ValueError("Rate resets can only be applied to floating rate deals")
+        state = DealState(dict(d), list(interest_dict), complex_eir_calculation(d, interest_dict))
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            self._write(connection, state)
+        return state.schedule
+
+    def get(self, deal_id: str) -> DealState:
+        """Returns the stored state of the deal, or raises KeyError if the deal has not been started."""
+        return self._read(self._connection(), deal_id)
+
+    def apply_reset(self, deal_id: str, reset_date: date, rate: float) -> Schedule:
+        """Applies the new rate (as a decimal) from the reset date to the stored schedule of the deal and returns the updated schedule."""
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            state = self._read(connection, deal_id)
+            interest_dict, schedule = apply_rate_reset(
+                state.deal, state.interest_dict, state.schedule, reset_date, rate
+            )
+            self._write(connection, DealState(state.deal, interest_dict, schedule))
+        return schedule
+
+    def delete(self, deal_id: str) -> bool:
+        connection = self._connection()
+        with connection:
+            return connection.execute("DELETE FROM deals WHERE deal_id = ?", (deal_id,)).rowcount > 0
@@ -1,11 +1,68 @@
-import calendar
+from collections import OrderedDict
 from datetime import date
-from dateutil.relativedelta import relativedelta
-from scipy.optimize import least_squares
-import timeit
+import functools
+import numpy as np
+import threading
+from typing import NamedTuple
 
+from calendars import get_calendar
+from currencies import minor_unit_exponent
+import metrics
+from schedule import Schedule
 
-def complex_eir_calculation(d: dict, interest_dict: list) -> list:
+"""
+The results of the engines can be memoized in a ResultCache (see result_cache.py), which is shared by every process using the same cache file.
+It is off by default, the app and library callers switch it on with configure_result_cache.
+"""
+_result_cache = None
+
+
+def configure_result_cache(cache) -> None:
+    """Sets the ResultCache used by the engines, or switches memoization off with None."""
+    global _result_cache
+    _result_cache = cache
+
+
+def memoized(engine: str, timings: int = 0):
+    """
+    Looks up the result of the engine in the result cache before calculating it, when a cache is configured.
+    Calls with anything more than the deal and the interest dictionary, like the shared intermediates of the comparision, are always calculated.
+
+    The last timings elements of the result are the times measured while it was calculated. They are not cached,
+    so a result taken from the cache has None in their place instead of the times of the run that first calculated it.
+    """
+
+    def decorate(calculate):
+        @functools.wraps(calculate)
+        def wrapper(d: dict, interest_dict: list, *args, **kwargs):
+            cache = _result_cache
+            if cache is None or args or kwargs:
+                return calculate(d, interest_dict, *args, **kwargs)
+            if not timings:
+                return cache.get_or_calculate(engine, d, interest_dict, calculate)
+
+            measured = list()
+
+            def calculate_without_timings(d: dict, interest_dict: list) -> tuple:
+                result = calculate(d, interest_dict)
+                measured.append(result[-timings:])
+                return result[:-timings] + (None,) * timings
+
+            result = cache.get_or_calculate(engine, d, interest_dict, calculate_without_timings)
+            return result[:-timings] + measured[0] if measured else result
+
+        return wrapper
+
+    return decorate
+
+
+@memoized("complex")
+def complex_eir_calculation(
+    d: dict,
+    interest_dict: list,
+    principal_balance: list = None,
+    initial_rate: float = None,
+) -> Schedule:
     """
     This function calculates the effective interest in the way recommended by auditors.
     Various lists are generated from the user input, where each list represents a column of the output report.
@@ -16,16 +73,27 @@ def complex_eir_calculation(d: dict, interest_dict: list) -> list:
     Then use these new cash flows to recalculate the effective interest and overwrite the schedule for future periods.
 
     The first 3 columns are universal in a sense that they only need to be calculated once on each user input.
+    When the principal balances and the effective interest rate at initial recognition have already been calculated,
+    eg. by the comparision, they can be passed in and are not calculated again.
     """
 
-    dates, number_of_payments = generate_cf_dates(
-        d["start_date"], d["end_date"], d["first_interest_date"], d["interest_freq"]
-    )
-    principal_balance = generate_principal_balances(
-        d["structure"], d["principal_amount"], number_of_payments
-    )
+    schedule = deal_schedule(d)
+    dates, number_of_payments = schedule.dates, schedule.number_of_payments
+    if principal_balance is None:
+        principal_balance = generate_principal_balances(
+            d["structure"], d["principal_amount"], number_of_payments
+        )
     final_interest_rates = interest_rates(interest_dict, number_of_payments)
 
+    """
+    The following arrays are shared by all the recalculations, each recalculation only works on a view of the remaining periods.
+    The year fractions and the accrual factors come from the cached payment schedule, so neither needs to be recalculated for each interest rate.
+    """
+    fractions = schedule.year_fractions
+    accrual = schedule.accrual_factors
+    balances = np.asarray(principal_balance, dtype=np.float64)
+    floating_total_cf = np.zeros(number_of_payments + 1, dtype=np.float64)
+
     """
     The following lists need to be recalculated for each period with a new interest rate.
     For fixed rate instruments the lists are only generated once.
@@ -46,102 +114,201 @@ def complex_eir_calculation(d: dict, interest_dict: list) -> list:
     The list of interest_dict comes from user input. For fixed rate instruments it contains one item,
     for floating rate instuments it can contain a number of items between one and the number of payments.
     The actual length depends on how many rates the user input.
+    Each solve starts from the effective interest rate of the previous one, as a reset only moves it slightly.
     """
-    for i in range(len(interest_dict)):
-        floating_interest_rate = [
-            interest_dict[i]["rate"] for _ in range(number_of_payments - i)
-        ]
-        floating_coupon = interest_cf(
-            dates[i:],
-            floating_interest_rate,
-            d["daycount"],
-            d["interest_freq"],
-            principal_balance[i:],
-            (number_of_payments - i),
-        )
-        floating_total_cf = generate_total_cf(
-            principal_balance[i],
-            final_capitalized_costs[i],
-            d["structure"],
-            floating_coupon,
-            (number_of_payments - i),
+    effective_interest_rate = final_interest_rates[0]
+    with metrics.stage("complex_resets"):
+        for i in range(len(interest_dict)):
+            floating_coupon = interest_dict[i]["rate"] * accrual[i:] * balances[i:-1]
+
+            remaining_cash_flows(
+                d["structure"], balances, final_capitalized_costs[i], floating_coupon, i, floating_total_cf
+            )
+
+            if i == 0 and initial_rate is not None:
+                effective_interest_rate = initial_rate
+            else:
+                effective_interest_rate, iterations, evaluations = solve_effective_interest_rate(
+                    fractions[i:], floating_total_cf[i:], guess=effective_interest_rate
+                )
+                metrics.record_solver(iterations, evaluations)
+
+            """
+            This conditional ensures that the values for the periods that have already passed are fixed and
+            only the periods that are affected by the new interest rate are updated.
+            Until the last interest rate only the first period of the recalculated schedule is needed,
+            so the schedule is only built for that one period.
+            The total cash flow and the capitalised costs are updated with index 1 as index 0 was set above.
+            """
+            if i < (len(interest_dict) - 1):
+                (
+                    floating_effective_interest,
+                    floating_amortized_cost,
+                    floating_amortization_schedule,
+                    floating_eir,
+                    floating_capitalized_costs,
+                ) = effective_interest_schedule(
+                    effective_interest_rate,
+                    fractions[i : i + 1],
+                    floating_total_cf[i : i + 2],
+                    floating_coupon[:1],
+                    final_capitalized_costs[i],
+                )
+                final_nominal_interest.append(float(floating_coupon[0]))
+                final_total_cash_flow.append(float(floating_total_cf[i + 1]))
+                final_effective_interest.append(floating_effective_interest[0])
+                final_amortized_cost.append(floating_amortized_cost[0])
+                final_amortization_schedule.append(floating_amortization_schedule[0])
+                final_eir.append(floating_eir[0])
+                final_capitalized_costs.append(floating_capitalized_costs[1])
+            else:
+                (
+                    floating_effective_interest,
+                    floating_amortized_cost,
+                    floating_amortization_schedule,
+                    floating_eir,
+                    floating_capitalized_costs,
+                ) = effective_interest_schedule(
+                    effective_interest_rate,
+                    fractions[i:],
+                    floating_total_cf[i:],
+                    floating_coupon,
+                    final_capitalized_costs[i],
+                )
+                final_nominal_interest.extend(floating_coupon.tolist())
+                final_total_cash_flow.extend(floating_total_cf[i + 1 :].tolist())
+                final_effective_interest.extend(floating_effective_interest)
+                final_amortized_cost.extend(floating_amortized_cost)
+                final_amortization_schedule.extend(floating_amortization_schedule)
+                final_eir.extend(floating_eir)
+                final_capitalized_costs.extend(floating_capitalized_costs[1:])
+
+    return schedule_report(
+        d,
+        dates,
+        principal_balance,
+        final_interest_rates,
+        final_nominal_interest,
+        final_total_cash_flow,
+        final_capitalized_costs,
+        final_amortized_cost,
+        final_effective_interest,
+        final_amortization_schedule,
+        final_eir,
+    )
+
+
+def remaining_cash_flows(
+    structure: str,
+    balances: np.ndarray,
+    capitalized_cost: float,
+    coupon: np.ndarray,
+    i: int,
+    total_cash_flow: np.ndarray,
+) -> None:
+    """
+    Writes the total cash flows of the periods remaining from a rate reset in period i into total_cash_flow[i:],
+    following the same rules as generate_total_cf with the current principal balance and capitalized costs.
+    """
+    total_cash_flow[i] = (balances[i] * -1) + capitalized_cost
+    if structure == "bullet":
+        total_cash_flow[i + 1 :] = coupon
+        total_cash_flow[-1] += balances[i]
+    else:
+        total_cash_flow[i + 1 :] = np.round(
+            (balances[i] / (len(balances) - 1 - i)) + coupon, 2
         )
-        (
-            floating_effective_interest,
-            floating_amortized_cost,
-            floating_amortization_schedule,
-            floating_eir,
-            floating_capitalized_costs,
-        ) = calculate_effective_interest(
-            final_interest_rates[i],
-            dates[(i):],
-            floating_total_cf,
-            floating_coupon,
-            final_capitalized_costs[i],
-            (number_of_payments - i),
-        )
-        """
-        This conditional ensures that the values for the periods that have already passed are fixed and
-        only the periods that are affected by the new interest rate are updated.
-        The total cash flow and the capitalised costs are updated with index 1 as index 0 was set above.
-        """
-        if i < (len(interest_dict) - 1):
-            final_nominal_interest.append(floating_coupon[0])
-            final_total_cash_flow.append(floating_total_cf[1])
-            final_effective_interest.append(floating_effective_interest[0])
-            final_amortized_cost.append(floating_amortized_cost[0])
-            final_amortization_schedule.append(floating_amortization_schedule[0])
-            final_eir.append(floating_eir[0])
-            final_capitalized_costs.append(floating_capitalized_costs[1])
-        else:
-            final_nominal_interest.extend(floating_coupon)
-            final_total_cash_flow.extend(floating_total_cf[1:])
-            final_effective_interest.extend(floating_effective_interest)
-            final_amortized_cost.extend(floating_amortized_cost)
-            final_amortization_schedule.extend(floating_amortization_schedule)
-            final_eir.extend(floating_eir)
-            final_capitalized_costs.extend(floating_capitalized_costs[1:])
 
+
+def apply_rate_reset(
+    d: dict,
+    interest_dict: list,
+    report: Schedule,
+    reset_date: date,
+    rate: float,
+) -> tuple[list, Schedule]:
     """
-    These empty items at the start of these lists are purley for presentation purposes, 
-    to make the lists equal in length and aligned to the correct dates.
+    Applies a new floating rate to a schedule of the complex calculation, without replaying the resets before it.
+
+    The report is the complex schedule for the interest_dict so far. The rate applies from the period ending on the reset date,
+    which has to be a payment date after the date of the last rate. The periods before it are locked as they are in the report,
+    and only the remaining periods are recalculated: their cash flows from the new rate, the principal balance and capitalized costs
+    carried forward to the reset date, then the effective interest rate is solved on the remaining periods only.
+    Periods between the last rate and the reset date keep the last rate, as if it had been fixed again for each of them.
+
+    Returns the interest dictionary including the new rate and the updated report,
+    which are the same as the complex calculation of the deal with the full interest dictionary.
     """
-    final_interest_rates = [""] + [
-        round(float(rate * 100), 2) for rate in final_interest_rates
-    ]
-    final_nominal_interest.insert(0, "")
-    final_effective_interest.insert(0, "")
-    final_amortization_schedule.insert(0, "")
-    final_eir.insert(0, "")
+    schedule = deal_schedule(d)
+    number_of_payments = schedule.number_of_payments
+    if reset_date not in schedule.dates:
+        raise ValueError(f"Date is not valid: {reset_date}")
+    """As in the interest dictionary, the date of a rate is the payment date at the end of the first period it applies to."""
+    i = schedule.dates.index(reset_date) - 1
+    last = len(interest_dict) - 1
+    if i <= last:
+        raise ValueError(f"Reset date has to be after the date of the last rate: {reset_date}")
 
     """
-    The output report is a list of dictionaries, where each dictionary is a row in the output report.
-    The +1 in the range represents the 0th row, which is not included in the number of payments.
+    The periods between the last rate and the reset date are reset to the last rate first, one at a time,
+    as the complex calculation expects a rate for each of them.
     """
-    complex_report = list()
-    for i in range(number_of_payments + 1):
-        complex_report.append(
-            {
-                "Deal id": d["deal_id"],
-                "Dates": dates[i],
-                "Currency": d["functional_ccy"],
-                "Principal balance": principal_balance[i],
-                "Nominal interest rate": final_interest_rates[i],
-                "Nominal interest": final_nominal_interest[i],
-                "Total cash flow": final_total_cash_flow[i],
-                "Capitalized finance costs": final_capitalized_costs[i],
-                "Amortized cost": final_amortized_cost[i],
-                "Effective interest": final_effective_interest[i],
-                "Amortization schedule": final_amortization_schedule[i],
-                "Effective interest rate": final_eir[i],
-            }
+    for k in range(last + 1, i):
+        interest_dict, report = apply_rate_reset(
+            d, interest_dict, report, schedule.dates[k + 1], interest_dict[-1]["rate"]
+        )
+    interest_dict = list(interest_dict) + [{"date": reset_date, "rate": rate}]
+
+    with metrics.stage("rate_reset"):
+        balances = report.column("Principal balance")
+        total_cash_flow = report.column("Total cash flow")
+        remaining_cash_flow = total_cash_flow.copy()
+        capitalized_costs = report.column("Capitalized finance costs")
+        coupon = rate * schedule.accrual_factors[i:] * balances[i:-1]
+        remaining_cash_flows(d["structure"], balances, capitalized_costs[i], coupon, i, remaining_cash_flow)
+
+        guess = report.column("Effective interest rate")[i + 1] / 100
+        effective_interest_rate, iterations, evaluations = solve_effective_interest_rate(
+            schedule.year_fractions[i:], remaining_cash_flow[i:], guess=guess
+        )
+        metrics.record_solver(iterations, evaluations)
+        (
+            effective_interest,
+            amortized_cost,
+            amortization_schedule,
+            eir,
+            floating_capitalized_costs,
+        ) = effective_interest_schedule(
+            effective_interest_rate,
+            schedule.year_fractions[i:],
+            remaining_cash_flow[i:],
+            coupon,
+            capitalized_costs[i],
         )
-    return complex_report
+
+    """
+    The periodic columns of the report have no value in period 0, so their period i is at row i + 1.
+    At row i the cash flow stays the payment of the period before, the opening amortized cost is only used for the solve.
+    """
+    return interest_dict, schedule_report(
+        d,
+        schedule.dates,
+        balances,
+        interest_rates(interest_dict, number_of_payments),
+        np.concatenate((report.column("Nominal interest")[1 : i + 1], coupon)),
+        np.concatenate((total_cash_flow[: i + 1], remaining_cash_flow[i + 1 :])),
+        np.concatenate((capitalized_costs[: i + 1], floating_capitalized_costs[1:])),
+        np.concatenate((report.column("Amortized cost")[:i], amortized_cost)),
+        np.concatenate((report.column("Effective interest")[1 : i + 1], effective_interest)),
+        np.concatenate((report.column("Amortization schedule")[1 : i + 1], amortization_schedule)),
+        np.concatenate((report.column("Effective interest rate")[1 : i + 1], eir)),
+    )
 
 
+@memoized("simple", timings=2)
 def simple_eir_calculation(
     d: dict, interest_dict: list
-) -> tuple[list, float, float]:
+) -> tuple[Schedule, float, float]:
     """
     The simple calculation uses as a different approach to calculate the same schedule as above.
     First an initial schedule is calculated, which is necessary for each instrument at initial recognition.
@@ -150,70 +317,438 @@ def simple_eir_calculation(
     Initally all columns are updated directly from the deal details without iteration.
     """
 
-    dates, number_of_payments = generate_cf_dates(
-        d["start_date"], d["end_date"], d["first_interest_date"], d["interest_freq"]
-    )
-    principal_balance = generate_principal_balances(
-        d["structure"], d["principal_amount"], number_of_payments
-    )
-    interest_rate = [interest_dict[0]["rate"] for _ in range(number_of_payments)]
-
-    nominal_interest = interest_cf(
-        dates,
-        interest_rate,
-        d["daycount"],
-        d["interest_freq"],
+    (
+        schedule,
         principal_balance,
-        number_of_payments,
-    )
-    total_cash_flow = generate_total_cf(
-        d["principal_amount"],
-        d["capitalized_finance_costs"],
-        d["structure"],
+        interest_rate,
         nominal_interest,
-        number_of_payments,
-    )
+        total_cash_flow,
+    ) = initial_cash_flows(d, interest_dict)
+    dates, number_of_payments = schedule.dates, schedule.number_of_payments
     """
-    The timeit function is used to measure the efficiency of the actual effective interest calculation.
+    The stage timer is used to measure the efficiency of the actual effective interest calculation, while it runs.
     It is measured here, as within the simple calcualtion this funciton is only called once, 
     whereas within the complex calcualtion it is called as many times as many interest rates are provided by the user.
     """
-    complex_time = timeit.timeit(
-        lambda: calculate_effective_interest(
+    with metrics.stage("effective_interest") as timer:
+        initial_schedule = calculate_effective_interest(
             d["interest_rate"],
             dates,
             total_cash_flow,
             nominal_interest,
             d["capitalized_finance_costs"],
             number_of_payments,
-        ),
-        number=1,
+            fractions=schedule.year_fractions,
+        )
+    complex_time = timer.seconds
+
+    report, simple_time = simple_report(
+        d,
+        interest_dict,
+        schedule,
+        principal_balance,
+        interest_rate,
+        nominal_interest,
+        total_cash_flow,
+        initial_schedule,
     )
+    if d["interest_type"] != "floating":
+        """In case of a fixed rate instrument the complex and the simple calcualtion yield the same result."""
+        simple_time = complex_time
+    """Apart from the actual report the function also returns the timings of the complex and 
+    simple effective interest calculations to be able to display them on the webpage."""
+    return report, complex_time, simple_time
+
+
+def simple_report(
+    d: dict,
+    interest_dict: list,
+    schedule: "PaymentSchedule",
+    principal_balance: list,
+    interest_rate: list,
+    nominal_interest: list,
+    total_cash_flow: list,
+    initial_schedule: tuple,
+) -> tuple[Schedule, float]:
+    """
+    Finishes the simple calculation from the schedule at initial recognition, which is the tuple returned by calculate_effective_interest.
+
+    In case the interest type is floating, the columns calculated above are reset by using the floating rates and
+    the floating effective interest function, which is the essence of the simple calculation.
+    In case of a fixed rate instrument the complex and the simple calcualtion yield the same result.
+    Apart from the report the time of the floating effective interest calculation is returned, which is zero for fixed rate instruments.
+    """
     (
         effective_interest,
         amortized_cost,
         amortization_schedule,
         eir,
         capitalized_finance_costs,
-    ) = calculate_effective_interest(
-        d["interest_rate"],
-        dates,
+    ) = initial_schedule
+    simple_time = 0.0
+    if d["interest_type"] == "floating":
+        interest_rate, nominal_interest, total_cash_flow = floating_cash_flows(
+            d, interest_dict, schedule, principal_balance
+        )
+        with metrics.stage("floating_effective_interest") as timer:
+            effective_interest, eir = calculate_floating_effective_interest(
+                schedule.dates,
+                d["interest_type"],
+                nominal_interest,
+                amortization_schedule,
+                amortized_cost,
+                schedule.number_of_payments,
+            )
+        simple_time = timer.seconds
+
+    report = schedule_report(
+        d,
+        schedule.dates,
+        principal_balance,
+        interest_rate,
+        nominal_interest,
         total_cash_flow,
+        capitalized_finance_costs,
+        amortized_cost,
+        effective_interest,
+        amortization_schedule,
+        eir,
+    )
+    return report, simple_time
+
+
+def batch_eir_calculation(deals: list, interest_dicts: list) -> tuple[np.ndarray, list]:
+    """
+    Runs the simple calculation for many deals at once, eg. for the month end revaluation of a whole portfolio.
+    Instead of solving the effective interest rate deal by deal, the year fractions and total cash flows of all deals
+    are padded into a (deal x period) array and all the rates are solved together by batch_solve_effective_interest_rates.
+    The interest_dicts are in the same order as the deals.
+
+    Returns the effective interest rates at initial recognition and the report of each deal.
+    """
+    inputs = [
+        initial_cash_flows(d, interest_dict)
+        for d, interest_dict in zip(deals, interest_dicts)
+    ]
+    fractions, total_cash_flow, _ = pad_deals(
+        [schedule.year_fractions for schedule, _, _, _, _ in inputs],
+        [np.asarray(cash_flow, dtype=np.float64) for _, _, _, _, cash_flow in inputs],
+    )
+    rates, iterations, evaluations = batch_solve_effective_interest_rates(
+        fractions,
+        total_cash_flow,
+        guess=np.array([d["interest_rate"] for d in deals], dtype=np.float64),
+    )
+    metrics.record_solver(iterations.sum(), evaluations, solves=len(deals))
+
+    reports = list()
+    for k, (d, interest_dict) in enumerate(zip(deals, interest_dicts)):
+        (
+            schedule,
+            principal_balance,
+            interest_rate,
+            nominal_interest,
+            total_cf,
+        ) = inputs[k]
+        number_of_payments = schedule.number_of_payments
+        initial_schedule = effective_interest_schedule(
+            rates[k],
+            fractions[k, :number_of_payments],
+            total_cash_flow[k, : number_of_payments + 1],
+            np.asarray(nominal_interest, dtype=np.float64),
+            d["capitalized_finance_costs"],
+        )
+        report, _ = simple_report(
+            d,
+            interest_dict,
+            schedule,
+            principal_balance,
+            interest_rate,
+            nominal_interest,
+            total_cf,
+            initial_schedule,
+        )
+        reports.append(report)
+    return rates, reports
+
+
+class Sensitivity(NamedTuple):
+    """
+    The result of rate_sensitivity. The shocks are in basis points and the rates in %.
+    The cube columns are (scenario x period) arrays: the nominal interest and the effective interest have one column per payment,
+    the total cash flow and the amortized cost start with period 0. The yearly columns are (scenario x year) arrays,
+    the effective interest of each year and the amortized cost at the year end.
+    """
+
+    shocks: np.ndarray
+    dates: np.ndarray
+    effective_interest_rate: np.ndarray
+    nominal_interest: np.ndarray
+    total_cash_flow: np.ndarray
+    effective_interest: np.ndarray
+    amortized_cost: np.ndarray
+    years: np.ndarray
+    yearly_effective_interest: np.ndarray
+    yearly_amortized_cost: np.ndarray
+
+
+def rate_sensitivity(d: dict, interest_dict: list, shocks: list) -> Sensitivity:
+    """
+    Shows how the effective interest rate, the effective interest and the amortized cost of a floating rate deal move
+    under parallel shifts of its interest rates, with the shocks given in basis points (eg. -300 to +300 in steps of 25).
+
+    Each scenario shifts every floating rate of the deal by the shock and calculates the schedule at initial recognition
+    from the shifted rates. The payment schedule, the principal balances and the year fractions are the same for every scenario,
+    so they are calculated once, and the interest cash flows, total cash flows and the effective interest schedules of all scenarios
+    are calculated together on (scenario x period) arrays, with all the rates solved at once by batch_solve_effective_interest_rates.
+    As a shock can take the rates below zero, the effective interest rates are solved between -50% and 100%.
+    """
+    if d["interest_type"] != "floating":
+        raise ValueError("Rate shocks can only be applied to floating rate deals")
+    schedule = deal_schedule(d)
+    number_of_payments = schedule.number_of_payments
+    shocks = np.asarray(shocks, dtype=np.float64)
+    balances = np.asarray(
+        generate_principal_balances(d["structure"], d["principal_amount"], number_of_payments),
+        dtype=np.float64,
+    )
+
+    with metrics.stage("cash_flows"):
+        rates = np.asarray(interest_rates(interest_dict, number_of_payments), dtype=np.float64)
+        scenario_rates = rates + shocks[:, None] / 10000
+        nominal_interest = scenario_rates * schedule.accrual_factors * balances[:-1]
+        if d["structure"] == "bullet":
+            repayments = np.zeros(number_of_payments)
+            repayments[-1] = d["principal_amount"]
+            periodic_cash_flow = nominal_interest + repayments
+        else:
+            periodic_cash_flow = np.round(
+                d["principal_amount"] / number_of_payments + nominal_interest, 2
+            )
+        total_cash_flow = np.hstack(
+            (
+                np.full((len(shocks), 1), d["capitalized_finance_costs"] - d["principal_amount"]),
+                periodic_cash_flow,
+            )
+        )
+
+    with metrics.stage("effective_interest"):
+        fractions = np.broadcast_to(schedule.year_fractions, nominal_interest.shape)
+        effective_interest_rate, iterations, evaluations = batch_solve_effective_interest_rates(
+            fractions, total_cash_flow, guess=scenario_rates[:, 0], lower=-0.5
+        )
+        metrics.record_solver(iterations.sum(), evaluations, solves=len(shocks))
+
+        """The same balances as in effective_interest_schedule, for one rate per scenario."""
+        growth = 1 + effective_interest_rate[:, None] * fractions
+        accumulated_growth = np.hstack((np.ones((len(shocks), 1)), np.cumprod(growth, axis=1)))
+        discounted_cash_flow = np.hstack(
+            (
+                np.zeros((len(shocks), 1)),
+                np.cumsum(total_cash_flow[:, 1:] / accumulated_growth[:, 1:], axis=1),
+            )
+        )
+        amortized_balances = accumulated_growth * (
+            total_cash_flow[:, :1] * (-1) - discounted_cash_flow
+        )
+        effective_interest = np.round(
+            amortized_balances[:, :-1] * effective_interest_rate[:, None] * fractions, 2
+        )
+        amortized_cost = np.round(amortized_balances, 2)
+
+    """The effective interest is added up for each year and the amortized cost is taken at the year end, as in the comparision."""
+    dates = np.array(schedule.dates, dtype="datetime64[D]")
+    years, first_rows = np.unique(
+        dates.astype("datetime64[Y]").astype(np.int64) + 1970, return_index=True
+    )
+    last_rows = np.append(first_rows[1:], len(dates)) - 1
+    yearly_effective_interest = np.add.reduceat(
+        np.hstack((np.zeros((len(shocks), 1)), effective_interest)), first_rows, axis=1
+    )
+
+    return Sensitivity(
+        shocks,
+        dates,
+        np.round(effective_interest_rate * 100, 4),
         nominal_interest,
-        d["capitalized_finance_costs"],
-        number_of_payments,
+        total_cash_flow,
+        effective_interest,
+        amortized_cost,
+        years,
+        yearly_effective_interest,
+        amortized_cost[:, last_rows],
     )
 
+
+class LedgerPostings(NamedTuple):
     """
-    In case the interest type is floating, the columns calculated above are reset by using the floating rates and
-    the floating effective interest function, which is the essence of the simple calculation.
-    In case of a fixed rate instrument the complex and the simple calcualtion yield the same result.
+    The columns of the ledger calculation, with all amounts as int64 whole minor units of the functional currency
+    (eg. cents, or yen for JPY) as posted to the general ledger. The balance columns start with period 0,
+    the periodic columns (nominal interest, effective interest, amortization) start with period 1.
+    The rates are floats, the nominal interest rates of each period and the effective interest rate at initial recognition.
+    """
+
+    exponent: int
+    dates: tuple
+    principal_balance: np.ndarray
+    interest_rate: np.ndarray
+    nominal_interest: np.ndarray
+    total_cash_flow: np.ndarray
+    capitalized_finance_costs: np.ndarray
+    amortized_cost: np.ndarray
+    effective_interest: np.ndarray
+    amortization_schedule: np.ndarray
+    effective_interest_rate: float
+
+
+def ledger_postings(d: dict, interest_dict: list) -> LedgerPostings:
+    """
+    The simple calculation with all monetary columns held as integer minor units, for exact tie-outs when posting to the general ledger.
+
+    The principal and the costs are converted into minor units once. The amortizing repayments are whole minor units that add up
+    to the principal exactly, the last repayments taking the remainder. Every other amount is calculated for all periods at once
+    in floating point and rounded to whole minor units once, when it is posted, after which the balances are rolled forward exactly
+    in integers. So the amortized cost is always the principal balance less the capitalized costs to the minor unit,
+    and both end at exactly zero.
+    """
+    schedule = deal_schedule(d)
+    number_of_payments = schedule.number_of_payments
+    exponent = minor_unit_exponent(d["functional_ccy"])
+    scale = 10**exponent
+
+    with metrics.stage("cash_flows"):
+        principal = int(round_minor(d["principal_amount"] * scale))
+        costs = int(round_minor(d["capitalized_finance_costs"] * scale))
+        if d["structure"] == "bullet":
+            principal_balance = np.full(number_of_payments + 1, principal, dtype=np.int64)
+            principal_balance[-1] = 0
+        else:
+            principal_balance = principal - (
+                principal * np.arange(number_of_payments + 1, dtype=np.int64)
+            ) // number_of_payments
+        repayments = principal_balance[:-1] - principal_balance[1:]
+
+        interest_rate = np.full(number_of_payments, interest_dict[0]["rate"], dtype=np.float64)
+        nominal_interest = round_minor(
+            interest_rate * schedule.accrual_factors * principal_balance[:-1]
+        )
+        total_cash_flow = np.concatenate(([costs - principal], repayments + nominal_interest))
+
+    with metrics.stage("effective_interest"):
+        effective_interest_rate, iterations, evaluations = solve_effective_interest_rate(
+            schedule.year_fractions, total_cash_flow / scale, guess=d["interest_rate"]
+        )
+        metrics.record_solver(iterations, evaluations)
+        effective_interest, amortized_cost = ledger_effective_interest(
+            effective_interest_rate, schedule.year_fractions, total_cash_flow
+        )
+        amortization_schedule = effective_interest - nominal_interest
+        capitalized_finance_costs = np.concatenate(
+            ([costs], costs - np.cumsum(amortization_schedule))
+        )
+
+    """
+    In case the interest type is floating, the nominal interest and the total cash flows are reset with the floating rates,
+    and the effective interest is the nominal interest plus the amortization, as in the simple calculation.
     """
     if d["interest_type"] == "floating":
-        interest_rate = interest_rates(
-            interest_dict,
-            number_of_payments,
+        with metrics.stage("floating_effective_interest"):
+            interest_rate = np.asarray(interest_rates(interest_dict, number_of_payments), dtype=np.float64)
+            nominal_interest = round_minor(
+                interest_rate * schedule.accrual_factors * principal_balance[:-1]
+            )
+            total_cash_flow = np.concatenate(([costs - principal], repayments + nominal_interest))
+            effective_interest = nominal_interest + amortization_schedule
+
+    return LedgerPostings(
+        exponent,
+        schedule.dates,
+        principal_balance,
+        interest_rate,
+        nominal_interest,
+        total_cash_flow,
+        capitalized_finance_costs,
+        amortized_cost,
+        effective_interest,
+        amortization_schedule,
+        effective_interest_rate,
+    )
+
+
+def ledger_effective_interest(
+    effective_interest_rate: float,
+    fractions: np.ndarray,
+    total_cash_flow: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The effective interest and the amortized cost in minor units from the total cash flows in minor units.
+    The effective interest of each period is calculated from the balances as in effective_interest_schedule and rounded once,
+    then the amortized cost is rolled forward exactly: amortized cost[i] = opening amortized cost + sum of (effective interest - total cash flow) up to period i.
+    The rounding differences left at the end, a few minor units at most, are posted to the effective interest of the last period,
+    so that the amortized cost ends at exactly zero.
+    """
+    growth = 1 + effective_interest_rate * fractions
+    accumulated_growth = np.concatenate(([1.0], np.cumprod(growth)))
+    discounted_cash_flow = np.concatenate(
+        ([0.0], np.cumsum(total_cash_flow[1:] / accumulated_growth[1:]))
+    )
+    balances = accumulated_growth * (total_cash_flow[0] * (-1) - discounted_cash_flow)
+
+    effective_interest = round_minor(balances[:-1] * effective_interest_rate * fractions)
+    amortized_cost = total_cash_flow[0] * (-1) + np.concatenate(
+        ([0], np.cumsum(effective_interest - total_cash_flow[1:]))
+    )
+    effective_interest[-1] -= amortized_cost[-1]
+    amortized_cost[-1] = 0
+    return effective_interest, amortized_cost
+
+
+def round_minor(amounts) -> np.ndarray:
+    """Rounds amounts in minor units to whole minor units as int64, half away from zero as in the ledger."""
+    amounts = np.asarray(amounts, dtype=np.float64)
+    return (np.sign(amounts) * np.floor(np.abs(amounts) + 0.5)).astype(np.int64)
+
+
+@memoized("ledger")
+def ledger_eir_calculation(d: dict, interest_dict: list) -> Schedule:
+    """
+    The report of the ledger calculation (see ledger_postings), the minor units are only converted into amounts for display here.
+    The effective interest rates are calculated from the posted amounts, in % like in the other reports.
+    """
+    postings = ledger_postings(d, interest_dict)
+    scale = 10**postings.exponent
+    fractions = deal_schedule(d).year_fractions
+    eir = np.round(
+        postings.effective_interest / postings.amortized_cost[:-1] / fractions * 100, 2
+    )
+    return schedule_report(
+        d,
+        postings.dates,
+        postings.principal_balance / scale,
+        postings.interest_rate.tolist(),
+        postings.nominal_interest / scale,
+        postings.total_cash_flow / scale,
+        postings.capitalized_finance_costs / scale,
+        postings.amortized_cost / scale,
+        postings.effective_interest / scale,
+        postings.amortization_schedule / scale,
+        eir,
+    )
+
+
+def initial_cash_flows(d: dict, interest_dict: list) -> tuple["PaymentSchedule", list, list, list, list]:
+    """
+    Looks up the payment schedule and generates the principal balances, interest rates, nominal interest and total cash flows
+    for the schedule at initial recognition, where every period uses the first interest rate provided by the user.
+    """
+    with metrics.stage("cash_flows"):
+        schedule = deal_schedule(d)
+        dates, number_of_payments = schedule.dates, schedule.number_of_payments
+        principal_balance = generate_principal_balances(
+            d["structure"], d["principal_amount"], number_of_payments
         )
+        interest_rate = [interest_dict[0]["rate"] for _ in range(number_of_payments)]
+
         nominal_interest = interest_cf(
             dates,
             interest_rate,
@@ -221,6 +756,7 @@ def simple_eir_calculation(
             d["interest_freq"],
             principal_balance,
             number_of_payments,
+            factors=schedule.accrual_factors,
         )
         total_cash_flow = generate_total_cf(
             d["principal_amount"],
@@ -229,230 +765,409 @@ def simple_eir_calculation(
             nominal_interest,
             number_of_payments,
         )
-        simple_time = timeit.timeit(
-            lambda: calculate_floating_effective_interest(
-                dates,
-                d["interest_type"],
-                nominal_interest,
-                amortization_schedule,
-                amortized_cost,
-                number_of_payments,
-            ),
-            number=1,
+    return (
+        schedule,
+        principal_balance,
+        interest_rate,
+        nominal_interest,
+        total_cash_flow,
+    )
+
+
+def floating_cash_flows(
+    d: dict,
+    interest_dict: list,
+    schedule: "PaymentSchedule",
+    principal_balance: list,
+) -> tuple[list, list, list]:
+    """Regenerates the interest rates, nominal interest and total cash flows using all the floating rates provided by the user."""
+    with metrics.stage("cash_flows"):
+        number_of_payments = schedule.number_of_payments
+        interest_rate = interest_rates(
+            interest_dict,
+            number_of_payments,
         )
-        effective_interest, eir = calculate_floating_effective_interest(
-            dates,
-            d["interest_type"],
+        nominal_interest = interest_cf(
+            schedule.dates,
+            interest_rate,
+            d["daycount"],
+            d["interest_freq"],
+            principal_balance,
+            number_of_payments,
+            factors=schedule.accrual_factors,
+        )
+        total_cash_flow = generate_total_cf(
+            d["principal_amount"],
+            d["capitalized_finance_costs"],
+            d["structure"],
             nominal_interest,
-            amortization_schedule,
-            amortized_cost,
             number_of_payments,
         )
-    else:
-        """In case of a fixed rate instrument the complex and the simple calcualtion yield the same result."""
-        simple_time = complex_time
+    return interest_rate, nominal_interest, total_cash_flow
 
+
+def schedule_report(
+    d: dict,
+    dates: list,
+    principal_balance: list,
+    interest_rate: list,
+    nominal_interest: list,
+    total_cash_flow: list,
+    capitalized_finance_costs: list,
+    amortized_cost: list,
+    effective_interest: list,
+    amortization_schedule: list,
+    eir: list,
+) -> Schedule:
     """
-    As above, these empty items at the start of these lists are purley for presentation purposes, 
-    to make the lists equal in length and aligned to the correct dates.
-    """
-    interest_rate = [""] + [round(float((rate * 100)), 2) for rate in interest_rate]
-    nominal_interest.insert(0, "")
-    effective_interest.insert(0, "")
-    amortization_schedule.insert(0, "")
-    eir.insert(0, "")
+    The output report is a Schedule, with one array per column of the report and the deal id and currency stored once.
+    Indexing or iterating the schedule gives the rows of the report.
 
-    """The final output is compiled using list comprehension into a list of dictionaries."""
-    report = list()
-    for i in range(number_of_payments + 1):
-        report.append(
+    The NaN items at the start of the periodic columns are purley for presentation purposes,
+    to make the columns equal in length and aligned to the correct dates.
+    """
+    with metrics.stage("report"):
+        return Schedule(
             {
                 "Deal id": d["deal_id"],
-                "Dates": dates[i],
+                "Dates": np.array(dates, dtype="datetime64[D]"),
                 "Currency": d["functional_ccy"],
-                "Principal balance": principal_balance[i],
-                "Nominal interest rate": interest_rate[i],
-                "Nominal interest": nominal_interest[i],
-                "Total cash flow": total_cash_flow[i],
-                "Capitalized finance costs": capitalized_finance_costs[i],
-                "Amortized cost": amortized_cost[i],
-                "Effective interest": effective_interest[i],
-                "Amortization schedule": amortization_schedule[i],
-                "Effective interest rate": eir[i],
+                "Principal balance": np.asarray(principal_balance, dtype=np.float64),
+                "Nominal interest rate": padded(
+                    [round(float((rate * 100)), 2) for rate in interest_rate]
+                ),
+                "Nominal interest": padded(nominal_interest),
+                "Total cash flow": np.asarray(total_cash_flow, dtype=np.float64),
+                "Capitalized finance costs": np.asarray(
+                    capitalized_finance_costs, dtype=np.float64
+                ),
+                "Amortized cost": np.asarray(amortized_cost, dtype=np.float64),
+                "Effective interest": padded(effective_interest),
+                "Amortization schedule": padded(amortization_schedule),
+                "Effective interest rate": padded(eir),
             }
         )
-    """Apart from the actual report the function also returns the timings of the complex and 
-    simple effective interest calculations to be able to display them on the webpage."""
-    return report, complex_time, simple_time
 
 
-def comparision(d: dict, interest_dict: list) -> tuple[list, float, float, float]:
+def padded(values: list) -> np.ndarray:
+    """A periodic column with NaN at the 0th index, where there is no period yet."""
+    return np.concatenate(([np.nan], np.asarray(values, dtype=np.float64)))
+
+
+@memoized("comparision", timings=3)
+def comparision(d: dict, interest_dict: list) -> tuple[Schedule, Schedule, float, float, float]:
     """
     The purpose of this function is to be able to display the difference between the two versions of effective interest.
     There are 2 reports, one is a summary by year and the other is for the comparision by period.
+
+    Both methods start from the same schedule at initial recognition, so the dates, principal balances,
+    cash flows and the first effective interest rate are calculated once here and shared by the two methods.
+    A fixed rate instrument with a single interest rate gives the same result with both methods, so it is only calculated once.
     """
-    simple, complex_time, simple_time = simple_eir_calculation(d, interest_dict)
-    complex = complex_eir_calculation(d, interest_dict)
+    (
+        schedule,
+        principal_balance,
+        interest_rate,
+        nominal_interest,
+        total_cash_flow,
+    ) = initial_cash_flows(d, interest_dict)
 
     """
-    These two lines convert the empty elements at 0th index into a float to be able to calculate with it without having to change the length.
+    The complex time is the time of one effective interest calculation, which the complex method repeats for each interest rate,
+    the simple time is the time of the floating effective interest calculation.
     """
-    simple[0]["Effective interest"] = float(0.00)
-    complex[0]["Effective interest"] = float(0.00)
+    with metrics.stage("effective_interest") as timer:
+        cash_flows = np.asarray(total_cash_flow, dtype=np.float64)
+        initial_rate, iterations, evaluations = solve_effective_interest_rate(
+            schedule.year_fractions, cash_flows, guess=d["interest_rate"]
+        )
+        metrics.record_solver(iterations, evaluations)
+        initial_schedule = effective_interest_schedule(
+            initial_rate,
+            schedule.year_fractions,
+            cash_flows,
+            np.asarray(nominal_interest, dtype=np.float64),
+            d["capitalized_finance_costs"],
+        )
+    complex_time = timer.seconds
 
-    """This list finds the years apparent in the list of dates relevant to the deal"""
-    years = list(dict.fromkeys(date["Dates"].year for date in simple))
+    simple, simple_time = simple_report(
+        d,
+        interest_dict,
+        schedule,
+        principal_balance,
+        interest_rate,
+        nominal_interest,
+        total_cash_flow,
+        initial_schedule,
+    )
+    if d["interest_type"] != "floating":
+        simple_time = complex_time
+    if d["interest_type"] == "fixed" and len(interest_dict) == 1:
+        complex = simple
+    else:
+        complex = complex_eir_calculation(
+            d, interest_dict, principal_balance=principal_balance, initial_rate=initial_rate
+        )
 
     """
-    Here I am creating two lists to be able to add up the effecitve interests within the years in both reports.
-    I initialized the lists to the lenght of the years list with all elements as a float 0.00.
-    Then I add the items from the reports where the year of the dates match the year in the years list.
+    The columns used in the reports are taken from the schedules as arrays, the NaN element at the 0th index is taken as zero
+    to be able to calculate with it without having to change the length.
     """
-    complex_effective_interest = [float(0.00)] * len(years)
-    simple_effective_interest = [float(0.00)] * len(years)
-
-    for i in range(len(years)):
-        for j in range(len(simple)):
-            if simple[j]["Dates"].year == years[i]:
-                simple_effective_interest[i] += simple[j]["Effective interest"]
-                complex_effective_interest[i] += complex[j]["Effective interest"]
+    dates = simple.column("Dates")
+    balances = simple.column("Principal balance")
+    simple_effective_interest = np.concatenate(([0.0], simple.column("Effective interest")[1:]))
+    complex_effective_interest = np.concatenate(([0.0], complex.column("Effective interest")[1:]))
+    simple_eir = simple.column("Effective interest rate")
+    complex_eir = complex.column("Effective interest rate")
 
     """
-    The following loops are used to take the items for the relevant columns from the reports 
-    that correspond to the last date of the given year (ie. year end balance)
+    As the dates are in order, the rows of each year follow each other. So the effective interest is added up
+    for each year in one pass from the first row of each year, and the last row of each year is the row before the first row of the next year
+    (ie. year end balance).
     """
-    last_date_in_year = {}
-    for row in simple:
-        year = row["Dates"].year
-        if year not in last_date_in_year or row["Dates"] > last_date_in_year[year]:
-            last_date_in_year[year] = row["Dates"]
-
-    last_dates = [
-        {"Year": year, "Last date": last_date_in_year[year]} for year in last_date_in_year
-    ]
+    years, first_rows = np.unique(
+        dates.astype("datetime64[Y]").astype(np.int64) + 1970, return_index=True
+    )
+    last_rows = np.append(first_rows[1:], len(dates)) - 1
+    simple_yearly_interest = np.add.reduceat(simple_effective_interest, first_rows)
+    complex_yearly_interest = np.add.reduceat(complex_effective_interest, first_rows)
 
     """
     As the report shows figures on a cash flow basis, if there is no interest cash flow in the first year
     the zero interests and the first year is being removed. It also avoids the zero division error.
     """
-    if simple_effective_interest[0] == 0:
-        simple_effective_interest.pop(0)
-        complex_effective_interest.pop(0)
-        last_dates.pop(0)
-        years.pop(0)
-
-
-    last_simple_eir = list()
-    last_complex_eir = list()
-    last_principal = list()
-    last_nominal_interest_rate = list()
-
-
-    for year in last_dates:
-        for i in range(len(simple)):
-            if simple[i]["Dates"] == year["Last date"]:
-                last_principal.append(simple[i]["Principal balance"])
-                last_nominal_interest_rate.append(simple[i]["Nominal interest rate"])
-                last_simple_eir.append(simple[i]["Effective interest rate"])
-                last_complex_eir.append(complex[i]["Effective interest rate"])
+    if simple_yearly_interest[0] == 0:
+        years = years[1:]
+        last_rows = last_rows[1:]
+        simple_yearly_interest = simple_yearly_interest[1:]
+        complex_yearly_interest = complex_yearly_interest[1:]
 
+    with np.errstate(divide="ignore", invalid="ignore"):
+        periodic_difference = complex_effective_interest[1:] - simple_effective_interest[1:]
+        periodic_relative_difference = periodic_difference / complex_effective_interest[1:] * 100
+        yearly_difference = complex_yearly_interest - simple_yearly_interest
+        yearly_relative_difference = yearly_difference / complex_yearly_interest * 100
 
     """
-    The length of this report is basically the number of payments as most of the lists used in this report has an empty item at 0th index, 
-    however as the cf_dates functions is not called here, the same value is calculated by deducting 1 from the length of the complex report.
+    The length of this report is the number of payments, as most of the columns used in this report have no value at the 0th index.
+    The principal balances are the ones at the start of each period.
     """
-    comparision_report = list()
-    for i in range(len(complex)-1):
-        comparision_report.append(
-            {
-                "Deal id": d["deal_id"],
-                "Dates": complex[i + 1]["Dates"],
-                "Principal balance": complex[i]["Principal balance"],
-                "Nominal interest rate": complex[i + 1]["Nominal interest rate"],
-                "Complex effective interest": complex[i + 1]["Effective interest"],
-                "Simple effective interest": simple[i + 1]["Effective interest"],
-                "Complex EIR": complex[i + 1]["Effective interest rate"],
-                "Simple EIR": simple[i + 1]["Effective interest rate"],
-                "Absolute int. diff": (
-                    complex[i + 1]["Effective interest"]
-                    - simple[i + 1]["Effective interest"]
-                ),
-                "Relative int. diff": (
-                    (
-                        (
-                            complex[i + 1]["Effective interest"]
-                            - simple[i + 1]["Effective interest"]
-                        )
-                        / complex[i + 1]["Effective interest"]
-                    )
-                    * 100
-                ),
-                "EIR difference": (
-                    complex[i + 1]["Effective interest rate"]
-                    - simple[i + 1]["Effective interest rate"]
-                ),
-            }
-        )
-    
-    summary = list()
-    for i in range(len(years)):
-        summary.append(
-            {
-                "Deal id": d["deal_id"],
-                "Years": years[i],
-                "Principal balance": last_principal[i],
-                "Nominal interest rate": last_nominal_interest_rate[i],
-                "Complex effective interest": complex_effective_interest[i],
-                "Simple effective interest": simple_effective_interest[i],
-                "Complex EIR": last_complex_eir[i],
-                "Simple EIR": last_simple_eir[i],
-                "Absolute int. diff": (
-                    complex_effective_interest[i]
-                    - simple_effective_interest[i]
-                ),
-                "Relative int. diff": (
-                    (
-                        (
-                            complex_effective_interest[i]
-                            - simple_effective_interest[i]
-                        )
-                        / complex_effective_interest[i]
-                    )
-                    * 100
-                ),
-                "EIR difference": (
-                    last_complex_eir[i]
-                    - last_simple_eir[i]
-                ),
-            }
-        )
+    comparision_report = Schedule(
+        {
+            "Deal id": d["deal_id"],
+            "Dates": dates[1:],
+            "Principal balance": balances[:-1],
+            "Nominal interest rate": complex.column("Nominal interest rate")[1:],
+            "Complex effective interest": complex_effective_interest[1:],
+            "Simple effective interest": simple_effective_interest[1:],
+            "Complex EIR": complex_eir[1:],
+            "Simple EIR": simple_eir[1:],
+            "Absolute int. diff": periodic_difference,
+            "Relative int. diff": periodic_relative_difference,
+            "EIR difference": complex_eir[1:] - simple_eir[1:],
+        }
+    )
+
+    summary = Schedule(
+        {
+            "Deal id": d["deal_id"],
+            "Years": years,
+            "Principal balance": balances[last_rows],
+            "Nominal interest rate": simple.column("Nominal interest rate")[last_rows],
+            "Complex effective interest": complex_yearly_interest,
+            "Simple effective interest": simple_yearly_interest,
+            "Complex EIR": complex_eir[last_rows],
+            "Simple EIR": simple_eir[last_rows],
+            "Absolute int. diff": yearly_difference,
+            "Relative int. diff": yearly_relative_difference,
+            "EIR difference": complex_eir[last_rows] - simple_eir[last_rows],
+        }
+    )
 
     efficiency = (complex_time / simple_time) - 1
     return comparision_report, summary, complex_time, simple_time, efficiency
 
 
 def generate_cf_dates(
-    start_date: date, end_date: date, first_interest_date: date, interest_frequency: int
+    start_date: date,
+    end_date: date,
+    first_interest_date: date,
+    interest_frequency: int,
+    as_array: bool = False,
+    calendar: str = None,
+    convention: str = "unadjusted",
 ) -> tuple[list, int]:
     """
     Generates a schedule for the payment dates including period 0 and calculates the number of payments excluding period 0.
 
-    List comprehension to create the date schedule using relativedelta module.
-    Based on the interest frequency it adds a certain number of months to the previous date.
+    Based on the interest frequency it adds a certain number of months to the previous date, see generate_cf_dates_batch.
     The first interest date is manually inserted to allow for an initial stub period.
     A stub period means that the length of the first period could differ from the general interest frequency of the deal.
+    The dates are returned as a list of dates, or as a datetime64[D] array with as_array.
+
+    With a business day convention other than unadjusted, the payment dates are moved to business days of the calendar
+    (weekends only without a calendar). The dates are generated unadjusted first, so the adjustment of one date
+    does not shift the dates after it, and the start date is kept as it is.
     """
-    cf_dates = [start_date, first_interest_date]
-    i = 1
-    while (cf_dates[i] + relativedelta(months=interest_frequency)) <= end_date:
-        cf_dates.append((cf_dates[i] + relativedelta(months=interest_frequency)))
-        i += 1
+    later_dates = generate_cf_dates_batch(
+        [end_date], [first_interest_date], [interest_frequency]
+    )[0]
+    cf_dates = np.concatenate(
+        (np.array([start_date, first_interest_date], dtype="datetime64[D]"), later_dates)
+    )
+    if convention != "unadjusted":
+        cf_dates[1:] = get_calendar(calendar or "weekends").adjust(cf_dates[1:], convention)
 
     """
     This is the calculation for the number of payments excluding the initial one in period zero.
     """
     number_of_payments = len(cf_dates) - 1
-    return cf_dates, number_of_payments
+    return (cf_dates if as_array else cf_dates.tolist()), number_of_payments
+
+
+def generate_cf_dates_batch(
+    end_dates: list, first_interest_dates: list, interest_frequencies: list
+) -> list:
+    """
+    Generates the payment dates after the first interest date for many deals at once, as one datetime64[D] array per deal.
+
+    The dates are calculated with month arithmetic on integers instead of adding months to each date one by one.
+    The months are counted from year 0, so the k-th payment is in month (first interest month + k * interest frequency).
+    The day follows the same end of month rule as adding the months to the previous date:
+    if the month is shorter than the day, the date moves to the month end and stays on that day from then on
+    (eg. 31 January, 28 February, 28 March). So the day is the running minimum of the first interest day and the month lengths.
+    """
+    end = np.array(end_dates, dtype="datetime64[D]")
+    first = np.array(first_interest_dates, dtype="datetime64[D]")
+    frequency = np.array(interest_frequencies, dtype=np.int64)
+    first_month = first.astype("datetime64[M]").astype(np.int64)
+    first_day = (first - first.astype("datetime64[M]").astype("datetime64[D]")).astype(np.int64) + 1
+    end_month = end.astype("datetime64[M]").astype(np.int64)
+
+    """Number of payments that fall into a month up to the end date month, and the deal and payment number k of each of them."""
+    counts = np.maximum((end_month - first_month) // frequency, 0)
+    deal = np.repeat(np.arange(len(counts)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+
+    month = (first_month[deal] + k * frequency[deal]).astype("datetime64[M]")
+    month_start = month.astype("datetime64[D]")
+    days_in_month = ((month + 1).astype("datetime64[D]") - month_start).astype(np.int64)
+
+    """
+    The running minimum has to restart for each deal. As days are always below 100, shifting each deal down by 100 * deal number
+    keeps the deals separate in one running minimum over the whole array.
+    """
+    day = np.minimum(first_day[deal], days_in_month) - 100 * deal
+    day = np.minimum.accumulate(day) + 100 * deal
+    cf_dates = month_start + (day - 1)
+
+    """The last payment month can still have a date after the end date, these are dropped."""
+    valid = cf_dates <= end[deal]
+    return np.split(cf_dates[valid], np.cumsum(np.bincount(deal[valid], minlength=len(counts)))[:-1])
+
+
+class PaymentSchedule(NamedTuple):
+    """
+    The parts of a deal that only depend on its dates and day count convention, shared by all the calculations.
+    The arrays are read only, as the same schedule is handed out to every deal with the same key.
+    """
+
+    dates: tuple
+    number_of_payments: int
+    days: np.ndarray
+    year_fractions: np.ndarray
+    accrual_factors: np.ndarray
+
+
+"""
+Payment schedules are cached by (start date, end date, first interest date, interest frequency, day count, calendar, business day convention),
+as many deals in a book share these and every calculation would otherwise regenerate them.
+The cache is bounded by the approximate size of the schedules in bytes and evicts the least recently used schedule first.
+"""
+SCHEDULE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+_schedule_cache = OrderedDict()
+_schedule_cache_lock = threading.Lock()
+_schedule_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "size": 0}
+
+
+def payment_schedule(
+    start_date: date,
+    end_date: date,
+    first_interest_date: date,
+    interest_frequency: int,
+    daycount: str,
+    calendar: str = None,
+    convention: str = "unadjusted",
+) -> PaymentSchedule:
+    """Returns the cached payment schedule for the key, generating and caching it on a miss."""
+    key = (start_date, end_date, first_interest_date, interest_frequency, daycount, calendar, convention)
+    with _schedule_cache_lock:
+        schedule = _schedule_cache.get(key)
+        if schedule is not None:
+            _schedule_cache.move_to_end(key)
+            _schedule_cache_stats["hits"] += 1
+            return schedule[0]
+        _schedule_cache_stats["misses"] += 1
+
+    dates, number_of_payments = generate_cf_dates(
+        start_date,
+        end_date,
+        first_interest_date,
+        interest_frequency,
+        calendar=calendar,
+        convention=convention,
+    )
+    days = np.diff(np.array(dates, dtype="datetime64[D]")).astype(np.int64)
+    schedule = PaymentSchedule(
+        tuple(dates),
+        number_of_payments,
+        days,
+        year_fractions(dates, number_of_payments),
+        accrual_factors(dates, daycount, interest_frequency, number_of_payments),
+    )
+    for array in schedule[2:]:
+        array.flags.writeable = False
+
+    """The size of a date object is about 32 bytes, plus the pointer in the tuple."""
+    size = sum(array.nbytes for array in schedule[2:]) + 40 * len(dates)
+    with _schedule_cache_lock:
+        if key not in _schedule_cache:
+            _schedule_cache[key] = (schedule, size)
+            _schedule_cache_stats["size"] += size
+        while _schedule_cache_stats["size"] > SCHEDULE_CACHE_MAX_BYTES and len(_schedule_cache) > 1:
+            _, (_, evicted_size) = _schedule_cache.popitem(last=False)
+            _schedule_cache_stats["size"] -= evicted_size
+            _schedule_cache_stats["evictions"] += 1
+    return schedule
+
+
+def deal_schedule(d: dict) -> PaymentSchedule:
+    """
+    The cached payment schedule of a deal, with the payment dates adjusted to business days by the convention of the deal.
+    Deals without a convention are unadjusted.
+    """
+    return payment_schedule(
+        d["start_date"],
+        d["end_date"],
+        d["first_interest_date"],
+        d["interest_freq"],
+        d["daycount"],
+        d.get("calendar"),
+        d.get("business_day_convention", "unadjusted"),
+    )
+
+
+def schedule_cache_info() -> dict:
+    """Hits, misses, evictions, the number of cached schedules and their approximate size in bytes."""
+    with _schedule_cache_lock:
+        return dict(_schedule_cache_stats, entries=len(_schedule_cache))
+
+
+def clear_schedule_cache() -> None:
+    with _schedule_cache_lock:
+        _schedule_cache.clear()
+        _schedule_cache_stats.update(hits=0, misses=0, evictions=0, size=0)
 
 
 def generate_principal_balances(
@@ -503,31 +1218,142 @@ def interest_cf(
     interest_frequency: int,
     principal_balance: list,
     number_of_payments: int,
+    factors: np.ndarray = None,
 ) -> list:
     """
     This function calculates a periodic interest rate based on the day count convention provided and the actual dates.
     This periodic interest rate is then used to calculate the interest cashflows by multiplying it with the periodic principal balance
+    The accrual factors can be passed in from a cached payment schedule, otherwise they are calculated from the dates.
     """
-    interest_cashflow = list()
-    for i in range(number_of_payments):
-        if daycount == "thirty_360":
-            periodic_interest_rate = rates[i] / 12 * interest_frequency
-        elif daycount == "actual_360":
-            periodic_interest_rate = rates[i] / 360 * (dates[i + 1] - dates[i]).days
-        elif daycount == "actual_365":
-            periodic_interest_rate = rates[i] / 365 * (dates[i + 1] - dates[i]).days
+    if factors is None:
+        factors = accrual_factors(dates, daycount, interest_frequency, number_of_payments)
+    interest_cashflow = (
+        np.asarray(rates[:number_of_payments], dtype=np.float64)
+        * factors
+        * np.asarray(principal_balance[:number_of_payments], dtype=np.float64)
+    )
+    return interest_cashflow.tolist()
+
+
+"""
+The day count conventions are registered by name with a kernel that calculates the accrual factors of all periods in one go.
+A kernel gets the start and end dates of the periods as datetime64[D] arrays and the interest frequency in months,
+and returns the periodic interest rate per unit of annual interest rate for each period.
+"""
+DAYCOUNTS = {}
+
+
+def register_daycount(name: str):
+    def register(kernel):
+        DAYCOUNTS[name] = kernel
+        return kernel
+
+    return register
+
+
+def accrual_factors(
+    dates: list,
+    daycount: str,
+    interest_frequency: int,
+    number_of_payments: int,
+) -> np.ndarray:
+    """
+    The periodic interest rate per unit of annual interest rate for each period, based on the day count convention.
+    These only depend on the dates, so they can be reused for any interest rate.
+    """
+    try:
+        kernel = DAYCOUNTS[daycount]
+    except KeyError:
+        raise ValueError("Invalid daycount")
+    period_dates = np.array(dates[: number_of_payments + 1], dtype="datetime64[D]")
+    return kernel(period_dates[:-1], period_dates[1:], interest_frequency).astype(np.float64)
+
+
+def _days(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    return (end - start).astype(np.int64)
+
+
+def _year_month_day(dates: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    years = dates.astype("datetime64[Y]")
+    months = dates.astype("datetime64[M]")
+    return (
+        years.astype(np.int64) + 1970,
+        (months - years.astype("datetime64[M]")).astype(np.int64) + 1,
+        (dates - months.astype("datetime64[D]")).astype(np.int64) + 1,
+    )
+
+
+def _is_leap(years: np.ndarray) -> np.ndarray:
+    return (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+
+
+def _add_months(dates: np.ndarray, months: int) -> np.ndarray:
+    """Adds months to each date, moving to the month end if the month is shorter than the day."""
+    month_start = dates.astype("datetime64[M]")
+    target = month_start + months
+    days_in_month = _days(target.astype("datetime64[D]"), (target + 1).astype("datetime64[D]"))
+    day = _days(month_start.astype("datetime64[D]"), dates)
+    return target.astype("datetime64[D]") + np.minimum(day, days_in_month - 1)
+
+
+@register_daycount("thirty_360")
+def thirty_360(start: np.ndarray, end: np.ndarray, interest_frequency: int) -> np.ndarray:
+    """Every period is treated as a regular period of the interest frequency."""
+    return np.full(len(start), interest_frequency / 12)
+
+
+@register_daycount("thirty_e_360")
+def thirty_e_360(start: np.ndarray, end: np.ndarray, interest_frequency: int) -> np.ndarray:
+    """30E/360 (Eurobond basis), day 31 is treated as day 30 at both ends of the period."""
+    start_year, start_month, start_day = _year_month_day(start)
+    end_year, end_month, end_day = _year_month_day(end)
+    return (
+        360 * (end_year - start_year)
+        + 30 * (end_month - start_month)
+        + (np.minimum(end_day, 30) - np.minimum(start_day, 30))
+    ) / 360
+
+
+@register_daycount("actual_360")
+def actual_360(start: np.ndarray, end: np.ndarray, interest_frequency: int) -> np.ndarray:
+    return _days(start, end) / 360
+
+
+@register_daycount("actual_365")
+def actual_365(start: np.ndarray, end: np.ndarray, interest_frequency: int) -> np.ndarray:
+    return _days(start, end) / 365
+
+
+@register_daycount("actual_actual")
+def actual_actual(start: np.ndarray, end: np.ndarray, interest_frequency: int) -> np.ndarray:
+    """
+    The year has 366 days if the period starts in January or February of a leap year,
+    or starts later in the year and ends in a leap year.
+    """
+    start_year, start_month, _ = _year_month_day(start)
+    end_year, _, _ = _year_month_day(end)
+    leap = np.where(start_month < 3, _is_leap(start_year), _is_leap(end_year))
+    return _days(start, end) / np.where(leap, 366, 365)
+
+
+@register_daycount("actual_actual_icma")
+def actual_actual_icma(start: np.ndarray, end: np.ndarray, interest_frequency: int) -> np.ndarray:
+    """
+    ACT/ACT ICMA, the days of the period are divided by the days of the regular period it belongs to,
+    so regular periods accrue exactly the interest frequency / 12.
+    Only the first period can be a stub: it is measured against the regular period ending on its end date,
+    and the part of a long stub before that regular period is measured against the regular period before.
+    """
+    factors = np.full(len(start), interest_frequency / 12)
+    if len(start):
+        reference_start = _add_months(end[:1], -interest_frequency)
+        if start[0] >= reference_start[0]:
+            stub = _days(start[:1], end[:1]) / _days(reference_start, end[:1])
         else:
-            if dates[i].month < 3:
-                days_in_year = 366 if calendar.isleap(dates[i].year) else 365
-            elif dates[i].month > 2 and calendar.isleap(dates[i + 1].year):
-                days_in_year = 366
-            else:
-                days_in_year = 365
-            periodic_interest_rate = (
-                rates[i] / days_in_year * (dates[i + 1] - dates[i]).days
-            )
-        interest_cashflow.append(principal_balance[i] * periodic_interest_rate)
-    return interest_cashflow
+            previous_start = _add_months(reference_start, -interest_frequency)
+            stub = 1 + _days(start[:1], reference_start) / _days(previous_start, reference_start)
+        factors[0] = stub[0] * interest_frequency / 12
+    return factors
 
 
 def generate_total_cf(
@@ -569,6 +1395,8 @@ def calculate_effective_interest(
     interest_cashflow: list,
     capitalized_finance_cost: float,
     number_of_payments: int,
+    tolerance: float = 1e-6,
+    fractions: np.ndarray = None,
 ) -> tuple[list, list, list, list, list]:
     """
     Calculates the amortized cost and effective interest.
@@ -576,106 +1404,286 @@ def calculate_effective_interest(
     In subsequent periods it is calculated as follows:
     amortized cost from previous period - total cash flow for current period + effective interest for current period.
 
-    For this, effective interest also needs to be calculated by the optimize_eir_least_squares:
+    For this, effective interest also needs to be calculated by solve_effective_interest_rate:
     amortized cost from previous period multiplied by the periodic effective interest rate.
+    The tolerance is the accepted final amortized cost in currency units, eg. 0.005 solves to half a cent.
+    The year fractions can be passed in from a cached payment schedule, otherwise they are calculated from the dates.
 
     The variable guess is set the same as the current nominal interest rate as the effective interest rate should be relatively close to the nominal interest,
     so this should reduce the runing time.
     """
     guess = first_interest
-    capitalized_finance_costs = [capitalized_finance_cost]
+    if fractions is None:
+        fractions = year_fractions(dates, number_of_payments)
+    cash_flows = np.asarray(total_cash_flow[: number_of_payments + 1], dtype=np.float64)
+
+    effective_interest_rate, iterations, evaluations = solve_effective_interest_rate(
+        fractions, cash_flows, guess=guess, tolerance=tolerance
+    )
+    metrics.record_solver(iterations, evaluations)
+
+    return effective_interest_schedule(
+        effective_interest_rate,
+        fractions,
+        cash_flows,
+        np.asarray(interest_cashflow[:number_of_payments], dtype=np.float64),
+        capitalized_finance_cost,
+    )
 
+
+def year_fractions(dates: list, number_of_payments: int) -> np.ndarray:
+    """
+    The length of each period as a fraction of a 365 day year, as a float64 array.
+    EIR is always calculated on a 365 day basis regardless of the market or currency of the cash flows.
+    ACT - CertRM Study Unit 2 - 2.1.2 Interest rate mathematics
+    """
+    days = np.diff(np.array(dates[: number_of_payments + 1], dtype="datetime64[D]"))
+    return days.astype(np.float64) / 365
+
+
+def effective_interest_schedule(
+    effective_interest_rate: float,
+    fractions: np.ndarray,
+    total_cash_flow: np.ndarray,
+    interest_cashflow: np.ndarray,
+    capitalized_finance_cost: float,
+) -> tuple[list, list, list, list, list]:
+    """
+    Builds the effective interest, amortized cost, amortization schedule, EIR and capitalized costs columns for a solved rate.
+    Instead of rolling the amortized cost forward period by period, all the balances are calculated in one pass:
+    with growth = 1 + rate * year fraction and G as the running product of growth,
+    amortized cost[i] = G[i] * (opening amortized cost - sum of total cash flow[k] / G[k] up to period i).
+    The effective interest is rounded once from these balances, and the amortized cost is then rolled forward from the rounded
+    effective interest as in ledger_effective_interest, so every row ties out: amortized cost[i] = amortized cost[i-1] - total cash flow[i] + effective interest[i].
     """
-    This function is required for the optimazition. The goal is to get the last item in the list of amortized cost to zero by updating the effective interest rate.
+    growth = 1 + effective_interest_rate * fractions
+    accumulated_growth = np.concatenate(([1.0], np.cumprod(growth)))
+    discounted_cash_flow = np.concatenate(
+        ([0.0], np.cumsum(total_cash_flow[1:] / accumulated_growth[1:]))
+    )
+    balances = accumulated_growth * (total_cash_flow[0] * (-1) - discounted_cash_flow)
+
+    effective_interest = np.round(balances[:-1] * effective_interest_rate * fractions, 2)
+    amortized_cost = np.round(
+        total_cash_flow[0] * (-1) + np.concatenate(([0.0], np.cumsum(effective_interest - total_cash_flow[1:]))),
+        2,
+    )
+    amortization_schedule = np.round(effective_interest - interest_cashflow, 2)
+    eir = np.round(
+        (interest_cashflow + amortization_schedule) / amortized_cost[:-1] / fractions * 100,
+        2,
+    )
+    capitalized_finance_costs = np.concatenate(
+        ([capitalized_finance_cost], capitalized_finance_cost - np.cumsum(amortization_schedule))
+    )
+    return (
+        effective_interest.tolist(),
+        amortized_cost.tolist(),
+        amortization_schedule.tolist(),
+        eir.tolist(),
+        capitalized_finance_costs.tolist(),
+    )
+
+
+def amortized_cost_residual(
+    effective_interest_rate: float,
+    fractions: np.ndarray,
+    total_cash_flow: np.ndarray,
+) -> tuple[float, float]:
+    """
+    Rolls the amortized cost forward to the last period at the given effective interest rate and returns
+    the final amortized cost together with its derivative with respect to the rate.
+    The goal of the solver is to get the final amortized cost to zero by updating the effective interest rate.
     Originally I tried numpy-financial's IRR and pyxirr's XIRR funcitons, but they were both inaccurate in this case.
+
+    The recurrence is linear in the cash flows, so the final amortized cost can be written with the products of the growth
+    of each period from period k to the end (P[k], with P = 1 after the last period):
+    final amortized cost = opening amortized cost * P[0] - sum of total cash flow[k] * P[k]
+    The derivative of P[k] is P[k] multiplied by the sum of year fraction / growth from period k to the end.
     """
+    growth = 1 + effective_interest_rate * fractions
+    remaining_growth = np.append(np.cumprod(growth[::-1])[::-1], 1.0)
+    remaining_sensitivity = np.append(np.cumsum((fractions / growth)[::-1])[::-1], 0.0)
 
-    def final_amortized_cost(
-        first_interest: float,
-        dates: list,
-        total_cash_flow: list,
-        number_of_payments: int,
-    ) -> float:
-        amortized_cost = [float(total_cash_flow[0] * (-1))]
-
-        for i in range(number_of_payments):
-            """EIR is always calculated on a 365 day basis regardless of the market or currency of the cash flows.
-            ACT - CertRM Study Unit 2 - 2.1.2 Interest rate mathematics"""
-            effective_interest = (
-                amortized_cost[i]
-                * first_interest
-                * ((dates[i + 1] - dates[i]).days / 365)
-            )
-            amortized_cost.append(
-                amortized_cost[i] - total_cash_flow[i + 1] + effective_interest
-            )
-        return amortized_cost[-1]
+    opening = total_cash_flow[0] * (-1)
+    amortized_cost = opening * remaining_growth[0] - np.dot(
+        total_cash_flow[1:], remaining_growth[1:]
+    )
+    derivative = opening * remaining_growth[0] * remaining_sensitivity[0] - np.dot(
+        total_cash_flow[1:], remaining_growth[1:] * remaining_sensitivity[1:]
+    )
+    return float(amortized_cost), float(derivative)
 
-    def optimize_eir_least_squares(
-        dates: list, total_cash_flow: list, number_of_payments: int, guess=0.05
-    ) -> float:
-        res = least_squares(
-            lambda r: final_amortized_cost(
-                r[0], dates, total_cash_flow, number_of_payments
-            ),
-            x0=[guess],
-            bounds=(0, 1),
+
+def solve_effective_interest_rate(
+    fractions: np.ndarray,
+    total_cash_flow: np.ndarray,
+    guess: float = 0.05,
+    tolerance: float = 1e-6,
+    lower: float = 0.0,
+    upper: float = 1.0,
+    rate_tolerance: float = 1e-12,
+    max_iterations: int = 100,
+) -> tuple[float, int, int]:
+    """
+    Finds the effective interest rate where the final amortized cost is zero, from the year fractions and total cash flows as float64 arrays.
+    It takes Newton steps using the analytic derivative from amortized_cost_residual,
+    and falls back to bisection whenever a Newton step would leave the bracket between the lower and upper bound.
+    This way it converges in a few iterations from a good guess, but can never diverge.
+
+    The tolerance is the accepted final amortized cost in currency units (eg. 0.005 for half a cent),
+    the rate tolerance stops the iteration once the steps get smaller than that, which matters for very large balances.
+    Apart from the rate, the number of iterations and the number of evaluations of the residual are also returned.
+    """
+    low_value, _ = amortized_cost_residual(lower, fractions, total_cash_flow)
+    high_value, _ = amortized_cost_residual(upper, fractions, total_cash_flow)
+    evaluations = 2
+    if abs(low_value) <= tolerance:
+        return lower, 0, evaluations
+    if abs(high_value) <= tolerance:
+        return upper, 0, evaluations
+    if (low_value > 0) == (high_value > 0):
+        raise ValueError(
+            f"Effective interest rate is not between {lower * 100:.0f}% and {upper * 100:.0f}%"
         )
-        return res.x[0]
 
-    effective_interest_rate = optimize_eir_least_squares(
-        dates, total_cash_flow, number_of_payments, guess=guess
+    """The bracket is oriented so that the final amortized cost is negative at the negative end."""
+    negative_end, positive_end = (lower, upper) if low_value < 0 else (upper, lower)
+    rate = min(max(guess, lower), upper)
+
+    for iteration in range(1, max_iterations + 1):
+        value, derivative = amortized_cost_residual(rate, fractions, total_cash_flow)
+        evaluations += 1
+        if abs(value) <= tolerance:
+            return rate, iteration, evaluations
+        if value < 0:
+            negative_end = rate
+        else:
+            positive_end = rate
+
+        bracket_low, bracket_high = sorted((negative_end, positive_end))
+        next_rate = rate - value / derivative if derivative else bracket_low - 1
+        if not bracket_low < next_rate < bracket_high:
+            next_rate = (bracket_low + bracket_high) / 2
+        if abs(next_rate - rate) <= rate_tolerance:
+            return next_rate, iteration, evaluations
+        rate = next_rate
+
+    raise ValueError("Effective interest rate calculation did not converge")
+
+
+def pad_deals(fractions: list, total_cash_flows: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pads the year fractions and total cash flows of many deals into (deal x period) arrays for the batch solver.
+    Padded periods have a year fraction of zero and no cash flow, so their growth is exactly 1
+    and they leave the final amortized cost unchanged. The mask marks the real periods of each deal.
+    """
+    longest = max((len(fraction) for fraction in fractions), default=0)
+    padded_fractions = np.zeros((len(fractions), longest), dtype=np.float64)
+    padded_cash_flows = np.zeros((len(fractions), longest + 1), dtype=np.float64)
+    mask = np.zeros((len(fractions), longest), dtype=bool)
+    for k, (fraction, cash_flow) in enumerate(zip(fractions, total_cash_flows)):
+        padded_fractions[k, : len(fraction)] = fraction
+        padded_cash_flows[k, : len(cash_flow)] = cash_flow
+        mask[k, : len(fraction)] = True
+    return padded_fractions, padded_cash_flows, mask
+
+
+def batch_amortized_cost_residual(
+    effective_interest_rates: np.ndarray,
+    fractions: np.ndarray,
+    total_cash_flow: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """The same as amortized_cost_residual, for one rate per row of (deal x period) arrays."""
+    growth = 1 + effective_interest_rates[:, None] * fractions
+    ones = np.ones((len(fractions), 1))
+    remaining_growth = np.hstack((np.cumprod(growth[:, ::-1], axis=1)[:, ::-1], ones))
+    remaining_sensitivity = np.hstack(
+        (np.cumsum((fractions / growth)[:, ::-1], axis=1)[:, ::-1], ones * 0)
     )
 
-    amortized_cost = [float(total_cash_flow[0] * (-1))]
-    effective_interest = list()
-    amortization_schedule = list()
-    eir = list()
+    opening = total_cash_flow[:, 0] * (-1)
+    amortized_cost = opening * remaining_growth[:, 0] - np.einsum(
+        "ij,ij->i", total_cash_flow[:, 1:], remaining_growth[:, 1:]
+    )
+    derivative = opening * remaining_growth[:, 0] * remaining_sensitivity[:, 0] - np.einsum(
+        "ij,ij->i", total_cash_flow[:, 1:], remaining_growth[:, 1:] * remaining_sensitivity[:, 1:]
+    )
+    return amortized_cost, derivative
 
-    for i in range(number_of_payments):
-        effective_interest.append(
-            round(
-                (
-                    amortized_cost[i]
-                    * effective_interest_rate
-                    * (dates[i + 1] - dates[i]).days
-                    / 365
-                ),
-                2,
-            )
-        )
-        amortized_cost.append(
-            round(
-                (amortized_cost[i] - total_cash_flow[i + 1] + effective_interest[i]), 2
-            )
-        )
-        amortization_schedule.append(
-            round((effective_interest[i] - interest_cashflow[i]), 2)
+
+def batch_solve_effective_interest_rates(
+    fractions: np.ndarray,
+    total_cash_flow: np.ndarray,
+    guess: np.ndarray = 0.05,
+    tolerance: float = 1e-6,
+    lower: float = 0.0,
+    upper: float = 1.0,
+    rate_tolerance: float = 1e-12,
+    max_iterations: int = 100,
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Solves the effective interest rates of many deals at the same time, with the same safeguarded Newton steps
+    as solve_effective_interest_rate, on (deal x period) arrays as returned by pad_deals.
+    The guess can be a single rate or an array with one guess per deal.
+    Each iteration only evaluates the deals that have not converged yet.
+
+    Returns the rates, the number of iterations per deal and the number of batched evaluations.
+    """
+    deals = len(fractions)
+    low_value, _ = batch_amortized_cost_residual(np.full(deals, lower), fractions, total_cash_flow)
+    high_value, _ = batch_amortized_cost_residual(np.full(deals, upper), fractions, total_cash_flow)
+    evaluations = 2
+
+    rates = np.clip(np.broadcast_to(np.asarray(guess, dtype=np.float64), (deals,)), lower, upper)
+    iterations = np.zeros(deals, dtype=np.int64)
+    active = np.ones(deals, dtype=bool)
+    for bound, value in ((lower, low_value), (upper, high_value)):
+        solved = active & (np.abs(value) <= tolerance)
+        rates[solved] = bound
+        active &= ~solved
+    not_bracketed = active & ((low_value > 0) == (high_value > 0))
+    if not_bracketed.any():
+        raise ValueError(
+            f"Effective interest rate is not between {lower * 100:.0f}% and {upper * 100:.0f}% "
+            f"for deals {np.flatnonzero(not_bracketed).tolist()}"
         )
-        eir.append(
-            round(
-                float(
-                    (
-                        (interest_cashflow[i] + amortization_schedule[i])
-                        / amortized_cost[i]
-                        / ((dates[i + 1] - dates[i]).days)
-                        * 365
-                    )
-                    * 100
-                ),
-                2,
-            )
+
+    """The bracket is oriented so that the final amortized cost is negative at the negative end."""
+    negative_end = np.where(low_value < 0, lower, upper)
+    positive_end = np.where(low_value < 0, upper, lower)
+
+    for _ in range(max_iterations):
+        if not active.any():
+            return rates, iterations, evaluations
+        index = np.flatnonzero(active)
+        rate = rates[index]
+        value, derivative = batch_amortized_cost_residual(
+            rate, fractions[index], total_cash_flow[index]
         )
-        capitalized_finance_costs.append(
-            (float(capitalized_finance_costs[i]) - amortization_schedule[i])
+        evaluations += 1
+        iterations[index] += 1
+
+        solved = np.abs(value) <= tolerance
+        negative_end[index] = np.where(value < 0, rate, negative_end[index])
+        positive_end[index] = np.where(value < 0, positive_end[index], rate)
+        bracket_low = np.minimum(negative_end[index], positive_end[index])
+        bracket_high = np.maximum(negative_end[index], positive_end[index])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            next_rate = rate - value / derivative
+        outside = ~((bracket_low < next_rate) & (next_rate < bracket_high))
+        next_rate = np.where(outside, (bracket_low + bracket_high) / 2, next_rate)
+        settled = np.abs(next_rate - rate) <= rate_tolerance
+
+        rates[index] = np.where(solved, rate, next_rate)
+        active[index] = ~(solved | settled)
+
+    if active.any():
+        raise ValueError(
+            f"Effective interest rate calculation did not converge for deals {np.flatnonzero(active).tolist()}"
         )
-    return (
-        effective_interest,
-        amortized_cost,
-        amortization_schedule,
-        eir,
-        capitalized_finance_costs,
-    )
+    return rates, iterations, evaluations
 
 
 def calculate_floating_effective_interest(
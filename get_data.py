@@ -1,14 +1,15 @@
 from datetime import datetime
-from forex_python.converter import CurrencyCodes
-
-c = CurrencyCodes()
+from types import MappingProxyType
+from calendars import CONVENTIONS, get_calendar
+from currencies import CURRENCIES
+from eir import DAYCOUNTS, deal_schedule
 
 """These functions are for user input validation and formatting the input when necessary."""
 
 
 def get_currency(s: str) -> str:
     code = s.strip().upper()
-    if c.get_currency_name(code):
+    if code in CURRENCIES:
         return code
     else:
         raise ValueError("Invalid currency code")
@@ -23,7 +24,7 @@ def get_date(d: str) -> datetime:
     
 
 def get_daycount(s: str) -> str:
-    if s not in ["actual_actual", "actual_365", "actual_360", "thirty_360"]:
+    if s not in DAYCOUNTS:
         raise ValueError("Invalid daycount")
     else:
         return s
@@ -76,6 +77,35 @@ def get_interest_rate(s: str) -> float:
         return interest_rate
 
 
+def get_business_day_convention(s: str) -> str:
+    if not s:
+        return "unadjusted"
+    if s not in CONVENTIONS:
+        raise ValueError("Invalid business day convention")
+    else:
+        return s
+
+
+def get_calendar_name(s: str) -> str:
+    """The name of the business day calendar, which has to be registered or have a holiday file. No calendar means weekends only."""
+    if not s or not s.strip():
+        return None
+    return get_calendar(s.strip()).name
+
+
+def get_payment_date(d: dict, date) -> datetime:
+    """
+    A payment date of the deal given either as it is in the schedule, or before its business day adjustment.
+    Dates that are not payment dates are returned as they are.
+    """
+    dates = deal_schedule(d).dates
+    convention = d.get("business_day_convention", "unadjusted")
+    if date in dates or convention == "unadjusted":
+        return date
+    adjusted = get_calendar(d.get("calendar") or "weekends").adjust([date], convention)[0].item()
+    return adjusted if adjusted in dates else date
+
+
 def get_interest_type(s: str) -> str:
     if s not in ["fixed", "floating"]:
         raise ValueError("Invalid interest type")
@@ -137,4 +167,99 @@ def update_deal_data(d: dict) -> None:
     if d["discount"] and d["premium"]:
         raise ValueError(
             "Instrument cannot have discount and premium at the same time"
-                    )
\ No newline at end of file
+                    )
+
+
+def get_deal(fields: dict) -> MappingProxyType:
+    """
+    Validates and formats the deal inputs, eg. the fields of the input form or a row of a deal file,
+    and returns the deal ready to be used in the calculations.
+    The deal is returned as a read only mapping, so it can be passed through the calculations
+    and shared between threads without anything changing it.
+    """
+    d = dict()
+    d["functional_ccy"] = get_currency(fields.get("functional_ccy"))
+    d["deal_id"] = fields.get("deal_id")
+    d["principal_amount"] = get_principal(fields.get("principal_amount"))
+    d["deal_ccy"] = get_currency(fields.get("deal_ccy"))
+    d["deal_fx_rate"] = get_exchange_rate(fields.get("deal_fx_rate"))
+    d["discount"] = get_discount(fields.get("discount"))
+    d["premium"] = get_premium(fields.get("premium"))
+    d["setup_costs"] = get_setup_costs(fields.get("setup_costs"))
+    d["start_date"] = get_date(fields.get("start_date"))
+    d["end_date"] = get_date(fields.get("end_date"))
+    d["first_interest_date"] = get_date(fields.get("first_interest_date"))
+    d["interest_rate"] = get_interest_rate(fields.get("interest_rate"))
+    d["structure"] = get_structure(fields.get("structure"))
+    d["interest_freq"] = get_interest_freq(fields.get("interest_freq"))
+    d["daycount"] = get_daycount(fields.get("daycount"))
+    d["interest_type"] = get_interest_type(fields.get("interest_type"))
+    d["business_day_convention"] = get_business_day_convention(fields.get("business_day_convention"))
+    d["calendar"] = get_calendar_name(fields.get("calendar"))
+    update_deal_data(d)
+    return MappingProxyType(d)
+
+
+def get_interest_dict(d: dict, interest_dates: list, interest_rates: list) -> list:
+    """
+    Compiles the floating rate inputs into a list of dictionaries adding the first interest as the 0th element,
+    so that the list exists for fixed rate instruments as well in the complex calculation.
+    Every date has to be one of the payment dates of the deal, the dates before the business day adjustment are accepted as well.
+    """
+    dates = deal_schedule(d).dates
+    interest_dates = [
+        get_payment_date(d, get_date(date)) for date in interest_dates if date.strip() != ""
+    ]
+    floating_interest_rates = [
+        get_interest_rate(rate) for rate in interest_rates if rate.strip() != ""
+    ]
+    interest_dict = [
+        {
+            "date": dates[1],
+            "rate": d["interest_rate"],
+        }
+    ] + [
+        {
+            "date": date,
+            "rate": rate,
+        }
+        for date, rate in zip(interest_dates, floating_interest_rates)
+    ]
+
+    for line in interest_dict:
+        if line["date"] not in dates:
+            raise ValueError(f"Date is not valid: {line['date']}")
+    return interest_dict
+
+
+def get_json_deal(row: dict) -> tuple[dict, list, list]:
+    """
+    Splits a deal given as JSON into the deal fields and the dates and rates of its "fixings" list,
+    with all values as strings the same way as they arrive from the input form.
+    A null field is taken as a field left empty on the form, lists and objects are not valid values of a field.
+    Every fixing needs a date and a rate.
+    """
+    fixings = row.get("fixings") or []
+    if not isinstance(fixings, list) or not all(
+        isinstance(fixing, dict)
+        and all(is_json_value(fixing.get(key)) and fixing.get(key) is not None for key in ("date", "rate"))
+        for fixing in fixings
+    ):
+        raise ValueError("Invalid fixings, each fixing needs a date and a rate")
+    fields = dict()
+    for key, value in row.items():
+        if key == "fixings":
+            continue
+        if not is_json_value(value):
+            raise ValueError(f"Invalid value for {key}")
+        fields[key] = "" if value is None else str(value)
+    return (
+        fields,
+        [str(fixing["date"]) for fixing in fixings],
+        [str(fixing["rate"]) for fixing in fixings],
+    )
+
+
+def is_json_value(value) -> bool:
+    """Whether the JSON value is a single value, ie. not a list or an object."""
+    return not isinstance(value, (list, dict))
@@ -0,0 +1,19 @@
+"""
+Gunicorn configuration, read automatically by the gunicorn command in the Procfile.
+
+The deals are built per request and never shared, so each worker can serve several requests at the same time in threads.
+The threads of a worker share the memory of the imports, so adding threads is cheaper than adding worker processes.
+"""
+
+import os
+
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+
+def post_fork(server, worker):
+    """Opens the stores and starts the background threads of the app in each worker, after it has been forked from the master."""
+    from app import init_app
+
+    init_app()
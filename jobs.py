@@ -0,0 +1,272 @@
+"""
+Background job queue for calculations too large to run inside a web request, eg. a whole portfolio or deals with very long tenors.
+
+The jobs are kept in a local SQLite database, so there is no broker to run: the app submits a job and returns its id at once,
+and worker threads in the app processes of the same host pick the jobs up in the order they were submitted.
+A job is claimed in a transaction that first counts the running jobs of the host, so no more than the concurrency limit
+of jobs run at the same time on the host, however many gunicorn workers there are. The limit is set with JOB_CONCURRENCY,
+and 0 stops the processes from running jobs at all.
+
+The progress of a running job is written as the deals are calculated, and the result is stored with the job once it has finished.
+Running jobs write a heartbeat from a timer thread every heartbeat_interval seconds, so a single long deal keeps its job claimed.
+If a worker process dies, its job stops updating the heartbeat and is queued again after stale_after seconds. Finished and failed jobs are removed after the time to live.
+"""
+
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from portfolio import calculate_deal, portfolio_index
+
+"""The functions that run each kind of job, called with the payload of the job and a function to report the number of items done."""
+JOB_KINDS = dict()
+
+
+def register_job(kind: str):
+    def register(function):
+        JOB_KINDS[kind] = function
+        return function
+
+    return register
+
+
+@register_job("portfolio")
+def portfolio_job(payload: dict, progress) -> dict:
+    """
+    Calculates the deals one by one the same way as the portfolio runner, invalid deals get an error in their summary line.
+    The reporting index of the schedules is stored with the result, so the balances at any date are looked up without recalculating.
+    """
+    schedules = list()
+    summaries = list()
+    for done, deal in enumerate(payload["deals"], 1):
+        schedule, summary = calculate_deal((deal, payload["engine"]))
+        schedules.append(schedule)
+        summaries.append(summary)
+        progress(done)
+    return {
+        "engine": payload["engine"],
+        "schedules": schedules,
+        "summaries": summaries,
+        "index": portfolio_index(payload["deals"], schedules),
+    }
+
+
+class JobQueue:
+    def __init__(
+        self,
+        path: str,
+        concurrency: int = 2,
+        ttl: float = 24 * 3600,
+        stale_after: float = 600,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = None,
+    ):
+        """The heartbeat is written 4 times within stale_after by default."""
+        self.path = path
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = stale_after / 4 if heartbeat_interval is None else heartbeat_interval
+        self._local = threading.local()
+        self._workers = list()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    @property
+    def worker_id(self) -> str:
+        """The host and process running the job, taken on every use as the queue can be created before the workers are forked."""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connection(self) -> sqlite3.Connection:
+        """The connection of the current thread, opened again in a forked worker process."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs "
+            "(id TEXT PRIMARY KEY, kind TEXT, status TEXT, payload BLOB, total INTEGER, done INTEGER, "
+            "result BLOB, error TEXT, worker TEXT, created REAL, started REAL, finished REAL, heartbeat REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def submit(self, kind: str, payload: dict, total: int) -> str:
+        """Queues the job and returns its id, total is the number of items the progress is counted in."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Invalid job: {kind}")
+        job_id = uuid.uuid4().hex
+        value = zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "DELETE FROM jobs WHERE status IN ('finished', 'failed') AND finished <= ?",
+                (now - self.ttl,),
+            )
+            connection.execute(
+                "INSERT INTO jobs (id, kind, status, payload, total, done, created) VALUES (?, ?, 'queued', ?, ?, 0, ?)",
+                (job_id, kind, value, total, now),
+            )
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> dict:
+        """The status of the job with its progress in %, or None if there is no such job."""
+        row = self._connection().execute(
+            "SELECT id, kind, status, total, done, error, created, started, finished FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(("id", "kind", "status", "total", "done", "error", "created", "started", "finished"), row))
+        if job["status"] == "finished":
+            job["progress"] = 100.0
+        else:
+            job["progress"] = round(100 * job["done"] / job["total"], 1) if job["total"] else 0.0
+        return job
+
+    def result(self, job_id: str):
+        """The result of a finished job, or None if the job is not found or has not finished."""
+        row = self._connection().execute(
+            "SELECT result FROM jobs WHERE id = ? AND status = 'finished'", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def claim(self) -> tuple:
+        """
+        Takes the oldest queued job for this process, unless the jobs running on the host are already at the concurrency limit.
+        Jobs of dead workers, which have not written a heartbeat for stale_after seconds, are queued again first.
+        Returns the id, kind and payload of the job, or None.
+        """
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, done = 0 WHERE status = 'running' AND heartbeat <= ?",
+                (now - self.stale_after,),
+            )
+            running = connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+            if running >= self.concurrency:
+                return None
+            row = connection.execute(
+                "SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started = ?, heartbeat = ? WHERE id = ?",
+                (self.worker_id, now, now, row[0]),
+            )
+        return row[0], row[1], pickle.loads(zlib.decompress(row[2]))
+
+    def run_next(self) -> bool:
+        """Claims and runs one job in the current thread. Returns False if no job could be claimed."""
+        claimed = self.claim()
+        if claimed is None:
+            return False
+        job_id, kind, payload = claimed
+        connection = self._connection()
+
+        """
+        The progress is written at most every 0.2 seconds, so small deals do not wait on the database.
+        The updates only apply while the job is still claimed by this process, not if it has been queued again as stale.
+        """
+        last_write = [0.0]
+
+        def progress(done: int) -> None:
+            now = time.time()
+            if now - last_write[0] >= 0.2:
+                last_write[0] = now
+                with connection:
+                    connection.execute(
+                        "UPDATE jobs SET done = ?, heartbeat = ? WHERE id = ? AND worker = ?",
+                        (done, now, job_id, self.worker_id),
+                    )
+
+        """The heartbeat is written until the result has been stored, as pickling a large result takes time as well."""
+        stopped = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, stopped), name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            try:
+                result = JOB_KINDS[kind](payload, progress)
+            except Exception as e:
+                with connection:
+                    connection.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, finished = ?, payload = NULL WHERE id = ? AND worker = ?",
+                        (f"{type(e).__name__}: {e}", time.time(), job_id, self.worker_id),
+                    )
+                return True
+
+            value = zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), 1)
+            with connection:
+                connection.execute(
+                    "UPDATE jobs SET status = 'finished', done = total, result = ?, finished = ?, payload = NULL "
+                    "WHERE id = ? AND worker = ?",
+                    (value, time.time(), job_id, self.worker_id),
+                )
+            return True
+        finally:
+            stopped.set()
+            heartbeat.join()
+
+    def _heartbeat(self, job_id: str, stopped: threading.Event) -> None:
+        """Writes the heartbeat of the running job until it is stopped, in its own thread and connection."""
+        while not stopped.wait(self.heartbeat_interval):
+            try:
+                connection = self._connection()
+                with connection:
+                    connection.execute(
+                        "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ?",
+                        (time.time(), job_id, self.worker_id),
+                    )
+            except sqlite3.Error:
+                pass
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                ran = self.run_next()
+            except sqlite3.Error:
+                ran = False
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def start_workers(self) -> None:
+        """
+        Starts a worker thread per job of the concurrency limit in this process, as daemon threads that do not block the shutdown.
+        The limit is enforced over the whole host when the jobs are claimed, so the other processes can start their threads too.
+        """
+        if self._workers or self.concurrency <= 0:
+            return
+        self._stop.clear()
+        for _ in range(self.concurrency):
+            worker = threading.Thread(target=self._work, name="job-worker", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop_workers(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        for worker in self._workers:
+            worker.join()
+        self._workers.clear()
@@ -0,0 +1,134 @@
+"""
+Lightweight instrumentation of the calculations and the web routes, exposed in the Prometheus text format on /metrics.
+
+The engines time their stages with the stage context manager. The elapsed time is recorded once, both into the totals
+of the stage and onto the timer returned by the context manager, so the engines can report their own timings
+(eg. the complex and simple times of the comparision) from the same run instead of running the calculation again to time it.
+The solver records the number of iterations and residual evaluations of every solve, and the app records the latency
+of each request per route into a histogram.
+
+The metrics are kept in memory per process, so with several gunicorn workers each worker reports its own totals
+and Prometheus adds them up over the workers.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+import timeit
+
+"""Upper bounds of the latency histogram buckets in seconds, the last bucket (+Inf) is added when rendering."""
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_stages = dict()
+_solver = {"solves": 0, "iterations": 0, "evaluations": 0}
+_requests = dict()
+
+
+class Timer:
+    __slots__ = ("name", "seconds")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times the block and adds the elapsed seconds to the totals of the stage.
+    The timer yielded holds the seconds of this run once the block has finished.
+    """
+    timer = Timer(name)
+    start = timeit.default_timer()
+    try:
+        yield timer
+    finally:
+        timer.seconds = timeit.default_timer() - start
+        with _lock:
+            count, total = _stages.get(name, (0, 0.0))
+            _stages[name] = (count + 1, total + timer.seconds)
+
+
+def record_solver(iterations: int, evaluations: int, solves: int = 1) -> None:
+    """Adds the iterations and residual evaluations of one or more solves, eg. a batch solve of many deals."""
+    with _lock:
+        _solver["solves"] += solves
+        _solver["iterations"] += int(iterations)
+        _solver["evaluations"] += int(evaluations)
+
+
+def observe_request(route: str, method: str, status: int, seconds: float) -> None:
+    """Adds the latency of a request into the histogram of its route."""
+    key = (route, method, str(status))
+    with _lock:
+        buckets, count, total = _requests.get(key, ([0] * (len(LATENCY_BUCKETS) + 1), 0, 0.0))
+        buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        _requests[key] = (buckets, count + 1, total + seconds)
+
+
+def snapshot() -> dict:
+    """A copy of the current metrics, the request histograms have the count of each bucket (not cumulative)."""
+    with _lock:
+        return {
+            "stages": dict(_stages),
+            "solver": dict(_solver),
+            "requests": {key: (list(buckets), count, total) for key, (buckets, count, total) in _requests.items()},
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+        _solver.update(solves=0, iterations=0, evaluations=0)
+        _requests.clear()
+
+
+def prometheus_text() -> str:
+    """Renders the metrics in the Prometheus text exposition format (version 0.0.4)."""
+    metrics = snapshot()
+    lines = [
+        "# HELP eir_stage_seconds Time spent in each stage of the calculations.",
+        "# TYPE eir_stage_seconds summary",
+    ]
+    for name, (count, total) in sorted(metrics["stages"].items()):
+        lines.append(f'eir_stage_seconds_count{{stage="{name}"}} {count}')
+        lines.append(f'eir_stage_seconds_sum{{stage="{name}"}} {total:.9f}')
+
+    for key, help_text in (
+        ("solves", "Effective interest rates solved."),
+        ("iterations", "Iterations of the effective interest rate solver."),
+        ("evaluations", "Residual evaluations of the effective interest rate solver."),
+    ):
+        lines.append(f"# HELP eir_solver_{key}_total {help_text}")
+        lines.append(f"# TYPE eir_solver_{key}_total counter")
+        lines.append(f"eir_solver_{key}_total {metrics['solver'][key]}")
+
+    lines.append("# HELP eir_request_duration_seconds Latency of the requests per route.")
+    lines.append("# TYPE eir_request_duration_seconds histogram")
+    for (route, method, status), (buckets, count, total) in sorted(metrics["requests"].items()):
+        labels = f'route="{route}",method="{method}",status="{status}"'
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+            cumulative += bucket
+            lines.append(f'eir_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"eir_request_duration_seconds_count{{{labels}}} {count}")
+        lines.append(f"eir_request_duration_seconds_sum{{{labels}}} {total:.9f}")
+    return "\n".join(lines) + "\n"
+
+
+def result_cache_text(info: dict) -> str:
+    """Renders the stats of the result cache (see ResultCache.info), which are the totals of all the workers."""
+    lines = list()
+    for key, kind, help_text in (
+        ("hits", "counter", "Results taken from the result cache."),
+        ("misses", "counter", "Results not found in the result cache."),
+        ("evictions", "counter", "Results removed from the result cache."),
+        ("entries", "gauge", "Results in the result cache."),
+        ("size", "gauge", "Size of the results in the result cache in bytes."),
+    ):
+        name = f"eir_result_cache_{key}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {info[key]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,209 @@
+"""
+Command line runner for calculating a whole portfolio of deals from a file, eg. for the quarter end run.
+
+    python portfolio.py deals.csv --engine complex --output-dir results
+
+The deals are read from a CSV or JSON file with the same fields as the input form, and validated with the same rules.
+In a CSV file the rate fixings are in a "fixings" column as date:rate pairs separated by semicolons
+(eg. "2022-04-07:5.129;2022-10-07:5.92"), in a JSON file each deal has a "fixings" list of {"date": ..., "rate": ...} items.
+The rates are in % as on the input form.
+
+The calculations run on all cores in a process pool. The deals are sent to the workers in chunks,
+so that the workers are not waiting on the main process for every single deal.
+The schedules of all deals and a summary line per deal are written into CSV files in the output directory.
+With --reporting-date the balances of every deal at that date, eg. the month end, are written into balances.csv as well.
+"""
+
+import argparse
+import csv
+import json
+import os
+import timeit
+
+import numpy as np
+
+from eir import complex_eir_calculation, ledger_eir_calculation, simple_eir_calculation
+from get_data import get_date, get_deal, get_interest_dict, get_json_deal
+from reporting import BALANCE_FIELDS, ReportingIndex, balance_rows, balances_at, reporting_index
+from schedule import Schedule
+
+ENGINES = {
+    "simple": lambda d, interest_dict: simple_eir_calculation(d, interest_dict)[0],
+    "complex": complex_eir_calculation,
+    "ledger": ledger_eir_calculation,
+}
+
+SUMMARY_FIELDS = [
+    "Deal id",
+    "Number of payments",
+    "Effective interest rate",
+    "Total nominal interest",
+    "Total effective interest",
+    "Final amortized cost",
+    "Error",
+]
+
+
+def read_deals(path: str) -> list:
+    """
+    Reads the deal file into a list of (deal fields, fixing dates, fixing rates), with all values as strings.
+    The file format is decided by the extension, .json files are read as JSON and anything else as CSV.
+    """
+    if path.lower().endswith(".json"):
+        with open(path) as file:
+            rows = json.load(file)
+        return [get_json_deal(row) for row in rows]
+
+    deals = list()
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            fixings = [
+                fixing.split(":") for fixing in (row.pop("fixings", "") or "").split(";") if fixing.strip()
+            ]
+            deals.append(
+                (
+                    row,
+                    [date for date, _ in fixings],
+                    [rate for _, rate in fixings],
+                )
+            )
+    return deals
+
+
+def calculate_deal(item: tuple) -> tuple[Schedule, dict]:
+    """
+    Validates and calculates one deal in a worker process.
+    Invalid deals do not stop the run, the error is reported in the summary line of the deal instead.
+    """
+    (fields, fixing_dates, fixing_rates), engine = item
+    try:
+        d = get_deal(fields)
+        interest_dict = get_interest_dict(d, fixing_dates, fixing_rates)
+        schedule = ENGINES[engine](d, interest_dict)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return Schedule({}), dict.fromkeys(SUMMARY_FIELDS, "") | {
+            "Deal id": fields.get("deal_id"),
+            "Error": str(e),
+        }
+
+    summary = {
+        "Deal id": d["deal_id"],
+        "Number of payments": len(schedule) - 1,
+        "Effective interest rate": schedule[1]["Effective interest rate"],
+        "Total nominal interest": round(float(np.nansum(schedule.column("Nominal interest"))), 2),
+        "Total effective interest": round(float(np.nansum(schedule.column("Effective interest"))), 2),
+        "Final amortized cost": schedule[-1]["Amortized cost"],
+        "Error": "",
+    }
+    return schedule, summary
+
+
+def run_portfolio(
+    deals: list,
+    engine: str = "complex",
+    workers: int = None,
+    chunksize: int = None,
+) -> tuple[list, list, float]:
+    """
+    Calculates all deals in a process pool and returns the schedules, the summaries and the elapsed seconds.
+    By default every core gets a worker, and the deals are split into about four chunks per worker.
+    """
+    """The process pool is only imported when a portfolio is run, as multiprocessing is not needed to read or write the files."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    chunksize = chunksize or max(1, len(deals) // (workers * 4))
+
+    start = timeit.default_timer()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                calculate_deal,
+                [(deal, engine) for deal in deals],
+                chunksize=chunksize,
+            )
+        )
+    elapsed = timeit.default_timer() - start
+
+    schedules = [schedule for schedule, _ in results]
+    summaries = [summary for _, summary in results]
+    return schedules, summaries, elapsed
+
+
+def portfolio_index(deals: list, schedules: list) -> ReportingIndex:
+    """The reporting index of the calculated deals, the deals with an error have no schedule and are left out. None if there are none."""
+    calculated = [
+        (get_deal(fields), schedule) for (fields, _, _), schedule in zip(deals, schedules) if schedule
+    ]
+    if not calculated:
+        return None
+    return reporting_index([d for d, _ in calculated], [schedule for _, schedule in calculated])
+
+
+def portfolio_balances(index: ReportingIndex, reporting_date) -> list:
+    """The balances of every calculated deal at the reporting date, one row per deal."""
+    if index is None:
+        return []
+    return balance_rows(index, balances_at(index, reporting_date))
+
+
+def write_results(output_dir: str, schedules: list, summaries: list) -> None:
+    """Writes the schedules of all deals into schedules.csv and the summary line of each deal into summary.csv."""
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "schedules.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        header = False
+        for schedule in schedules:
+            if not schedule:
+                continue
+            if not header:
+                writer.writerow(schedule.fields)
+                header = True
+            writer.writerows(schedule.values(""))
+
+    with open(os.path.join(output_dir, "summary.csv"), "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+def write_balances(output_dir: str, balances: list) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "balances.csv"), "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=["Deal id", "Reporting date", *BALANCE_FIELDS])
+        writer.writeheader()
+        writer.writerows(balances)
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Calculate the effective interest of a portfolio of deals.")
+    parser.add_argument("deals", help="CSV or JSON file of deals and rate fixings")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="complex")
+    parser.add_argument("--output-dir", default="results")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes, all cores by default")
+    parser.add_argument("--chunksize", type=int, default=None, help="number of deals sent to a worker at once")
+    parser.add_argument(
+        "--reporting-date", default=None, help="also write the balances of every deal at this date (YYYY-MM-DD) into balances.csv"
+    )
+    args = parser.parse_args(argv)
+    reporting_date = get_date(args.reporting_date) if args.reporting_date else None
+
+    deals = read_deals(args.deals)
+    schedules, summaries, elapsed = run_portfolio(
+        deals, args.engine, args.workers, args.chunksize
+    )
+    write_results(args.output_dir, schedules, summaries)
+    if reporting_date:
+        write_balances(
+            args.output_dir, portfolio_balances(portfolio_index(deals, schedules), reporting_date)
+        )
+
+    errors = sum(1 for summary in summaries if summary["Error"])
+    print(
+        f"Calculated {len(deals)} deals ({errors} with errors) in {elapsed:.2f} seconds, "
+        f"{len(deals) / elapsed if elapsed else 0:.1f} deals/sec"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Balances of the deals at any reporting date, eg. the month end, from their calculated schedules.
+
+The schedules only have rows on the payment dates. Between two payment dates the nominal interest accrues by the day count
+of the deal, and the effective interest accrues on the amortized cost at the start of the period with the effective interest rate,
+which is linear in the days of the period as the EIR is applied with 365 day year fractions. So the effective interest accrued
+at a date is the effective interest of the period times the days elapsed over the days of the period.
+The amortized cost at the date includes the effective interest accrued, and the capitalized finance costs are reduced by
+the amortization accrued, the difference of the effective and the nominal interest accrued.
+
+The schedules of a portfolio are put into one index first, with the columns of all the deals concatenated.
+The dates are keyed as the deal number times 2**32 plus the day number, so the keys of each deal are sorted and above the keys
+of the deals before. A query for any number of (deal, date) pairs is then one binary search over the keys for all of them,
+without going back to the schedules.
+"""
+
+from datetime import date
+from typing import NamedTuple
+
+import numpy as np
+
+from eir import DAYCOUNTS
+from schedule import Schedule
+
+DEAL_KEY = np.int64(2**32)
+DAY_OFFSET = np.int64(2**31)
+
+"""The columns of the balances, in the order of ReportingBalances after the deals and dates."""
+BALANCE_FIELDS = (
+    "Period",
+    "Principal balance",
+    "Accrued nominal interest",
+    "Accrued effective interest",
+    "Capitalized finance costs",
+    "Amortized cost",
+)
+
+"""
+Day counts that give each period its regular share of the year (30/360 here) or measure it against a regular period (ICMA)
+cannot measure a part of a period. Within a period these accrue by the days counted as 30E/360 and the actual days instead.
+"""
+WITHIN_PERIOD_DAYCOUNTS = {"thirty_360": "thirty_e_360", "actual_actual_icma": "actual_365"}
+
+
+class ReportingIndex(NamedTuple):
+    deal_ids: list
+    daycounts: list
+    interest_frequencies: np.ndarray
+    first_row: np.ndarray
+    last_row: np.ndarray
+    keys: np.ndarray
+    days: np.ndarray
+    principal_balance: np.ndarray
+    nominal_interest: np.ndarray
+    capitalized_finance_costs: np.ndarray
+    amortized_cost: np.ndarray
+    effective_interest: np.ndarray
+    accrual_factors: np.ndarray
+
+
+class ReportingBalances(NamedTuple):
+    """The balances of each (deal, date) pair queried, with period -1 and NaN balances for dates before the start of the deal."""
+
+    deals: np.ndarray
+    dates: np.ndarray
+    period: np.ndarray
+    principal_balance: np.ndarray
+    accrued_nominal_interest: np.ndarray
+    accrued_effective_interest: np.ndarray
+    capitalized_finance_costs: np.ndarray
+    amortized_cost: np.ndarray
+
+
+def _day_numbers(dates) -> np.ndarray:
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def _accrual(daycount: str, start: np.ndarray, end: np.ndarray, interest_frequency: np.ndarray) -> np.ndarray:
+    """The accrual factors from start to end by the day count used within the periods, with the interest frequency of each deal."""
+    kernel = DAYCOUNTS[WITHIN_PERIOD_DAYCOUNTS.get(daycount, daycount)]
+    factors = np.empty(len(start))
+    for frequency in np.unique(interest_frequency):
+        rows = interest_frequency == frequency
+        factors[rows] = kernel(
+            start[rows].astype("datetime64[D]"), end[rows].astype("datetime64[D]"), int(frequency)
+        )
+    return factors
+
+
+def reporting_index(deals: list, schedules: list) -> ReportingIndex:
+    """
+    Builds the index of the schedules of the deals, which are reports of the simple, complex or ledger calculation.
+    The deals are numbered in the order given, and the schedules are in the same order as the deals.
+    """
+    lengths = np.array([len(schedule) for schedule in schedules], dtype=np.int64)
+    if not lengths.all():
+        raise ValueError("Every deal needs a calculated schedule")
+    last_row = np.cumsum(lengths) - 1
+    first_row = last_row - lengths + 1
+    interest_frequencies = np.array([d["interest_freq"] for d in deals], dtype=np.int64)
+
+    def column(name: str) -> np.ndarray:
+        return np.concatenate([schedule.column(name) for schedule in schedules])
+
+    days = np.concatenate([_day_numbers(schedule.column("Dates")) for schedule in schedules])
+    deal = np.repeat(np.arange(len(schedules), dtype=np.int64), lengths)
+
+    """The accrual factor of the period ending on each row, so the accrued interest can be taken as a part of it."""
+    accrual_factors = np.full(len(days), np.nan)
+    periods = np.ones(len(days), dtype=bool)
+    periods[first_row] = False
+    for daycount in {d["daycount"] for d in deals}:
+        rows = periods & np.isin(deal, [k for k, d in enumerate(deals) if d["daycount"] == daycount])
+        accrual_factors[rows] = _accrual(
+            daycount, days[np.flatnonzero(rows) - 1], days[rows], interest_frequencies[deal[rows]]
+        )
+
+    index = ReportingIndex(
+        [d["deal_id"] for d in deals],
+        [d["daycount"] for d in deals],
+        interest_frequencies,
+        first_row,
+        last_row,
+        deal * DEAL_KEY + days + DAY_OFFSET,
+        days,
+        column("Principal balance"),
+        column("Nominal interest"),
+        column("Capitalized finance costs"),
+        column("Amortized cost"),
+        column("Effective interest"),
+        accrual_factors,
+    )
+    for array in index[2:]:
+        array.flags.writeable = False
+    return index
+
+
+def deal_index(d: dict, schedule: Schedule) -> ReportingIndex:
+    """The index of a single deal."""
+    return reporting_index([d], [schedule])
+
+
+def balances_at(index: ReportingIndex, reporting_dates, deals=None) -> ReportingBalances:
+    """
+    The balances at the reporting dates, for the deal numbers given or all the deals of the index.
+    The dates and deals are broadcast against each other, so one date can be queried for every deal,
+    every date for one deal, or a date per deal. On a payment date the balances are the ones after the payment.
+    Dates after the end date of a deal have the final balances, with nothing accrued.
+    """
+    deals = np.arange(len(index.first_row)) if deals is None else np.asarray(deals, dtype=np.int64)
+    deals, query_days = np.broadcast_arrays(deals, _day_numbers(reporting_dates))
+    deals = deals.ravel()
+    query_days = query_days.ravel()
+
+    """The row of the last payment date on or before each reporting date, which is before the first row of the deal if there is none."""
+    row = np.searchsorted(index.keys, deals * DEAL_KEY + query_days + DAY_OFFSET, side="right") - 1
+    started = row >= index.first_row[deals]
+    accruing = started & (row < index.last_row[deals])
+    row = np.where(started, row, index.first_row[deals])
+    next_row = np.where(accruing, row + 1, row)
+
+    period_days = (index.days[next_row] - index.days[row]).astype(np.float64)
+    elapsed_days = np.where(accruing, query_days - index.days[row], 0).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        accrued_effective_interest = np.where(
+            accruing, index.effective_interest[next_row] * elapsed_days / period_days, 0.0
+        )
+
+    """The nominal interest is the part of the accrual factor of the period up to the reporting date, by the day count of the deal."""
+    accrued_share = np.zeros(len(deals))
+    daycounts = np.array(index.daycounts, dtype=object)[deals]
+    for daycount in set(daycounts[accruing]):
+        rows = accruing & (daycounts == daycount)
+        accrued_share[rows] = (
+            _accrual(
+                daycount,
+                index.days[row[rows]],
+                query_days[rows],
+                index.interest_frequencies[deals[rows]],
+            )
+            / index.accrual_factors[next_row[rows]]
+        )
+    accrued_nominal_interest = np.where(accruing, index.nominal_interest[next_row] * accrued_share, 0.0)
+
+    balances = ReportingBalances(
+        deals,
+        query_days.astype("datetime64[D]"),
+        row - index.first_row[deals],
+        index.principal_balance[row].copy(),
+        np.round(accrued_nominal_interest, 2),
+        np.round(accrued_effective_interest, 2),
+        np.round(
+            index.capitalized_finance_costs[row] - (accrued_effective_interest - accrued_nominal_interest), 2
+        ),
+        np.round(index.amortized_cost[row] + accrued_effective_interest, 2),
+    )
+    balances.period[~started] = -1
+    for column in balances[3:]:
+        column[~started] = np.nan
+    return balances
+
+
+def balance_rows(index: ReportingIndex, balances: ReportingBalances, missing="") -> list:
+    """
+    The balances as rows of python values, with the deal id and the reporting date, eg. for CSV or JSON.
+    The NaN balances of the dates before the start of a deal are replaced by missing, as in Schedule.values.
+    """
+    columns = [
+        [missing if value != value else value for value in column.tolist()] for column in balances[2:]
+    ]
+    return [
+        {
+            "Deal id": index.deal_ids[deal],
+            "Reporting date": reporting_date,
+            **dict(zip(BALANCE_FIELDS, values)),
+        }
+        for deal, reporting_date, *values in zip(balances.deals.tolist(), balances.dates.tolist(), *columns)
+    ]
+
+
+def balance_at(d: dict, schedule: Schedule, reporting_date: date, missing=None) -> dict:
+    """The balances of one deal at one reporting date."""
+    index = deal_index(d, schedule)
+    return balance_rows(index, balances_at(index, reporting_date, 0), missing)[0]
@@ -0,0 +1,214 @@
+"""
+Cache of calculation results shared by all worker processes, so an identical deal submitted again is not recalculated.
+
+The results are keyed by a hash of the canonical form of the deal, the rate fixings and the engine, and are kept in a local SQLite database.
+Every worker process of the app, and any other process using the same file, reads and writes the same results.
+Entries expire after the time to live, and the least recently used entries are removed once the cache is over its size limit.
+The hits and misses are counted in the database as well, so the hit rate is the one of all the workers together.
+
+A lookup only reads the database, so the hits of all the workers are served at the same time without waiting on each other.
+The hit and miss counts and the last access times are kept in the process and written together at most every flush_interval seconds,
+without waiting if another process is writing at that moment, so the counts of the last interval of a process that stops may be missing. The last access time of a result is only written again once it is older
+than touch_interval seconds, which is accurate enough to find the least recently used results.
+
+The connections are opened on first use, one per thread and process, as SQLite connections cannot be shared between them.
+"""
+
+from datetime import date
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+"""Bumped whenever a change in the calculations changes the results, so that results calculated before are not used."""
+CACHE_VERSION = 2
+
+
+def deal_key(engine: str, d: dict, interest_dict: list) -> str:
+    """
+    The SHA-256 hash of the engine, the validated deal and the rate fixings in canonical JSON,
+    with the keys sorted and the dates in ISO format, so equal deals always have the same key.
+    """
+    canonical = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "engine": engine,
+            "deal": dict(d),
+            "fixings": [(item["date"], item["rate"]) for item in interest_dict],
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=lambda value: value.isoformat() if isinstance(value, date) else str(value),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 24 * 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+        flush_interval: float = 1.0,
+        touch_interval: float = 60.0,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self._pending_lock = threading.Lock()
+        self._pending = {"hits": 0, "misses": 0}
+        self._accessed = dict()
+        self._flushed = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        """The connection of the current thread, opened again in a forked worker process."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, created REAL, accessed REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        connection.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+        connection.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str):
+        """Returns the cached result, or None on a miss. Hits and misses are counted."""
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT value, accessed FROM results WHERE key = ? AND created > ?", (key, now - self.ttl)
+        ).fetchone()
+        with self._pending_lock:
+            if row is None:
+                self._pending["misses"] += 1
+            else:
+                self._pending["hits"] += 1
+                if now - row[1] >= self.touch_interval:
+                    self._accessed[key] = now
+        self.flush(wait=False)
+        return None if row is None else pickle.loads(zlib.decompress(row[0]))
+
+    def flush(self, wait: bool = True) -> None:
+        """
+        Writes the hit and miss counts and the last access times of this process. Without wait it is only written
+        after flush_interval seconds from the last write, and is left for the next time if the database is locked by another process.
+        """
+        now = time.time()
+        with self._pending_lock:
+            if not wait and now - self._flushed < self.flush_interval:
+                return
+            self._flushed = now
+            pending, accessed = self._pending, self._accessed
+            if not any(pending.values()) and not accessed:
+                return
+            self._pending = {"hits": 0, "misses": 0}
+            self._accessed = dict()
+
+        connection = self._connection()
+        try:
+            if not wait:
+                connection.execute("PRAGMA busy_timeout = 0")
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany(
+                    "UPDATE stats SET value = value + ? WHERE name = ?",
+                    [(count, name) for name, count in pending.items()],
+                )
+                connection.executemany(
+                    "UPDATE results SET accessed = MAX(accessed, ?) WHERE key = ?",
+                    [(accessed_time, key) for key, accessed_time in accessed.items()],
+                )
+        except sqlite3.OperationalError:
+            with self._pending_lock:
+                for name, count in pending.items():
+                    self._pending[name] += count
+                for key, accessed_time in accessed.items():
+                    self._accessed.setdefault(key, accessed_time)
+        finally:
+            if not wait:
+                connection.execute("PRAGMA busy_timeout = 30000")
+
+    def put(self, key: str, result) -> None:
+        """
+        Stores the result, then removes the expired entries and the least recently used ones until the cache is within max_bytes.
+        The last access times of this process are written first, so the least recently used results are found by them.
+        """
+        self.flush()
+        value = zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            evicted = connection.execute(
+                "DELETE FROM results WHERE created <= ?", (now - self.ttl,)
+            ).rowcount
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in connection.execute(
+                    "SELECT key, size FROM results WHERE key != ? ORDER BY accessed", (key,)
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    connection.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                    total -= size
+                    evicted += 1
+            if evicted:
+                connection.execute(
+                    "UPDATE stats SET value = value + ? WHERE name = 'evictions'", (evicted,)
+                )
+
+    def get_or_calculate(self, engine: str, d: dict, interest_dict: list, calculate):
+        """Returns the cached result of the engine for the deal and fixings, calculating and caching it on a miss."""
+        key = deal_key(engine, d, interest_dict)
+        result = self.get(key)
+        if result is None:
+            result = calculate(d, interest_dict)
+            self.put(key, result)
+        return result
+
+    def info(self) -> dict:
+        """Hits, misses, hit rate and evictions of all the workers, the number of cached results and their size in bytes."""
+        self.flush()
+        connection = self._connection()
+        stats = dict(connection.execute("SELECT name, value FROM stats").fetchall())
+        entries, size = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        lookups = stats["hits"] + stats["misses"]
+        return dict(
+            stats,
+            hit_rate=stats["hits"] / lookups if lookups else 0.0,
+            entries=entries,
+            size=size,
+        )
+
+    def clear(self) -> None:
+        with self._pending_lock:
+            self._pending = {"hits": 0, "misses": 0}
+            self._accessed = dict()
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM results")
+            connection.execute("UPDATE stats SET value = 0")
@@ -0,0 +1,109 @@
+"""
+Server side store for calculation results, so that the session only needs to hold the id of the result.
+
+The results are kept as files in a directory, so every worker process of the app can read the results of the others.
+Each result is pickled and compressed with zlib, which is several times smaller than the pickled session
+and does not have to be loaded on requests that do not use the result.
+Results expire after the time to live, and the oldest results are removed once the directory is over its size limit.
+A background thread sweeps the directory periodically.
+"""
+
+import os
+import pickle
+import threading
+import time
+import uuid
+import zlib
+
+
+class ResultStore:
+    def __init__(
+        self,
+        directory: str,
+        ttl: float = 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+        sweep_interval: float = 60,
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, result_id: str) -> str:
+        return os.path.join(self.directory, f"{result_id}.result")
+
+    def put(self, result: dict) -> str:
+        """
+        Stores the result and returns its id.
+        The file is written under a temporary name first, so other workers never read a half written result.
+        """
+        result_id = uuid.uuid4().hex
+        data = zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        temporary_path = self._path(result_id) + ".tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(data)
+        os.replace(temporary_path, self._path(result_id))
+        return result_id
+
+    def get(self, result_id: str) -> dict:
+        """Returns the stored result, or None if there is no such result or it has expired."""
+        if not result_id or not all(c in "0123456789abcdef" for c in result_id):
+            return None
+        try:
+            with open(self._path(result_id), "rb") as file:
+                if time.time() - os.fstat(file.fileno()).st_mtime > self.ttl:
+                    return None
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        return pickle.loads(zlib.decompress(data))
+
+    def sweep(self) -> int:
+        """
+        Removes the expired results, then the oldest results until the directory is within max_bytes.
+        Returns the number of results removed. Results removed by another worker at the same time are skipped.
+        """
+        now = time.time()
+        entries = list()
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".result"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if now - mtime <= self.ttl and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+
+    def start_sweeper(self) -> None:
+        """Starts the background thread sweeping the directory every sweep_interval seconds."""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep_periodically, daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+
+    def _sweep_periodically(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            self.sweep()
@@ -0,0 +1,143 @@
+"""
+Columnar schedule type returned by the calculations.
+
+A schedule holds one typed array per column (float64 for amounts and rates, datetime64[D] for dates, int64 for years)
+and the columns that are the same on every row, like the deal id and the currency, only once as scalars.
+The periodic columns that have no value in period 0 hold NaN there instead of an empty string,
+so every column can be calculated with as a whole.
+
+For the templates, the CSV export and any code written against the reports as lists of rows,
+indexing or iterating a schedule gives light read only row views that look up the values in the columns when asked.
+"""
+
+from collections.abc import Mapping
+import math
+
+import numpy as np
+
+
+class Schedule:
+    __slots__ = ("fields", "metadata", "columns", "length")
+
+    def __init__(self, data: dict):
+        """
+        The data maps the column names in the order of the report to either a list or array of values per row,
+        or to a single value that is the same on every row (eg. "Deal id").
+        Lists with empty strings are turned into float arrays with NaN in their place.
+        """
+        self.fields = tuple(data)
+        self.metadata = dict()
+        self.columns = dict()
+        for name, values in data.items():
+            if isinstance(values, (list, tuple, np.ndarray)):
+                self.columns[name] = column_array(values)
+            else:
+                self.metadata[name] = values
+        self.length = len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Row(self, i) for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("schedule index out of range")
+        return Row(self, index)
+
+    def __iter__(self):
+        return (Row(self, i) for i in range(self.length))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Schedule):
+            return NotImplemented
+        return (
+            self.fields == other.fields
+            and self.metadata == other.metadata
+            and all(
+                np.array_equal(
+                    column,
+                    other.columns[name],
+                    equal_nan=column.dtype.kind == "f",
+                )
+                for name, column in self.columns.items()
+            )
+        )
+
+    def __repr__(self) -> str:
+        return f"Schedule({self.length} rows, {self.metadata})"
+
+    def column(self, name: str) -> np.ndarray:
+        """The array of a column, the columns that are the same on every row are repeated to the length of the schedule."""
+        if name in self.metadata:
+            return np.full(self.length, self.metadata[name], dtype=object)
+        return self.columns[name]
+
+    def values(self, missing=""):
+        """Yields each row as a list of values in the order of the fields, with the missing value in place of NaN, eg. for CSV."""
+        columns = [
+            [self.metadata[name]] * self.length
+            if name in self.metadata
+            else self.columns[name].tolist()
+            for name in self.fields
+        ]
+        for row in zip(*columns):
+            yield [missing if isinstance(value, float) and math.isnan(value) else value for value in row]
+
+    def to_columns(self, missing=None) -> dict:
+        """One list per column, with the missing value in place of NaN, eg. for JSON."""
+        return dict(zip(self.fields, map(list, zip(*self.values(missing))))) if self.length else {}
+
+    def to_dicts(self, missing="") -> list:
+        """The schedule as a list of dictionaries, one per row, as the reports used to be."""
+        return [dict(zip(self.fields, row)) for row in self.values(missing)]
+
+
+class Row(Mapping):
+    """Read only view of one row of a schedule."""
+
+    __slots__ = ("schedule", "index")
+
+    def __init__(self, schedule: Schedule, index: int):
+        self.schedule = schedule
+        self.index = index
+
+    def __getitem__(self, name: str):
+        if name in self.schedule.metadata:
+            return self.schedule.metadata[name]
+        return self.schedule.columns[name][self.index].item()
+
+    def __iter__(self):
+        return iter(self.schedule.fields)
+
+    def __len__(self) -> int:
+        return len(self.schedule.fields)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+def column_array(values) -> np.ndarray:
+    """
+    Turns the values of a column into a read only typed array: dates into datetime64[D],
+    integers into int64 and everything else into float64 with NaN in place of empty strings.
+    """
+    if isinstance(values, np.ndarray):
+        array = values
+    else:
+        values = list(values)
+        present = [value for value in values if value != ""]
+        if present and all(hasattr(value, "isoformat") for value in present):
+            array = np.array(values, dtype="datetime64[D]")
+        elif present and len(present) == len(values) and all(
+            isinstance(value, (int, np.integer)) and not isinstance(value, bool) for value in present
+        ):
+            array = np.array(values, dtype=np.int64)
+        else:
+            array = np.array(
+                [np.nan if value == "" else value for value in values], dtype=np.float64
+            )
+    array.flags.writeable = False
+    return array
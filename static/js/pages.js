@@ -0,0 +1,41 @@
+// Paged reports: the first page is rendered with the report, the other pages are fetched as JSON rows already formatted
+function showPage(pager, page) {
+    const table = document.getElementById(pager.dataset.table);
+    const url = pager.dataset.url.replace(/\d+$/, page);
+    fetch(url, { credentials: 'same-origin' })
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error('Page is not found');
+            }
+            return response.json();
+        })
+        .then(function (data) {
+            const body = document.createElement('tbody');
+            body.style.cssText = table.tBodies[0].style.cssText;
+            data.rows.forEach(function (row) {
+                const line = body.insertRow();
+                row.forEach(function (value) {
+                    line.insertCell().textContent = value;
+                });
+            });
+            table.replaceChild(body, table.tBodies[0]);
+            pager.dataset.page = data.page;
+            pager.querySelector('.page-number').textContent = data.page + ' / ' + data.pages;
+            pager.querySelector('.page-previous').disabled = data.page <= 1;
+            pager.querySelector('.page-next').disabled = data.page >= data.pages;
+        })
+        .catch(function (error) {
+            pager.querySelector('.page-number').textContent = error.message;
+        });
+}
+
+window.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('.report-pager').forEach(function (pager) {
+        pager.querySelector('.page-previous').addEventListener('click', function () {
+            showPage(pager, parseInt(pager.dataset.page) - 1);
+        });
+        pager.querySelector('.page-next').addEventListener('click', function () {
+            showPage(pager, parseInt(pager.dataset.page) + 1);
+        });
+    });
+});
@@ -0,0 +1,377 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import gzip
+import io
+
+from flask_session import Session
+import numpy as np
+import pytest
+
+import app as app_module
+from app import app
+from get_data import get_deal
+
+form = {
+    "functional_ccy": "USD",
+    "deal_id": "DN0000",
+    "principal_amount": "400,000,000",
+    "deal_ccy": "USD",
+    "deal_fx_rate": "",
+    "discount": "",
+    "premium": "",
+    "setup_costs_total": "10000000",
+    "start_date": "2021-04-07",
+    "end_date": "2025-04-07",
+    "first_interest_date": "2021-10-07",
+    "interest_rate": "5.46",
+    "structure": "amortizing",
+    "interest_freq": "semi_annual",
+    "daycount": "actual_actual",
+    "interest_type": "floating",
+    "interest_date[]": ["2022-04-07", "2022-10-07"],
+    "interest_rate[]": ["5.129", "5.92"],
+}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    The sessions, the results and the other stores are written into temporary directories.
+    No job workers are started, the tests run the queued jobs themselves.
+    """
+    app.config["SESSION_FILE_DIR"] = str(tmp_path / "sessions")
+    Session(app)
+    monkeypatch.setitem(app.config, "RESULT_STORE_DIR", str(tmp_path / "results"))
+    monkeypatch.setitem(app.config, "RESULT_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setitem(app.config, "DEAL_STATE_PATH", str(tmp_path / "deals.sqlite3"))
+    monkeypatch.setitem(app.config, "JOB_QUEUE_PATH", str(tmp_path / "jobs.sqlite3"))
+    app_module.init_app(workers=False)
+    yield app.test_client()
+    app_module.shutdown_app()
+
+
+def post(client, action, **fields):
+    return client.post(
+        "/calculation",
+        data=dict(form, action=action, **fields),
+        base_url="https://localhost",
+    )
+
+
+def test_download_report_streams_csv(client):
+    post(client, "complex_eir_calculation")
+    response = client.get("/download/report", base_url="https://localhost")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    assert "DN0000_amortization_schedule.csv" in response.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 9
+    assert rows[0]["Dates"] == "2021-04-07"
+    assert rows[0]["Nominal interest"] == ""
+
+
+def test_format_amounts_and_percents():
+    values = np.array([[0.0, -0.004, 999.995], [1234567.891, -1000.0, np.nan]])
+    assert app_module.format_amounts(values).tolist() == [
+        ["0.00", "-0.00", "1,000.00"],
+        ["1,234,567.89", "-1,000.00", ""],
+    ]
+    assert app_module.format_percents(np.array([5.4567, -0.0014, np.nan]), 3).tolist() == ["5.457%", "-0.001%", ""]
+
+
+def test_report_pages(client, monkeypatch):
+    monkeypatch.setattr(app_module, "PAGE_SIZE", 4)
+    response = post(client, "comparision", end_date="2031-04-07", structure="bullet")
+    text = response.get_data(as_text=True)
+    assert text.count('class="report-pager') == 2
+    assert "400,000,000.00" in text
+
+    with client.session_transaction() as session:
+        schedule = app_module.RESULTS.get(session["result_id"])["schedule"]
+    response = client.get("/report/comparision/page/4", base_url="https://localhost")
+    assert response.status_code == 200
+    page = response.get_json()
+    assert (page["page"], page["pages"]) == (4, 5)
+    assert len(page["rows"]) == 4
+    assert page["rows"][0][:2] == ["DN0000", "2027-10-07"]
+    for name, column in zip(schedule.fields, zip(*page["rows"])):
+        values = schedule.column(name)[12:16]
+        if name in app_module.PERCENT_COLUMNS:
+            assert list(column) == app_module.format_percents(values, app_module.PERCENT_COLUMNS[name]).tolist()
+        elif values.dtype.kind == "f":
+            assert list(column) == app_module.format_amounts(values).tolist()
+
+    assert client.get("/report/summary/page/3", base_url="https://localhost").get_json()["rows"][0][1] == "2029"
+
+    assert len(client.get("/report/summary/page/3", base_url="https://localhost").get_json()["rows"]) == 3
+    assert client.get("/report/comparision/page/6", base_url="https://localhost").status_code == 404
+    assert client.get("/report/unknown/page/1", base_url="https://localhost").status_code == 404
+
+
+def test_download_report_gzip(client):
+    post(client, "comparision")
+    response = client.get("/download/summary?gzip=1", base_url="https://localhost")
+    assert response.mimetype == "application/gzip"
+    assert "DN0000_summary_schedule.csv.gz" in response.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.get_data()).decode())))
+    assert [row["Years"] for row in rows] == ["2021", "2022", "2023", "2024", "2025"]
+
+
+def test_session_only_holds_result_id(client):
+    post(client, "comparision")
+    with client.session_transaction() as session:
+        assert "schedule" not in session
+        assert "summary" not in session
+        result = app_module.RESULTS.get(session["result_id"])
+    assert len(result["schedule"]) == 8
+    assert len(result["summary"]) == 5
+
+
+def test_concurrent_requests_keep_their_own_deals(client):
+    """Different deals posted from many threads at the same time each get their own correct schedule."""
+    principals = [f"{100_000_000 + 1_000_000 * i:,}" for i in range(16)]
+
+    def calculate(principal):
+        thread_client = app.test_client()
+        post(thread_client, "complex_eir_calculation", principal_amount=principal, deal_id=principal)
+        with thread_client.session_transaction() as session:
+            return app_module.RESULTS.get(session["result_id"])["schedule"]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        schedules = list(executor.map(calculate, principals * 4))
+
+    expected = {principal: calculate(principal) for principal in principals}
+    for principal, schedule in zip(principals * 4, schedules):
+        assert schedule[0]["Deal id"] == principal
+        assert schedule[0]["Principal balance"] == float(principal.replace(",", ""))
+        assert schedule == expected[principal]
+
+
+def test_deal_is_read_only():
+    deal = get_deal(dict(form, setup_costs=form["setup_costs_total"]))
+    with pytest.raises(TypeError):
+        deal["principal_amount"] = 0
+
+
+def api_deal(**fields):
+    deal = {
+        key.replace("_total", ""): value
+        for key, value in form.items()
+        if not key.endswith("[]")
+    }
+    deal["fixings"] = [
+        {"date": date, "rate": rate}
+        for date, rate in zip(form["interest_date[]"], form["interest_rate[]"])
+    ]
+    return dict(deal, **fields)
+
+
+def test_api_eir_batch(client):
+    response = client.post(
+        "/api/v1/eir",
+        json={
+            "engine": "complex",
+            "deals": [api_deal(), api_deal(deal_id="DN0001", structure="bullet"), api_deal(daycount="x")],
+        },
+        base_url="https://localhost",
+    )
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["deal_id"] for result in results] == ["DN0000", "DN0001", "DN0000"]
+    schedule = results[0]["schedule"]
+    assert len(schedule["Dates"]) == 9
+    assert schedule["Dates"][0] == "2021-04-07"
+    assert schedule["Nominal interest"][0] is None
+    assert -1 < schedule["Amortized cost"][-1] < 1
+    assert results[2]["error"] == "Invalid daycount"
+    with client.session_transaction() as session:
+        assert "result_id" not in session
+
+
+@pytest.mark.parametrize("fast_encoder", [True, False])
+def test_api_eir_single_comparision(client, monkeypatch, fast_encoder):
+    if not fast_encoder:
+        monkeypatch.setattr(app_module, "orjson", None)
+    response = client.post(
+        "/api/v1/eir",
+        json=dict(api_deal(), engine="comparision"),
+        base_url="https://localhost",
+    )
+    [result] = response.get_json()["results"]
+    assert result["summary"]["Years"] == [2021, 2022, 2023, 2024, 2025]
+    assert len(result["schedule"]["Complex EIR"]) == 8
+    assert result["efficiency"] is not None
+
+
+def test_api_eir_invalid_request(client):
+    assert client.post("/api/v1/eir", data="x", base_url="https://localhost").status_code == 400
+    response = client.post("/api/v1/eir", json={"deals": [], "engine": "x"}, base_url="https://localhost")
+    assert response.status_code == 400
+
+
+def test_api_eir_malformed_fixings(client):
+    """A deal with malformed fixings gets an error of its own, the other deals of the batch are still calculated."""
+    response = client.post(
+        "/api/v1/eir",
+        json={"deals": [api_deal(fixings=[{"rate": "5.129"}]), api_deal(fixings=5), api_deal()]},
+        base_url="https://localhost",
+    )
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert results[0]["error"] == results[1]["error"] == "Invalid fixings, each fixing needs a date and a rate"
+    assert "schedule" in results[2]
+
+
+def test_api_eir_null_and_nested_fields(client):
+    """A null field is taken as an empty field of the form, a list or an object is rejected."""
+    response = client.post(
+        "/api/v1/eir",
+        json={"deals": [api_deal(discount=None, premium=None, deal_fx_rate=None), api_deal(discount=[1])]},
+        base_url="https://localhost",
+    )
+    expected = client.post("/api/v1/eir", json=api_deal(), base_url="https://localhost").get_json()
+    results = response.get_json()["results"]
+    assert results[0]["schedule"] == expected["results"][0]["schedule"]
+    assert results[1]["error"] == "Invalid value for discount"
+    response = client.post("/api/v1/sensitivity", json=api_deal(premium={"x": 1}), base_url="https://localhost")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid value for premium"
+
+
+def test_metrics_endpoint(client):
+    post(client, "comparision")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert 'route="/calculation",method="POST",status="200"' in text
+    assert 'eir_stage_seconds_count{stage="complex_resets"}' in text
+
+
+def test_resubmitted_deal_is_taken_from_result_cache(client):
+    post(client, "complex_eir_calculation")
+    post(client, "complex_eir_calculation")
+    post(client, "complex_eir_calculation", principal_amount="300,000,000")
+    info = app_module.RESULT_CACHE.info()
+    assert (info["hits"], info["misses"], info["entries"]) == (1, 2, 2)
+    assert "eir_result_cache_hits_total 1" in client.get("/metrics").get_data(as_text=True)
+    post(client, "comparision")
+    assert "were not timed" in post(client, "comparision").get_data(as_text=True)
+
+
+def test_api_sensitivity(client):
+    response = client.post(
+        "/api/v1/sensitivity", json=api_deal(), base_url="https://localhost"
+    )
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["shocks"][0] == -300 and len(result["shocks"]) == 25
+    assert len(result["cube"]["Effective interest"]) == 25
+    assert len(result["cube"]["Amortized cost"][0]) == 9
+    assert result["yearly"]["Years"] == [2021, 2022, 2023, 2024, 2025]
+    rates = result["effective_interest_rate"]
+    assert rates == sorted(rates)
+
+    response = client.post(
+        "/api/v1/sensitivity",
+        json=api_deal(interest_type="fixed", shocks=[0]),
+        base_url="https://localhost",
+    )
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Rate shocks can only be applied to floating rate deals"
+    response = client.post(
+        "/api/v1/sensitivity", json=api_deal(shocks="x"), base_url="https://localhost"
+    )
+    assert response.status_code == 400
+    response = client.post(
+        "/api/v1/sensitivity", json=api_deal(fixings=[{"date": "2022-04-07"}]), base_url="https://localhost"
+    )
+    assert response.status_code == 400
+    assert response.get_json()["deal_id"] == "DN0000"
+
+
+def test_api_rate_resets(client):
+    response = client.post("/api/v1/deals", json=api_deal(fixings="x"), base_url="https://localhost")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid fixings, each fixing needs a date and a rate"
+    assert client.get("/api/v1/deals/DN0000", base_url="https://localhost").status_code == 404
+    for deal_id in ("", None):
+        response = client.post("/api/v1/deals", json=api_deal(deal_id=deal_id), base_url="https://localhost")
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "Invalid deal id, the deal id is required to store the deal"
+    without_id = {key: value for key, value in api_deal().items() if key != "deal_id"}
+    assert client.post("/api/v1/deals", json=without_id, base_url="https://localhost").status_code == 400
+
+    deal = api_deal()
+    deal["fixings"] = deal["fixings"][:1]
+    response = client.post("/api/v1/deals", json=deal, base_url="https://localhost")
+    assert response.status_code == 201
+
+    response = client.post(
+        "/api/v1/deals/DN0000/resets",
+        json={"date": "2022-10-07", "rate": "5.92"},
+        base_url="https://localhost",
+    )
+    assert response.status_code == 200
+    expected = client.post("/api/v1/eir", json=api_deal(), base_url="https://localhost")
+    assert response.get_json()["schedule"] == expected.get_json()["results"][0]["schedule"]
+    assert client.get("/api/v1/deals/DN0000", base_url="https://localhost").get_json()["fixings"] == [
+        {"date": "2021-10-07", "rate": 5.46},
+        {"date": "2022-04-07", "rate": 5.129},
+        {"date": "2022-10-07", "rate": 5.92},
+    ]
+
+    response = client.get(
+        "/api/v1/deals/DN0000/balances?date=2021-01-01&date=2022-01-07", base_url="https://localhost"
+    )
+    balances = response.get_json()["balances"]
+    assert [row["Period"] for row in balances] == [-1, 1]
+    assert balances[0]["Amortized cost"] is None and balances[1]["Accrued effective interest"] > 0
+
+    response = client.post(
+        "/api/v1/deals/DN0000/resets",
+        json={"date": "2022-10-07", "rate": "5"},
+        base_url="https://localhost",
+    )
+    assert response.status_code == 400
+    response = client.post(
+        "/api/v1/deals/DN0001/resets",
+        json={"date": "2023-04-07", "rate": "5"},
+        base_url="https://localhost",
+    )
+    assert response.status_code == 404
+
+
+def test_api_jobs(client):
+    response = client.post(
+        "/api/v1/jobs",
+        json={"engine": "complex", "deals": [api_deal(), api_deal(deal_id="DN0001", daycount="x")]},
+        base_url="https://localhost",
+    )
+    assert response.status_code == 202
+    url = response.get_json()["url"]
+    assert client.get(url, base_url="https://localhost").get_json()["status"] == "queued"
+    assert client.get(url + "/result", base_url="https://localhost").status_code == 409
+
+    """The job is run here instead of in a worker thread, the test queue has no workers."""
+    assert app_module.JOBS.run_next()
+    job = client.get(url, base_url="https://localhost").get_json()
+    assert (job["status"], job["progress"]) == ("finished", 100.0)
+    result = client.get(job["result_url"], base_url="https://localhost").get_json()
+    expected = client.post("/api/v1/eir", json=api_deal(), base_url="https://localhost").get_json()
+    assert result["results"][0]["schedule"] == expected["results"][0]["schedule"]
+    assert result["results"][1]["error"] == "Invalid daycount"
+
+    response = client.get(url + "/download/summary", base_url="https://localhost")
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert [row[0] for row in rows] == ["Deal id", "DN0000", "DN0001"]
+    response = client.get(url + "/download/schedules?gzip=1", base_url="https://localhost")
+    assert len(gzip.decompress(response.get_data()).decode().splitlines()) == 10
+
+    balances = client.get(url + "/balances?date=2022-01-31", base_url="https://localhost").get_json()
+    assert [(row["Deal id"], row["Period"]) for row in balances["balances"]] == [("DN0000", 1)]
+    assert client.get(url + "/balances?date=x", base_url="https://localhost").status_code == 400
+
+    assert client.get("/api/v1/jobs/" + "0" * 32, base_url="https://localhost").status_code == 404
+    assert client.post("/api/v1/jobs", json={"deals": []}, base_url="https://localhost").status_code == 400
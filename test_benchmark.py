@@ -0,0 +1,41 @@
+import json
+
+from benchmark import compare, import_times, main, run_benchmark, startup_benchmark, synthetic_deal
+
+
+def test_synthetic_deal_resets():
+    d, interest_dict = synthetic_deal("amortizing", "actual_360", 12, 5, 0.0)
+    assert d["interest_type"] == "fixed"
+    assert len(interest_dict) == 1
+    d, interest_dict = synthetic_deal("bullet", "actual_360", 1, 1, 1.0)
+    assert d["interest_type"] == "floating"
+    assert len(interest_dict) == 11
+
+
+def test_run_benchmark_and_compare(tmp_path):
+    run = run_benchmark(
+        structures=("bullet",),
+        daycounts=("actual_365",),
+        frequencies=(6,),
+        tenors=(2,),
+        resets=(0.0, 1.0),
+        warmup=0,
+        repeats=2,
+    )
+    assert len(run["results"]) == 12
+    assert {result["resets"] for result in run["results"]} == {0, 3}
+    assert all(len(result["times"]) == 2 for result in run["results"])
+    assert all(abs(ratio - 1) < 1e-9 for ratio in compare(run, run).values())
+
+    output = tmp_path / "benchmark.json"
+    main(["--quick", "--functions", "generate_cf_dates", "--repeats", "1", "--output", str(output)])
+    assert json.loads(output.read_text())["environment"]["repeats"] == 1
+
+
+def test_startup_benchmark():
+    run = startup_benchmark(modules=("get_data",), repeats=1, top=3)
+    [result] = run["startup"]
+    assert result["module"] == "get_data"
+    assert result["median"] > 0
+    assert len(result["slowest_modules"]) == 3
+    assert "forex_python" not in import_times("get_data")
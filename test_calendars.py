@@ -0,0 +1,61 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from calendars import BusinessCalendar, available_calendars, get_calendar, load_calendar
+
+
+def test_adjust_conventions():
+    calendar = get_calendar("TARGET")
+    dates = np.array(
+        ["2024-03-29", "2024-06-29", "2024-08-31", "2024-12-25", "2024-12-27"], dtype="datetime64[D]"
+    )
+    assert calendar.adjust(dates, "following").tolist() == [
+        date(2024, 4, 2), date(2024, 7, 1), date(2024, 9, 2), date(2024, 12, 27), date(2024, 12, 27)
+    ]
+    assert calendar.adjust(dates, "modified_following").tolist() == [
+        date(2024, 3, 28), date(2024, 6, 28), date(2024, 8, 30), date(2024, 12, 27), date(2024, 12, 27)
+    ]
+    assert calendar.adjust(dates, "preceding").tolist() == [
+        date(2024, 3, 28), date(2024, 6, 28), date(2024, 8, 30), date(2024, 12, 24), date(2024, 12, 27)
+    ]
+    assert calendar.adjust(dates, "unadjusted").tolist() == dates.tolist()
+    with pytest.raises(ValueError):
+        calendar.adjust(dates, "nearest")
+    with pytest.raises(ValueError):
+        calendar.adjust([date(2300, 1, 1)], "following")
+
+
+def test_adjust_matches_numpy_busday_offset():
+    calendar = get_calendar("TARGET")
+    days = np.arange(np.datetime64("2020-01-01"), np.datetime64("2030-01-01"))
+    for convention, roll in (
+        ("following", "following"),
+        ("modified_following", "modifiedfollowing"),
+        ("preceding", "preceding"),
+    ):
+        expected = np.busday_offset(days, 0, roll=roll, holidays=calendar.holidays)
+        assert (calendar.adjust(days, convention) == expected).all()
+
+
+def test_load_calendar(tmp_path):
+    path = tmp_path / "GULF.txt"
+    path.write_text("# Friday and Saturday weekend\nweekend Fri Sat\n2024-12-02  # National Day\n\n")
+    calendar = load_calendar(str(path))
+    assert calendar.name == "GULF"
+    assert calendar.is_business_day(
+        np.array(["2024-11-29", "2024-12-01", "2024-12-02"], dtype="datetime64[D]")
+    ).tolist() == [False, True, False]
+    path.write_text("2024-13-01\n")
+    with pytest.raises(ValueError):
+        load_calendar(str(path))
+
+
+def test_get_calendar():
+    assert get_calendar("TARGET") is get_calendar("TARGET")
+    assert {"TARGET", "weekends"} <= set(available_calendars())
+    assert isinstance(get_calendar("weekends"), BusinessCalendar)
+    for name in ("NOWHERE", "../TARGET", None):
+        with pytest.raises(ValueError):
+            get_calendar(name)
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from deal_state import DealStateStore
+from eir import complex_eir_calculation
+from test_eir import deal1, interest_dict
+
+
+def test_resets_are_persisted(tmp_path):
+    path = str(tmp_path / "deals.sqlite3")
+    DealStateStore(path).start(deal1, interest_dict[:1])
+    store = DealStateStore(path)
+    for item in interest_dict[1:]:
+        schedule = store.apply_reset("DN0000", item["date"], item["rate"])
+    assert schedule == complex_eir_calculation(deal1, interest_dict)
+    state = DealStateStore(path).get("DN0000")
+    assert state.interest_dict == interest_dict
+    assert state.schedule == schedule
+
+    with pytest.raises(KeyError):
+        store.get("DN0001")
+    with pytest.raises(ValueError):
+        store.start(dict(deal1, interest_type="fixed"), interest_dict[:1])
+    assert store.delete("DN0000")
+    assert not store.delete("DN0000")
+
+
+def test_concurrent_resets_are_applied_in_turn(tmp_path):
+    """Two resets of the same date at the same time, one of them is applied and the other fails as the date is not after the last rate."""
+    store = DealStateStore(str(tmp_path / "deals.sqlite3"))
+    store.start(deal1, interest_dict[:2])
+
+    def reset(rate):
+        try:
+            store.apply_reset("DN0000", date(2022, 10, 7), rate)
+            return True
+        except ValueError:
+            return False
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert sorted(executor.map(reset, [0.05, 0.06])) == [False, True]
+    assert len(store.get("DN0000").interest_dict) == 3
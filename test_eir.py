@@ -1,13 +1,34 @@
 from datetime import date
+import math
+import numpy as np
+import pytest
+import eir
 from eir import (
+    DAYCOUNTS,
+    accrual_factors,
+    amortized_cost_residual,
+    apply_rate_reset,
+    batch_eir_calculation,
+    batch_solve_effective_interest_rates,
     calculate_effective_interest,
+    clear_schedule_cache,
+    comparision,
     complex_eir_calculation,
+    deal_schedule,
     generate_cf_dates,
+    generate_cf_dates_batch,
     generate_principal_balances,
     generate_total_cf,
     interest_cf,
     interest_rates,
+    ledger_eir_calculation,
+    ledger_postings,
+    pad_deals,
+    rate_sensitivity,
+    schedule_cache_info,
     simple_eir_calculation,
+    solve_effective_interest_rate,
+    year_fractions,
 )
 
 deal1 = {
@@ -105,11 +126,11 @@ def test_complex_eir_calculation():
     assert round(complex[-1]["Amortization schedule"], 1) == round(
         complex[-2]["Capitalized finance costs"], 1
     )
-    assert complex[0]["Nominal interest rate"] == ""
-    assert complex[0]["Nominal interest"] == ""
-    assert complex[0]["Effective interest"] == ""
-    assert complex[0]["Amortization schedule"] == ""
-    assert complex[0]["Effective interest rate"] == ""
+    assert math.isnan(complex[0]["Nominal interest rate"])
+    assert math.isnan(complex[0]["Nominal interest"])
+    assert math.isnan(complex[0]["Effective interest"])
+    assert math.isnan(complex[0]["Amortization schedule"])
+    assert math.isnan(complex[0]["Effective interest rate"])
 
 
 def test_generate_cf_dates():
@@ -202,8 +223,287 @@ def test_simple_eir_calculation():
     assert round(simple[-1]["Amortization schedule"], 1) == round(
         simple[-2]["Capitalized finance costs"], 1
     )
-    assert simple[0]["Nominal interest rate"] == ""
-    assert simple[0]["Nominal interest"] == ""
-    assert simple[0]["Effective interest"] == ""
-    assert simple[0]["Amortization schedule"] == ""
-    assert simple[0]["Effective interest rate"] == ""
+    assert math.isnan(simple[0]["Nominal interest rate"])
+    assert math.isnan(simple[0]["Nominal interest"])
+    assert math.isnan(simple[0]["Effective interest"])
+    assert math.isnan(simple[0]["Amortization schedule"])
+    assert math.isnan(simple[0]["Effective interest rate"])
+
+
+def test_schedules_roll_forward():
+    """Every row of a long schedule ties out: amortized cost = previous amortized cost - total cash flow + effective interest."""
+    long_deal = dict(
+        deal1,
+        interest_type="fixed",
+        interest_freq=1,
+        start_date=date(2021, 4, 7),
+        end_date=date(2051, 4, 7),
+        first_interest_date=date(2021, 5, 7),
+    )
+    simple, _, _ = simple_eir_calculation(long_deal, [{"date": date(2021, 5, 7), "rate": 0.0546}])
+    complex = complex_eir_calculation(dict(deal1, interest_freq=3, first_interest_date=date(2021, 7, 7)), interest_dict[:1])
+    for schedule in (simple, complex):
+        amortized_cost = schedule.column("Amortized cost")
+        rolled = np.round(
+            amortized_cost[:-1] - schedule.column("Total cash flow")[1:] + schedule.column("Effective interest")[1:], 2
+        )
+        assert (amortized_cost[1:] == rolled).all()
+    assert len(simple) == 361
+
+
+def test_solve_effective_interest_rate():
+    dates, n = generate_cf_dates(
+        deal1["start_date"],
+        deal1["end_date"],
+        deal1["first_interest_date"],
+        deal1["interest_freq"],
+    )
+    principal_balance = generate_principal_balances(
+        deal1["structure"], deal1["principal_amount"], n
+    )
+    interest_rate = interest_rates(interest_dict, n)
+    interest_cashflow = interest_cf(
+        dates,
+        interest_rate,
+        deal1["daycount"],
+        deal1["interest_freq"],
+        principal_balance,
+        n,
+    )
+    total_cash_flow = generate_total_cf(
+        deal1["principal_amount"],
+        deal1["capitalized_finance_costs"],
+        deal1["structure"],
+        interest_cashflow,
+        n,
+    )
+    fractions = year_fractions(dates, n)
+    cash_flows = np.array(total_cash_flow)
+    rate, iterations, evaluations = solve_effective_interest_rate(
+        fractions, cash_flows, guess=deal1["interest_rate"], tolerance=0.005
+    )
+    residual, _ = amortized_cost_residual(rate, fractions, cash_flows)
+    assert abs(residual) <= 0.005
+    assert rate > deal1["interest_rate"]
+    assert 0 < iterations < 10
+    assert evaluations == iterations + 2
+
+
+def test_batch_eir_calculation():
+    bullet = dict(deal1, structure="bullet", interest_type="fixed")
+    short = dict(deal1, end_date=date(2023, 4, 7))
+    deals = [deal1, bullet, short]
+    rates, reports = batch_eir_calculation(deals, [interest_dict] * 3)
+    assert len(rates) == 3
+    assert [len(report) for report in reports] == [9, 9, 5]
+    for d, report in zip(deals, reports):
+        simple, _, _ = simple_eir_calculation(d, interest_dict)
+        for batch_row, simple_row in zip(report, simple):
+            assert abs(batch_row["Amortized cost"] - simple_row["Amortized cost"]) < 0.05
+        assert -1 < report[-1]["Amortized cost"] < 1
+
+
+def test_pad_deals():
+    fractions, cash_flows, mask = pad_deals(
+        [np.array([0.5, 0.5]), np.array([1.0])],
+        [np.array([-100.0, 5.0, 105.0]), np.array([-100.0, 110.0])],
+    )
+    assert fractions.shape == (2, 2)
+    assert cash_flows.shape == (2, 3)
+    assert mask.tolist() == [[True, True], [True, False]]
+    rates, iterations, _ = batch_solve_effective_interest_rates(fractions, cash_flows)
+    assert abs(rates[1] - 0.10) < 1e-9
+    assert (iterations > 0).all()
+
+
+def test_complex_eir_calculation_bullet_fixed_matches_simple():
+    bullet = dict(deal1, structure="bullet", interest_type="fixed")
+    complex = complex_eir_calculation(bullet, interest_dict[:1])
+    simple, _, _ = simple_eir_calculation(bullet, interest_dict[:1])
+    assert complex == simple
+    assert complex[-1]["Total cash flow"] > bullet["principal_amount"]
+
+
+def test_payment_schedule_cache(monkeypatch):
+    clear_schedule_cache()
+    schedule = deal_schedule(deal1)
+    assert deal_schedule(deal1) is schedule
+    assert list(schedule.dates) == generate_cf_dates(
+        deal1["start_date"],
+        deal1["end_date"],
+        deal1["first_interest_date"],
+        deal1["interest_freq"],
+    )[0]
+    assert not schedule.year_fractions.flags.writeable
+    info = schedule_cache_info()
+    assert (info["hits"], info["misses"], info["entries"]) == (1, 1, 1)
+
+    monkeypatch.setattr(eir, "SCHEDULE_CACHE_MAX_BYTES", info["size"])
+    deal_schedule(dict(deal1, daycount="actual_360"))
+    info = schedule_cache_info()
+    assert (info["evictions"], info["entries"]) == (1, 1)
+    clear_schedule_cache()
+
+
+def test_generate_cf_dates_month_end():
+    dates, n = generate_cf_dates(
+        date(2020, 1, 15), date(2021, 1, 31), date(2020, 1, 31), 1
+    )
+    assert n == 13
+    assert dates[1:5] == [
+        date(2020, 1, 31),
+        date(2020, 2, 29),
+        date(2020, 3, 29),
+        date(2020, 4, 29),
+    ]
+    assert dates[-1] == date(2021, 1, 29)
+    array, _ = generate_cf_dates(
+        date(2020, 1, 15), date(2021, 1, 31), date(2020, 1, 31), 1, as_array=True
+    )
+    assert array.dtype == np.dtype("datetime64[D]")
+    assert array.tolist() == dates
+
+
+def test_generate_cf_dates_batch():
+    batch = generate_cf_dates_batch(
+        [deal1["end_date"], date(2021, 9, 1), date(2022, 10, 31)],
+        [deal1["first_interest_date"], date(2021, 10, 7), date(2021, 10, 31)],
+        [6, 3, 12],
+    )
+    dates, _ = generate_cf_dates(
+        deal1["start_date"],
+        deal1["end_date"],
+        deal1["first_interest_date"],
+        deal1["interest_freq"],
+    )
+    assert batch[0].tolist() == dates[2:]
+    assert len(batch[1]) == 0
+    assert batch[2].tolist() == [date(2022, 10, 31)]
+
+
+def test_accrual_factors():
+    dates = [date(2020, 11, 15), date(2021, 3, 31), date(2021, 6, 30)]
+    assert accrual_factors(dates, "thirty_360", 3, 2).tolist() == [0.25, 0.25]
+    assert accrual_factors(dates, "actual_360", 3, 2).tolist() == [136 / 360, 91 / 360]
+    assert accrual_factors(dates, "actual_actual_icma", 3, 2).tolist() == [0.375, 0.25]
+    assert accrual_factors(
+        [date(2021, 1, 31), date(2021, 3, 31)], "thirty_e_360", 2, 1
+    ).tolist() == [60 / 360]
+    assert accrual_factors(
+        [date(2020, 1, 1), date(2020, 7, 1)], "actual_actual", 6, 1
+    ).tolist() == [182 / 366]
+    assert set(DAYCOUNTS) >= {"actual_actual", "actual_365", "actual_360", "thirty_360"}
+
+
+def test_comparision():
+    schedule, summary, complex_time, simple_time, efficiency = comparision(
+        deal1, interest_dict
+    )
+    assert len(schedule) == 8
+    assert [row["Years"] for row in summary] == [2021, 2022, 2023, 2024, 2025]
+    assert round(sum(row["Complex effective interest"] for row in summary), 2) == round(
+        sum(row["Complex effective interest"] for row in schedule), 2
+    )
+    assert summary[-1]["Principal balance"] == 0.0
+    assert summary[0]["Principal balance"] == schedule[1]["Principal balance"]
+    assert complex_time > 0 and simple_time > 0
+
+
+def test_comparision_fixed_rate_has_no_difference():
+    fixed = dict(deal1, interest_type="fixed")
+    schedule, summary, _, _, _ = comparision(fixed, interest_dict[:1])
+    assert all(row["Absolute int. diff"] == 0 for row in schedule)
+    assert all(row["EIR difference"] == 0 for row in summary)
+
+
+def test_ledger_postings_tie_out():
+    for d in (deal1, dict(deal1, structure="bullet"), dict(deal1, functional_ccy="JPY")):
+        postings = ledger_postings(d, interest_dict)
+        assert postings.exponent == (0 if d["functional_ccy"] == "JPY" else 2)
+        assert postings.amortized_cost.dtype == np.int64
+        assert postings.principal_balance[0] == 400000000 * 10**postings.exponent
+        assert (
+            postings.amortized_cost
+            == postings.principal_balance - postings.capitalized_finance_costs
+        ).all()
+        assert postings.amortized_cost[-1] == 0
+        assert postings.capitalized_finance_costs[-1] == 0
+        assert (
+            postings.effective_interest
+            == postings.nominal_interest + postings.amortization_schedule
+        ).all()
+
+
+def test_ledger_matches_simple():
+    ledger = ledger_eir_calculation(deal1, interest_dict)
+    simple, _, _ = simple_eir_calculation(deal1, interest_dict)
+    assert ledger[-1]["Amortized cost"] == 0.0
+    for column in ("Nominal interest", "Effective interest", "Amortized cost", "Capitalized finance costs"):
+        assert np.nanmax(np.abs(ledger.column(column) - simple.column(column))) <= 0.011
+    assert np.array_equal(
+        ledger.column("Effective interest rate"), simple.column("Effective interest rate"), equal_nan=True
+    )
+
+
+def test_rate_sensitivity_matches_shifted_rates():
+    sensitivity = rate_sensitivity(deal1, interest_dict, [-100, 0, 100])
+    assert sensitivity.effective_interest.shape == (3, 8)
+    assert sensitivity.amortized_cost.shape == (3, 9)
+    assert (np.abs(sensitivity.amortized_cost[:, -1]) < 1).all()
+    for k, shock in enumerate((-100, 0, 100)):
+        shifted = [dict(item, rate=item["rate"] + shock / 10000) for item in interest_dict]
+        schedule = deal_schedule(deal1)
+        _, nominal_interest, total_cash_flow = eir.floating_cash_flows(
+            deal1, shifted, schedule, generate_principal_balances("amortizing", 400000000, 8)
+        )
+        rate, _, _ = solve_effective_interest_rate(schedule.year_fractions, np.array(total_cash_flow))
+        assert abs(sensitivity.effective_interest_rate[k] - rate * 100) < 1e-4
+        assert np.allclose(sensitivity.total_cash_flow[k], total_cash_flow)
+    assert sensitivity.yearly_effective_interest.sum(axis=1) == pytest.approx(
+        sensitivity.effective_interest.sum(axis=1)
+    )
+
+
+def test_apply_rate_reset_matches_complex():
+    fixings = interest_dict[:3]
+    report = complex_eir_calculation(deal1, fixings)
+    fixings, report = apply_rate_reset(deal1, fixings, report, date(2023, 4, 7), 0.05239)
+    assert report == complex_eir_calculation(deal1, interest_dict[:4])
+
+    """A reset two periods after the last rate keeps the last rate for the period in between."""
+    fixings, report = apply_rate_reset(deal1, fixings, report, date(2024, 4, 7), 0.05469)
+    assert [item["rate"] for item in fixings] == [0.0546, 0.05129, 0.0592, 0.05239, 0.05239, 0.05469]
+    assert report == complex_eir_calculation(deal1, fixings)
+
+    with pytest.raises(ValueError):
+        apply_rate_reset(deal1, fixings, report, date(2024, 4, 7), 0.05)
+    with pytest.raises(ValueError):
+        apply_rate_reset(deal1, fixings, report, date(2024, 4, 8), 0.05)
+
+
+def test_business_day_adjusted_schedule():
+    dates, _ = generate_cf_dates(
+        date(2024, 1, 31), date(2025, 6, 30), date(2024, 3, 31), 3, calendar="TARGET", convention="modified_following"
+    )
+    """The 31st of March 2024 is Easter Sunday, followed by Easter Monday, so the first payment is before Good Friday."""
+    assert dates == [
+        date(2024, 1, 31),
+        date(2024, 3, 28),
+        date(2024, 6, 28),
+        date(2024, 9, 30),
+        date(2024, 12, 30),
+        date(2025, 3, 31),
+        date(2025, 6, 30),
+    ]
+    d = dict(deal1, start_date=date(2021, 4, 7), end_date=date(2025, 4, 7), calendar="TARGET", business_day_convention="following")
+    schedule = deal_schedule(d)
+    assert schedule.dates[-1] == date(2025, 4, 7)
+    assert schedule.dates[4] == date(2023, 4, 11)
+    assert schedule.year_fractions[3] == 186 / 365
+    assert schedule.accrual_factors[3] == pytest.approx(
+        accrual_factors(list(schedule.dates), "actual_actual", 6, 8)[3]
+    )
+    assert schedule is not deal_schedule(deal1)
+    assert complex_eir_calculation(d, interest_dict[:1]).column("Nominal interest")[4] != complex_eir_calculation(
+        deal1, interest_dict[:1]
+    ).column("Nominal interest")[4]
@@ -0,0 +1,41 @@
+from datetime import date
+
+import pytest
+
+from get_data import get_currency, get_deal, get_interest_dict
+
+
+def test_get_currency():
+    assert get_currency(" usd ") == "USD"
+    assert get_currency("JPY") == "JPY"
+    assert get_currency("HRK") == "HRK"
+    for code in ("XYZ", "US", ""):
+        with pytest.raises(ValueError, match="Invalid currency code"):
+            get_currency(code)
+
+
+def test_adjusted_deal_accepts_unadjusted_fixing_dates():
+    fields = {
+        "functional_ccy": "EUR",
+        "deal_id": "DN0000",
+        "principal_amount": "1000000",
+        "deal_ccy": "EUR",
+        "start_date": "2021-04-07",
+        "end_date": "2025-04-07",
+        "first_interest_date": "2021-10-07",
+        "interest_rate": "3",
+        "structure": "bullet",
+        "interest_freq": "semi_annual",
+        "daycount": "actual_360",
+        "interest_type": "floating",
+        "business_day_convention": "modified_following",
+        "calendar": "TARGET",
+    }
+    d = get_deal(fields)
+    interest_dict = get_interest_dict(d, ["2023-04-07", "2023-04-11"], ["3.5", "4"])
+    assert [line["date"] for line in interest_dict] == [date(2021, 10, 7), date(2023, 4, 11), date(2023, 4, 11)]
+    assert get_deal(dict(fields, business_day_convention="", calendar=""))["business_day_convention"] == "unadjusted"
+    with pytest.raises(ValueError, match="Invalid business day convention"):
+        get_deal(dict(fields, business_day_convention="nearest"))
+    with pytest.raises(ValueError, match="Calendar is not found"):
+        get_deal(dict(fields, calendar="NOWHERE"))
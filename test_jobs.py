@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JOB_KINDS, JobQueue, register_job
+from test_portfolio import deal_fields
+
+deal = (deal_fields, ["2022-04-07", "2022-10-07"], ["5.129", "5.92"])
+
+
+@pytest.fixture
+def failing_job():
+    @register_job("failing")
+    def failing(payload, progress):
+        raise ValueError("Deal is broken")
+
+    yield
+    del JOB_KINDS["failing"]
+
+
+def test_portfolio_job(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.submit(
+        "portfolio", {"engine": "complex", "deals": [deal, (dict(deal_fields, daycount="x"), [], [])]}, 2
+    )
+    job = queue.get(job_id)
+    assert (job["status"], job["progress"], job["total"]) == ("queued", 0.0, 2)
+    assert queue.result(job_id) is None
+
+    assert queue.run_next()
+    assert not queue.run_next()
+    job = queue.get(job_id)
+    assert (job["status"], job["progress"], job["done"]) == ("finished", 100.0, 2)
+    result = queue.result(job_id)
+    assert len(result["schedules"][0]) == 9
+    assert [summary["Error"] for summary in result["summaries"]] == ["", "Invalid daycount"]
+    assert queue.get("0" * 32) is None
+    with pytest.raises(ValueError):
+        queue.submit("unknown", {}, 0)
+
+
+def test_failed_job(tmp_path, failing_job):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    job_id = queue.submit("failing", {}, 1)
+    assert queue.run_next()
+    job = queue.get(job_id)
+    assert (job["status"], job["error"]) == ("failed", "ValueError: Deal is broken")
+    assert queue.result(job_id) is None
+
+
+def test_concurrency_limit_is_shared_by_the_host(tmp_path):
+    """Two queues on the same file stand for two worker processes of the same host."""
+    path = str(tmp_path / "jobs.sqlite3")
+    first, second = JobQueue(path, concurrency=1), JobQueue(path, concurrency=1)
+    job_ids = [first.submit("portfolio", {"engine": "simple", "deals": [deal]}, 1) for _ in range(2)]
+    assert first.claim()[0] == job_ids[0]
+    assert second.claim() is None
+
+    """A job without a heartbeat for stale_after seconds is queued again, eg. after its worker process died."""
+    second.stale_after = 0
+    time.sleep(0.01)
+    assert second.claim()[0] == job_ids[0]
+
+
+@pytest.fixture
+def slow_job():
+    @register_job("slow")
+    def slow(payload, progress):
+        time.sleep(payload["seconds"])
+        progress(1)
+        return "done"
+
+    yield
+    del JOB_KINDS["slow"]
+
+
+def test_heartbeat_keeps_a_long_job_claimed(tmp_path, slow_job):
+    """A job with one item running longer than stale_after is not queued again while its worker is alive."""
+    path = str(tmp_path / "jobs.sqlite3")
+    first = JobQueue(path, concurrency=2, stale_after=0.3, heartbeat_interval=0.05)
+    second = JobQueue(path, concurrency=2, stale_after=0.3)
+    job_id = first.submit("slow", {"seconds": 1}, 1)
+    worker = threading.Thread(target=first.run_next)
+    worker.start()
+    for _ in range(10):
+        time.sleep(0.1)
+        assert second.claim() is None
+    worker.join()
+    assert first.result(job_id) == "done"
+
+
+def test_worker_threads(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), concurrency=2, poll_interval=0.05)
+    queue.start_workers()
+    try:
+        job_id = queue.submit("portfolio", {"engine": "ledger", "deals": [deal] * 3}, 3)
+        for _ in range(200):
+            if queue.get(job_id)["status"] == "finished":
+                break
+            time.sleep(0.05)
+        assert len(queue.result(job_id)["summaries"]) == 3
+    finally:
+        queue.stop_workers()
@@ -0,0 +1,53 @@
+import pytest
+
+import metrics
+from eir import comparision, simple_eir_calculation
+from test_eir import deal1, interest_dict
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_stage_records_once():
+    with metrics.stage("test") as timer:
+        pass
+    with pytest.raises(ZeroDivisionError):
+        with metrics.stage("test"):
+            1 / 0
+    count, total = metrics.snapshot()["stages"]["test"]
+    assert count == 2
+    assert 0 <= timer.seconds <= total
+
+
+def test_engines_solve_once_and_time_their_stages():
+    simple_eir_calculation(deal1, interest_dict)
+    snapshot = metrics.snapshot()
+    assert snapshot["solver"]["solves"] == 1
+    assert snapshot["solver"]["iterations"] > 0
+    assert snapshot["stages"]["effective_interest"][0] == 1
+    assert snapshot["stages"]["floating_effective_interest"][0] == 1
+
+    metrics.reset()
+    _, _, complex_time, simple_time, _ = comparision(deal1, interest_dict)
+    snapshot = metrics.snapshot()
+    assert snapshot["solver"]["solves"] == len(interest_dict)
+    assert snapshot["stages"]["effective_interest"] == (1, complex_time)
+    assert snapshot["stages"]["floating_effective_interest"] == (1, simple_time)
+
+
+def test_prometheus_text():
+    metrics.observe_request("/calculation", "POST", 200, 0.03)
+    metrics.observe_request("/calculation", "POST", 200, 20.0)
+    metrics.record_solver(5, 7, solves=2)
+    text = metrics.prometheus_text()
+    labels = 'route="/calculation",method="POST",status="200"'
+    assert f'eir_request_duration_seconds_bucket{{{labels},le="0.025"}} 0' in text
+    assert f'eir_request_duration_seconds_bucket{{{labels},le="0.05"}} 1' in text
+    assert f'eir_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"eir_request_duration_seconds_count{{{labels}}} 2" in text
+    assert "eir_solver_solves_total 2" in text
+    assert "eir_solver_iterations_total 5" in text
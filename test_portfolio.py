@@ -0,0 +1,88 @@
+import csv
+import json
+
+from portfolio import main, read_deals, run_portfolio
+
+deal_fields = {
+    "functional_ccy": "USD",
+    "deal_id": "DN0000",
+    "principal_amount": "400,000,000",
+    "deal_ccy": "USD",
+    "deal_fx_rate": "",
+    "discount": "",
+    "premium": "",
+    "setup_costs": "10000000",
+    "start_date": "2021-04-07",
+    "end_date": "2025-04-07",
+    "first_interest_date": "2021-10-07",
+    "interest_rate": "5.46",
+    "structure": "amortizing",
+    "interest_freq": "semi_annual",
+    "daycount": "actual_actual",
+    "interest_type": "floating",
+}
+
+
+def test_read_deals_csv_and_json(tmp_path):
+    csv_path = tmp_path / "deals.csv"
+    with open(csv_path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(deal_fields) + ["fixings"])
+        writer.writeheader()
+        writer.writerow(dict(deal_fields, fixings="2022-04-07:5.129;2022-10-07:5.92"))
+    json_path = tmp_path / "deals.json"
+    json_path.write_text(
+        json.dumps(
+            [
+                dict(
+                    deal_fields,
+                    fixings=[
+                        {"date": "2022-04-07", "rate": 5.129},
+                        {"date": "2022-10-07", "rate": 5.92},
+                    ],
+                )
+            ]
+        )
+    )
+    for path in (csv_path, json_path):
+        [(fields, dates, rates)] = read_deals(str(path))
+        assert fields["deal_id"] == "DN0000"
+        assert "fixings" not in fields
+        assert dates == ["2022-04-07", "2022-10-07"]
+        assert rates == ["5.129", "5.92"]
+
+
+def test_run_portfolio():
+    deals = [
+        (deal_fields, ["2022-04-07"], ["5.129"]),
+        (dict(deal_fields, deal_id="DN0001", structure="bullet"), [], []),
+        (dict(deal_fields, deal_id="DN0002"), ["2022-04-08"], ["5.129"]),
+    ]
+    schedules, summaries, elapsed = run_portfolio(deals, "complex", workers=2, chunksize=1)
+    assert [len(schedule) for schedule in schedules] == [9, 9, 0]
+    assert [summary["Deal id"] for summary in summaries] == ["DN0000", "DN0001", "DN0002"]
+    assert summaries[0]["Error"] == ""
+    assert -1 < summaries[0]["Final amortized cost"] < 1
+    assert summaries[2]["Error"] == "Date is not valid: 2022-04-08"
+    assert elapsed > 0
+
+
+def test_main_writes_results(tmp_path, capsys):
+    json_path = tmp_path / "deals.json"
+    json_path.write_text(json.dumps([deal_fields, dict(deal_fields, deal_id="DN0001")]))
+    main([str(json_path), "--engine", "simple", "--output-dir", str(tmp_path / "out"), "--workers", "1"])
+    with open(tmp_path / "out" / "summary.csv") as file:
+        assert len(list(csv.DictReader(file))) == 2
+    with open(tmp_path / "out" / "schedules.csv") as file:
+        assert len(list(csv.DictReader(file))) == 18
+    assert "deals/sec" in capsys.readouterr().out
+
+
+def test_main_writes_balances(tmp_path):
+    json_path = tmp_path / "deals.json"
+    json_path.write_text(json.dumps([deal_fields, dict(deal_fields, deal_id="DN0001", daycount="x")]))
+    main(
+        [str(json_path), "--output-dir", str(tmp_path / "out"), "--workers", "1", "--reporting-date", "2022-01-31"]
+    )
+    with open(tmp_path / "out" / "balances.csv") as file:
+        rows = list(csv.DictReader(file))
+    assert [(row["Deal id"], row["Reporting date"], row["Period"]) for row in rows] == [("DN0000", "2022-01-31", "1")]
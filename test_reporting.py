@@ -0,0 +1,51 @@
+from datetime import date
+
+import numpy as np
+
+from eir import complex_eir_calculation, simple_eir_calculation
+from reporting import balance_at, balances_at, reporting_index
+from test_eir import deal1, interest_dict
+
+
+def test_balances_between_payment_dates():
+    schedule = complex_eir_calculation(deal1, interest_dict)
+    balance = balance_at(deal1, schedule, date(2022, 1, 7))
+    assert balance["Period"] == 1
+    assert balance["Principal balance"] == schedule[1]["Principal balance"]
+
+    """92 of the 182 days from the 7th of October 2021 to the 7th of April 2022 have passed."""
+    effective_interest = schedule[2]["Effective interest"] * 92 / 182
+    assert balance["Accrued effective interest"] == round(effective_interest, 2)
+    assert balance["Accrued nominal interest"] == round(schedule[2]["Nominal interest"] * 92 / 182, 2)
+    assert balance["Amortized cost"] == round(schedule[1]["Amortized cost"] + effective_interest, 2)
+    assert balance["Capitalized finance costs"] == round(
+        schedule[1]["Capitalized finance costs"]
+        - (effective_interest - schedule[2]["Nominal interest"] * 92 / 182),
+        2,
+    )
+
+    assert balance_at(deal1, schedule, date(2022, 4, 7))["Amortized cost"] == schedule[2]["Amortized cost"]
+    assert balance_at(deal1, schedule, date(2030, 1, 1))["Principal balance"] == 0
+    before = balance_at(deal1, schedule, date(2021, 1, 1))
+    assert before["Period"] == -1 and before["Amortized cost"] is None
+
+
+def test_portfolio_query():
+    deals = [deal1, dict(deal1, deal_id="DN0001", daycount="thirty_360", start_date=date(2022, 4, 7))]
+    deals[1]["first_interest_date"] = date(2022, 10, 7)
+    schedules = [complex_eir_calculation(deal1, interest_dict), simple_eir_calculation(deals[1], interest_dict[:1])[0]]
+    index = reporting_index(deals, schedules)
+
+    balances = balances_at(index, np.datetime64("2022-01-31"))
+    assert balances.period.tolist() == [1, -1]
+    assert np.isnan(balances.amortized_cost[1])
+
+    """A date per deal, and every month end of a year for one deal."""
+    balances = balances_at(index, np.array(["2022-01-31", "2023-01-31"], dtype="datetime64[D]"))
+    assert balances.period.tolist() == [1, 1]
+    """Within a 30/360 period the nominal interest accrues by 30E/360 days, 113 of 180 from the 7th of October to the 31st of January."""
+    assert balances.accrued_nominal_interest[1] == round(schedules[1][2]["Nominal interest"] * 113 / 180, 2)
+    month_ends = np.arange(np.datetime64("2022-01", "M"), np.datetime64("2023-01", "M")) + 1
+    balances = balances_at(index, month_ends.astype("datetime64[D]") - 1, 0)
+    assert balances.period.tolist() == [1, 1, 1, 2, 2, 2, 2, 2, 2, 3, 3, 3]
+    assert balances.deals.tolist() == [0] * 12
@@ -0,0 +1,100 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import sqlite3
+import time
+from types import MappingProxyType
+
+import eir
+from result_cache import ResultCache, deal_key
+from test_eir import deal1, interest_dict
+
+
+def test_deal_key_is_canonical():
+    key = deal_key("complex", deal1, interest_dict)
+    assert key == deal_key("complex", MappingProxyType(dict(reversed(list(deal1.items())))), interest_dict)
+    assert key != deal_key("simple", deal1, interest_dict)
+    assert key != deal_key("complex", dict(deal1, principal_amount=1), interest_dict)
+    assert key != deal_key("complex", deal1, interest_dict[:-1])
+    assert key != deal_key(
+        "complex", deal1, interest_dict[:-1] + [{"date": date(2025, 4, 7), "rate": 0.05}]
+    )
+
+
+def test_get_or_calculate(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"))
+    calls = list()
+
+    def calculate(d, interest_dict):
+        calls.append(d["deal_id"])
+        return {"deal": d["deal_id"]}
+
+    assert cache.get_or_calculate("simple", deal1, interest_dict, calculate) == {"deal": "DN0000"}
+    assert cache.get_or_calculate("simple", deal1, interest_dict, calculate) == {"deal": "DN0000"}
+    assert calls == ["DN0000"]
+    info = cache.info()
+    assert (info["hits"], info["misses"], info["entries"]) == (1, 1, 1)
+    assert info["hit_rate"] == 0.5
+    cache.clear()
+    assert cache.info()["entries"] == 0
+
+
+def test_expiry_and_least_recently_used_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), ttl=-1)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+    cache = ResultCache(str(tmp_path / "lru.sqlite3"), max_bytes=60, touch_interval=0)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    assert cache.get("a") == "x" * 10
+    cache.put("c", "z" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 10
+    assert cache.info()["evictions"] == 1
+
+
+def test_cached_results_are_not_timed(tmp_path, monkeypatch):
+    """The timings are only returned by the call that calculated the result, a cached result does not repeat them."""
+    monkeypatch.setattr(eir, "_result_cache", ResultCache(str(tmp_path / "cache.sqlite3")))
+    schedule, summary, *timings = eir.comparision(deal1, interest_dict)
+    assert all(timing is not None for timing in timings)
+    cached_schedule, cached_summary, *cached_timings = eir.comparision(deal1, interest_dict)
+    assert (cached_schedule, cached_summary) == (schedule, summary)
+    assert cached_timings == [None, None, None]
+    assert eir.simple_eir_calculation(deal1, interest_dict)[1] is not None
+    assert eir.simple_eir_calculation(deal1, interest_dict)[1:] == (None, None)
+
+
+def test_hits_do_not_wait_for_writers(tmp_path):
+    """A lookup reads while another process holds the write lock, the counts are written once the database is free."""
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResultCache(path, flush_interval=0)
+    cache.put("a", 1)
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    started = time.perf_counter()
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert time.perf_counter() - started < 1
+    writer.execute("ROLLBACK")
+    info = cache.info()
+    assert (info["hits"], info["misses"]) == (1, 1)
+
+
+def cached_calculation(path):
+    eir.configure_result_cache(ResultCache(path))
+    return eir.complex_eir_calculation(deal1, interest_dict)
+
+
+def test_engines_share_results_across_processes(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        schedules = list(executor.map(cached_calculation, [path] * 4))
+    cache = ResultCache(path)
+    monkeypatch.setattr(eir, "_result_cache", cache)
+    assert eir.complex_eir_calculation(deal1, interest_dict) == schedules[0]
+    assert all(schedule == schedules[0] for schedule in schedules)
+    info = cache.info()
+    assert info["entries"] == 1
+    assert info["hits"] + info["misses"] == 5
+    assert info["hits"] >= 3
@@ -0,0 +1,48 @@
+from datetime import date
+import os
+import time
+
+from result_store import ResultStore
+
+
+def test_put_and_get(tmp_path):
+    store = ResultStore(str(tmp_path))
+    result = {"schedule": [{"Dates": date(2021, 4, 7), "Amortized cost": 390000000.0}]}
+    result_id = store.put(result)
+    assert store.get(result_id) == result
+    assert store.get("0" * 32) is None
+    assert store.get("../secret") is None
+    assert store.get(None) is None
+
+
+def test_expired_results_are_not_returned_and_swept(tmp_path):
+    store = ResultStore(str(tmp_path), ttl=60)
+    old = store.put({"schedule": []})
+    new = store.put({"schedule": []})
+    past = time.time() - 120
+    os.utime(os.path.join(tmp_path, f"{old}.result"), (past, past))
+    assert store.get(old) is None
+    assert store.sweep() == 1
+    assert os.listdir(tmp_path) == [f"{new}.result"]
+
+
+def test_sweep_removes_oldest_over_max_bytes(tmp_path):
+    store = ResultStore(str(tmp_path), max_bytes=0)
+    result_ids = [store.put({"schedule": list(range(100))}) for _ in range(3)]
+    for age, result_id in zip((30, 20, 10), result_ids):
+        past = time.time() - age
+        os.utime(os.path.join(tmp_path, f"{result_id}.result"), (past, past))
+    store.max_bytes = os.path.getsize(os.path.join(tmp_path, f"{result_ids[0]}.result"))
+    assert store.sweep() == 2
+    assert store.get(result_ids[2]) is not None
+
+
+def test_sweeper_thread(tmp_path):
+    store = ResultStore(str(tmp_path), ttl=0, sweep_interval=0.01)
+    store.put({"schedule": []})
+    store.start_sweeper()
+    deadline = time.time() + 5
+    while os.listdir(tmp_path) and time.time() < deadline:
+        time.sleep(0.01)
+    store.stop_sweeper()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,55 @@
+from datetime import date
+import math
+import pickle
+
+import numpy as np
+import pytest
+
+from schedule import Schedule
+
+data = {
+    "Deal id": "DN0000",
+    "Dates": [date(2021, 4, 7), date(2021, 10, 7), date(2022, 4, 7)],
+    "Currency": "USD",
+    "Principal balance": [100.0, 50.0, 0.0],
+    "Nominal interest": ["", 2.5, 1.25],
+    "Years": [2021, 2021, 2022],
+}
+
+
+def test_columns_are_typed_arrays():
+    schedule = Schedule(data)
+    assert schedule.fields == tuple(data)
+    assert schedule.metadata == {"Deal id": "DN0000", "Currency": "USD"}
+    assert schedule.column("Dates").dtype == np.dtype("datetime64[D]")
+    assert schedule.column("Years").dtype == np.int64
+    assert math.isnan(schedule.column("Nominal interest")[0])
+    with pytest.raises(ValueError):
+        schedule.column("Principal balance")[0] = 1.0
+
+
+def test_row_views():
+    schedule = Schedule(data)
+    assert len(schedule) == 3
+    assert schedule[0]["Deal id"] == "DN0000"
+    assert schedule[0]["Dates"] == date(2021, 4, 7)
+    assert math.isnan(schedule[0]["Nominal interest"])
+    assert schedule[-1]["Nominal interest"] == 1.25
+    assert list(schedule[1]) == list(data)
+    assert [row["Years"] for row in schedule[1:]] == [2021, 2022]
+    with pytest.raises(IndexError):
+        schedule[3]
+
+
+def test_values_and_columns():
+    schedule = Schedule(data)
+    assert next(schedule.values("")) == ["DN0000", date(2021, 4, 7), "USD", 100.0, "", 2021]
+    assert schedule.to_columns()["Nominal interest"] == [None, 2.5, 1.25]
+    assert schedule.to_dicts()[1]["Principal balance"] == 50.0
+    assert Schedule({}).to_columns() == {}
+
+
+def test_equality_and_pickle():
+    schedule = Schedule(data)
+    assert pickle.loads(pickle.dumps(schedule)) == schedule
+    assert Schedule(dict(data, **{"Principal balance": [100.0, 50.0, 1.0]})) != schedule